@@ -1,89 +1,2732 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import (
+    Flask, render_template, request, jsonify, session, g, Response, stream_with_context, has_app_context, url_for
+)
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
 import os
 from datetime import datetime, timedelta
 import re
 import secrets
+import base64
+import hmac
+import time
+import hashlib
+import threading
+import csv
+import io
+import json
+import gzip
+import queue
+import select
+from bisect import bisect_right
+from functools import wraps
+from itertools import chain
+from collections import OrderedDict, deque
+import click
+
+try:
+    import orjson
+except ImportError:  # Flask's stdlib JSON provider is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # responses are gzip-compressed only
+    brotli = None
 
 app = Flask(__name__)
+# Render terminates TLS in one proxy hop; trust its X-Forwarded-For for client IPs
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 CORS(app, supports_credentials=True, origins=["https://cashine-ewallet.onrender.com", "http://localhost:3000"])
 
-# Get secret key from environment or use fallback
-app.secret_key = os.environ.get('SECRET_KEY') or 'dev-secure-key-' + secrets.token_hex(32)
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+# Get secret key from environment or use fallback
+app.secret_key = os.environ.get('SECRET_KEY') or 'dev-secure-key-' + secrets.token_hex(32)
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+
+# PIN hashing work factor (any Werkzeug method string) and how long a verified
+# PIN is trusted within a session before the KDF runs again
+app.config['PIN_HASH_METHOD'] = os.environ.get('PIN_HASH_METHOD', 'pbkdf2:sha256:50000')
+app.config['PIN_STEP_UP_SECONDS'] = int(os.environ.get('PIN_STEP_UP_SECONDS', 300))
+
+# Upper bound on how long a worker may serve a cached profile; wallet events
+# normally drop an entry as soon as its balance changes
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 10))
+
+# Idempotency keys are kept for a day and swept every ten minutes
+app.config['IDEMPOTENCY_KEY_TTL'] = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+app.config['IDEMPOTENCY_SWEEP_INTERVAL'] = int(os.environ.get('IDEMPOTENCY_SWEEP_INTERVAL', 600))
+
+# How often a worker checks whether the fee schedule version moved
+app.config['FEE_SCHEDULE_CHECK_SECONDS'] = float(os.environ.get('FEE_SCHEDULE_CHECK_SECONDS', 30))
+
+# Rate limiter store: memory:// (per worker, for dev/tests) or redis://host:port/db.
+# Login lockout is counted in the store only when it is shared (redis://);
+# with memory:// it stays on the users row so every worker sees it
+app.config['RATE_LIMIT_STORAGE_URL'] = os.environ.get('RATE_LIMIT_STORAGE_URL', 'memory://')
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', '1') != '0'
+
+# Seconds between SSE keepalive comments on an idle /api/events stream
+app.config['WALLET_EVENTS_KEEPALIVE'] = float(os.environ.get('WALLET_EVENTS_KEEPALIVE', 20))
+
+# Open /api/events streams per process. Under gthread each holds a request
+# thread, so by default they may take half of them; beyond the cap the
+# browser is answered 204 and polls instead. gevent streams are greenlets.
+if os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent':
+    _default_max_streams = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100)) // 2
+else:
+    _default_max_streams = max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)
+app.config['WALLET_EVENTS_MAX_STREAMS'] = int(os.environ.get('WALLET_EVENTS_MAX_STREAMS', _default_max_streams))
+
+# Months that get a transactions partition ahead of time (Postgres), and where
+# archived months are written as CSV.gz
+app.config['PARTITION_MONTHS_AHEAD'] = int(os.environ.get('PARTITION_MONTHS_AHEAD', 3))
+app.config['TRANSACTION_ARCHIVE_DIR'] = os.environ.get(
+    'TRANSACTION_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+)
+
+# Velocity risk counters: redis:// or memory://, defaulting to the rate
+# limiter's store. memory:// keeps separate windows in every gunicorn worker
+# and loses them whenever a worker is recycled (max_requests), so the rules
+# undercount; use Redis in production. Payouts scored 'review' are held until
+# an operator runs approve-payout or reject-payout.
+app.config['RISK_STORAGE_URL'] = os.environ.get('RISK_STORAGE_URL', app.config['RATE_LIMIT_STORAGE_URL'])
+
+# Settlement worker: provider name, attempts before giving up, base backoff
+app.config['SETTLEMENT_PROVIDER'] = os.environ.get('SETTLEMENT_PROVIDER', 'stub')
+app.config['SETTLEMENT_MAX_ATTEMPTS'] = int(os.environ.get('SETTLEMENT_MAX_ATTEMPTS', 6))
+app.config['SETTLEMENT_BACKOFF_SECONDS'] = int(os.environ.get('SETTLEMENT_BACKOFF_SECONDS', 30))
+
+# Bearer token for the ops-wide /api/admin/* endpoints; unset disables them
+app.config['ADMIN_API_TOKEN'] = os.environ.get('ADMIN_API_TOKEN')
+
+# Bearer token for /metrics; unset disables it. SQL_DEBUG=1 logs slow and
+# repeated (N+1) queries
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['SQL_DEBUG'] = os.environ.get('SQL_DEBUG', '0') == '1'
+app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+app.config['SQL_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))
+
+# Text responses at least this large are gzip/brotli-compressed for clients that accept it
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 500))
+
+# JSON serialization
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider backed by orjson, several times faster on the
+    row lists /api/transactions and /api/insights return.
+
+    Keys stay sorted and dates still go through Flask's default(), so the
+    documents are the ones the stdlib provider produced (non-ASCII text is
+    sent as UTF-8 instead of \\u escapes).
+    """
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Metrics
+# With PROMETHEUS_MULTIPROC_DIR set, every gunicorn worker writes its samples
+# there and /metrics aggregates them; otherwise the default registry is used
+REQUEST_SECONDS = Histogram(
+    'cashine_http_request_duration_seconds', 'Request latency by route',
+    ['method', 'route', 'status']
+)
+REQUEST_QUERIES = Histogram(
+    'cashine_db_queries_per_request', 'SQL statements executed per request',
+    ['route'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    'cashine_db_query_seconds_per_request', 'Total SQL time per request', ['route']
+)
+QUERY_SECONDS = Histogram('cashine_db_query_duration_seconds', 'Latency of single SQL statements')
+POOL_WAIT_SECONDS = Histogram(
+    'cashine_db_pool_checkout_seconds', 'Time spent waiting for a pooled connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+PIN_KDF_SECONDS = Histogram('cashine_pin_kdf_duration_seconds', 'PIN hash/verify time', ['operation'])
+TRANSFERS_TOTAL = Counter('cashine_transfers_total', 'Committed money movements', ['kind'])
+TRANSFER_CENTAVOS = Counter('cashine_transfer_centavos_total', 'Committed amounts in centavos', ['kind'])
+RISK_DECISIONS = Counter('cashine_risk_decisions_total', 'Velocity risk decisions', ['kind', 'decision'])
+RISK_SCORE_SECONDS = Histogram(
+    'cashine_risk_score_duration_seconds', 'Time to score one transfer',
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+)
+TRANSFER_FEE_CENTAVOS = Counter('cashine_transfer_fee_centavos_total', 'Committed fees in centavos', ['kind'])
+USER_CACHE_LOOKUPS = Counter(
+    'cashine_user_cache_lookups_total', 'Profile cache lookups; every hit is a users SELECT saved', ['result']
+)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    QUERY_SECONDS.observe(elapsed)
+    if not has_app_context() or 'sql_queries' not in g:
+        return
+    g.sql_queries += 1
+    g.sql_seconds += elapsed
+    if app.config['SQL_DEBUG']:
+        # Statements are parameterised, so identical text means identical query shape
+        g.sql_statements[statement] = g.sql_statements.get(statement, 0) + 1
+        if elapsed * 1000 >= app.config['SQL_SLOW_QUERY_MS']:
+            app.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) on {request.path}: {statement[:500]}")
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    started = context.connection.info.get('query_started') if context.connection else None
+    if started:
+        started.pop()
+
+# Configure PostgreSQL database
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+# Optional streaming replica for read-only routes
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+
+# Fix URL format for newer PostgreSQL
+if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
+    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+if DATABASE_REPLICA_URL and DATABASE_REPLICA_URL.startswith('postgres://'):
+    DATABASE_REPLICA_URL = DATABASE_REPLICA_URL.replace('postgres://', 'postgresql://', 1)
+
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_recycle': 300,
+    # Recycling below the server's idle timeout already avoids stale
+    # connections; pre-ping costs a round trip per checkout, so it is opt-in
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '0') == '1',
+}
+# In-memory SQLite needs Flask-SQLAlchemy's StaticPool; everything else gets a
+# timed QueuePool sized per worker process: one connection per request thread
+# plus overflow for background threads. Postgres sees workers x (size + overflow).
+if DATABASE_URL and ':memory:' not in DATABASE_URL:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 4))),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    })
+
+# The replica is a bind no model belongs to; only RoutingSession sends queries
+# there. After a user's own write their reads stay on the primary for this
+# many seconds so replication lag never hides it from them.
+if DATABASE_REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': DATABASE_REPLICA_URL}
+app.config['REPLICA_PIN_SECONDS'] = float(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+class RoutingSession(FlaskSession):
+    """Session that reads from the replica inside @replica_reads views"""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, 'is_dml', False)
+            and has_app_context()
+            and g.get('read_replica')
+        ):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+# Models
+class User(db.Model):
+    __tablename__ = 'users'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    phone = db.Column(db.String(20), unique=True, nullable=False)
+    birthdate = db.Column(db.Date)
+    address = db.Column(db.Text)
+    wallet_id = db.Column(db.String(20), unique=True, nullable=False)
+    pin_hash = db.Column(db.String(200), nullable=False)
+    balance = db.Column(db.BigInteger, default=50000, nullable=False)  # centavos
+    # Bumped by every balance write; validates cached /api/current-user and
+    # /api/transactions responses (ETag)
+    balance_version = db.Column(db.BigInteger, default=0, server_default='0', nullable=False)
+    failed_login_attempts = db.Column(db.Integer, default=0)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Substring search on PostgreSQL goes through pg_trgm GIN indexes
+        db.Index('ix_users_name_trgm', name, postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_users_wallet_id_trgm', wallet_id, postgresql_using='gin',
+                 postgresql_ops={'wallet_id': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_users_phone_trgm', phone, postgresql_using='gin',
+                 postgresql_ops={'phone': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        # Prefix search on wallet ID / phone uses plain B-tree range scans
+        db.Index('ix_users_wallet_id_prefix', wallet_id,
+                 postgresql_ops={'wallet_id': 'varchar_pattern_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_users_phone_prefix', phone,
+                 postgresql_ops={'phone': 'varchar_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
+
+db.event.listen(
+    User.__table__, 'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+# Wallet numbers come from a sequence so concurrent signups never collide;
+# CACHE lets each connection hand out a block without touching shared state
+wallet_id_seq = db.Sequence('wallet_id_seq', start=10000, cache=20, metadata=db.metadata)
+
+class Transaction(db.Model):
+    __tablename__ = 'transactions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    amount = db.Column(db.BigInteger, nullable=False)  # centavos
+    fee = db.Column(db.BigInteger, default=0)  # centavos
+    note = db.Column(db.Text)
+    recipient_id = db.Column(db.Integer, nullable=True)
+    recipient_name = db.Column(db.String(100))
+    bank_details = db.Column(db.JSON, nullable=True)
+    cashout_method = db.Column(db.String(50), nullable=True)
+    journal_id = db.Column(db.Integer, db.ForeignKey('journal_entries.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # `flask migrate --partition-transactions` rebuilds it on Postgres as
+    # range-partitioned by month on created_at with primary key (id,
+    # created_at); see partition_transactions. Months older than the archive
+    # cutoff live in CSV.gz files (TransactionArchive).
+    __table_args__ = (
+        # History pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        db.Index('ix_transactions_user_created', user_id, created_at.desc(), id.desc()),
+        # Per-type scans such as reconcile-daily-totals
+        db.Index('ix_transactions_user_type_created', user_id, type, created_at),
+    )
+
+class JournalEntry(db.Model):
+    __tablename__ = 'journal_entries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    memo = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Posting(db.Model):
+    __tablename__ = 'postings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    journal_id = db.Column(db.Integer, db.ForeignKey('journal_entries.id'), nullable=False)
+    account = db.Column(db.String(40), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # set for wallet accounts
+    amount = db.Column(db.BigInteger, nullable=False)  # centavos, positive increases the account
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_postings_user_id', user_id, id),
+        db.Index('ix_postings_account', account),
+    )
+
+class LedgerCheckpoint(db.Model):
+    __tablename__ = 'ledger_checkpoints'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    balance = db.Column(db.BigInteger, default=0, nullable=False)  # sum of postings up to posting_id
+    posting_id = db.Column(db.Integer, nullable=False)
+
+class ReconciliationRun(db.Model):
+    __tablename__ = 'reconciliation_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    watermark = db.Column(db.Integer, nullable=False)  # highest posting id folded into checkpoints
+    users_checked = db.Column(db.Integer, default=0, nullable=False)
+    mismatches = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailySendTotal(db.Model):
+    __tablename__ = 'daily_send_totals'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    total = db.Column(db.BigInteger, default=0, nullable=False)  # centavos
+
+class FeeRule(db.Model):
+    __tablename__ = 'fee_rules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(20), nullable=False)  # send, bank, cashout
+    min_amount = db.Column(db.BigInteger, default=0, nullable=False)  # tier lower bound, centavos
+    rate_bp = db.Column(db.Integer, default=0, nullable=False)  # basis points of the amount
+    flat = db.Column(db.BigInteger, default=0, nullable=False)
+    min_fee = db.Column(db.BigInteger, default=0, nullable=False)
+    max_fee = db.Column(db.BigInteger, nullable=True)
+    priority = db.Column(db.Integer, default=0, nullable=False)  # higher wins, e.g. promotions
+    starts_at = db.Column(db.DateTime, nullable=True)
+    ends_at = db.Column(db.DateTime, nullable=True)
+    note = db.Column(db.String(200))
+
+class FeeScheduleState(db.Model):
+    __tablename__ = 'fee_schedule_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=1, nullable=False)
+
+class MonthlyRollup(db.Model):
+    """Per user, month and transaction type totals behind /api/insights"""
+    __tablename__ = 'monthly_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    amount = db.Column(db.BigInteger, default=0, nullable=False)  # centavos, absolute
+    fees = db.Column(db.BigInteger, default=0, nullable=False)  # centavos paid; refunds (Reversal) are negative
+    
+    __table_args__ = (
+        # Ops-wide aggregates scan by month across all users
+        db.Index('ix_monthly_rollups_month', month),
+    )
+
+class RecipientRollup(db.Model):
+    """Per user, month and recipient totals of money sent"""
+    __tablename__ = 'recipient_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    recipient_id = db.Column(db.Integer, primary_key=True)
+    recipient_name = db.Column(db.String(100))
+    count = db.Column(db.Integer, default=0, nullable=False)
+    amount = db.Column(db.BigInteger, default=0, nullable=False)  # centavos sent
+
+class RollupState(db.Model):
+    __tablename__ = 'rollup_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    watermark = db.Column(db.Integer, default=0, nullable=False)  # highest transaction id folded in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TransactionArchive(db.Model):
+    __tablename__ = 'transaction_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, unique=True, nullable=False)  # first day of the archived month
+    filename = db.Column(db.String(200), nullable=False)  # inside TRANSACTION_ARCHIVE_DIR
+    row_count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TransactionArchiveUser(db.Model):
+    """Which users have rows in an archive, so history never opens files it does not need"""
+    __tablename__ = 'transaction_archive_users'
+    
+    archive_id = db.Column(db.Integer, db.ForeignKey('transaction_archives.id'), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, index=True)
+    row_count = db.Column(db.Integer, nullable=False)
+    # The user's own gzip member inside the file; NULL for archives written
+    # as a single member, which are scanned instead
+    byte_offset = db.Column(db.BigInteger, nullable=True)
+    byte_length = db.Column(db.BigInteger, nullable=True)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(100), primary_key=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    response = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class SettlementJob(db.Model):
+    __tablename__ = 'settlement_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False, unique=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'bank' or 'cashout'
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending/held/settled/failed/reversed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text)
+    provider_reference = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    transaction = db.relationship('Transaction')
+    
+    @property
+    def idempotency_key(self):
+        # Sent on every provider call for this job, so a retry after a lost
+        # commit gets the original payout back instead of a second one
+        return f'cashine-settlement-{self.id}'
+    
+    __table_args__ = (
+        # Workers poll WHERE status = 'pending' AND next_attempt_at <= now()
+        db.Index('ix_settlement_jobs_pending', status, next_attempt_at),
+    )
+
+# Helper functions
+# All money is handled as integer centavos (₱1.00 == 100)
+def calculate_fee(amount, channel='send'):
+    """Fee in centavos for amount on a channel (send, bank, cashout)"""
+    return fee_schedule.quote(amount, channel)
+
+def format_pesos(centavos):
+    """Render centavos as a plain peso string (e.g. -1234 -> '-12.34')"""
+    sign = '-' if centavos < 0 else ''
+    whole, cents = divmod(abs(centavos), 100)
+    return f"{sign}{whole}.{cents:02d}"
+
+def parse_centavos(value):
+    """Parse an API amount given as integer centavos, None if malformed"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def encode_cursor(transaction):
+    """Opaque keyset cursor pointing just past the given transaction"""
+    raw = f"{transaction.created_at.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (created_at, id) from a cursor, raising ValueError if malformed"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, transaction_id = raw.split('|')
+    return datetime.fromisoformat(created_at), int(transaction_id)
+
+class PinHasher:
+    """Versioned wrapper around Werkzeug's password hashing.
+
+    Stored hashes look like ``v1$<method>$<salt>$<hash>``. Unprefixed hashes
+    are legacy Werkzeug hashes from before versioning and are still accepted.
+    """
+    VERSION = 'v1'
+    
+    def __init__(self, method):
+        self.method = method
+        self._stored_method = None
+    
+    def hash(self, pin):
+        with PIN_KDF_SECONDS.labels('hash').time():
+            pin_hash = generate_password_hash(pin, method=self.method)
+        self._stored_method = pin_hash.split('$', 1)[0]
+        return f"{self.VERSION}${pin_hash}"
+    
+    def verify(self, pin_hash, pin):
+        if not pin:
+            return False
+        with PIN_KDF_SECONDS.labels('verify').time():
+            return check_password_hash(self._strip_version(pin_hash), pin)
+    
+    def needs_rehash(self, pin_hash):
+        if not pin_hash.startswith(f"{self.VERSION}$"):
+            return True
+        return self._strip_version(pin_hash).split('$', 1)[0] != self.stored_method
+    
+    @property
+    def stored_method(self):
+        """The method as Werkzeug writes it into hashes, defaults spelled out
+        ('scrypt' is stored as 'scrypt:32768:8:1'); taken from one hash"""
+        if self._stored_method is None:
+            self.hash(secrets.token_hex(4))
+        return self._stored_method
+    
+    def _strip_version(self, pin_hash):
+        version, _, rest = pin_hash.partition('$')
+        return rest if version == self.VERSION else pin_hash
+
+pin_hasher = PinHasher(app.config['PIN_HASH_METHOD'])
+
+def _pin_step_up_digest(user, pin):
+    # Bound to the stored hash so a PIN change invalidates outstanding tokens
+    message = f"{user.id}:{user.pin_hash}:{pin}".encode()
+    return hmac.new(app.secret_key.encode(), message, 'sha256').hexdigest()
+
+def grant_pin_step_up(user, pin):
+    """Remember in the signed session cookie that this PIN was just verified"""
+    session['pin_step_up'] = {
+        'digest': _pin_step_up_digest(user, pin),
+        'expires': time.time() + app.config['PIN_STEP_UP_SECONDS']
+    }
+
+def verify_user_pin(user, pin):
+    """Check a PIN for a money operation.
+
+    A matching, unexpired step-up token is checked with one HMAC instead of
+    the KDF, so a burst of transactions only pays for hashing once.
+    """
+    if not pin:
+        return False
+    
+    step_up = session.get('pin_step_up')
+    if step_up and step_up['expires'] > time.time() and hmac.compare_digest(
+        step_up['digest'], _pin_step_up_digest(user, pin)
+    ):
+        return True
+    
+    if not pin_hasher.verify(user.pin_hash, pin):
+        return False
+    
+    grant_pin_step_up(user, pin)
+    return True
+
+def luhn_check_digit(digits):
+    """Luhn check digit for a string of digits"""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+def generate_wallet_id():
+    """Allocate a new wallet ID: CASH + yymmdd + serial + check digit"""
+    if db.engine.dialect.name == 'postgresql':
+        serial = db.session.execute(wallet_id_seq.next_value()).scalar()
+    else:
+        # No sequences on SQLite; its single writer makes max(id) safe enough for dev
+        serial = 10000 + (db.session.query(db.func.max(User.id)).scalar() or 0)
+    digits = f"{datetime.now().strftime('%y%m%d')}{serial:05d}"
+    return f"CASH{digits}{luhn_check_digit(digits)}"
+
+def validate_pin(pin):
+    """Validate PIN is 4 digits"""
+    return bool(re.match(r'^\d{4}$', pin))
+
+def check_account_lock(user):
+    """Check if account is locked due to failed attempts"""
+    if user.locked_until and user.locked_until > datetime.utcnow():
+        return True
+    return False
+
+def serialize_user(user):
+    """Profile fields returned by login and /api/current-user"""
+    return {
+        'id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'phone': user.phone,
+        'wallet_id': user.wallet_id,
+        'balance': user.balance,
+        'balance_version': user.balance_version,
+        'address': user.address,
+        'birthdate': user.birthdate.strftime('%Y-%m-%d') if user.birthdate else None
+    }
+
+def serialize_transaction(transaction):
+    """Transaction fields returned by /api/transactions and wallet events"""
+    return {
+        'id': transaction.id,
+        'type': transaction.type,
+        'amount': transaction.amount,
+        'fee': transaction.fee,
+        'note': transaction.note,
+        'recipient_name': transaction.recipient_name,
+        'bank_details': transaction.bank_details,
+        'cashout_method': transaction.cashout_method,
+        'date': transaction.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+# User profile cache
+class UserProfileCache:
+    """Short-TTL per-worker cache of serialized profiles, balance included.
+
+    Every balance write publishes a wallet event, and delivering one to
+    this process drops that user's entry (see deliver_wallet_event), so a
+    hit is served without touching the database. On Postgres the events
+    come from other workers and the settlement process over LISTEN; while
+    that connection is down nothing is cached. The TTL bounds how stale an
+    entry can get if an event is ever lost.
+    """
+    MAX_ENTRIES = 10000
+    
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, user_id):
+        """Return the profile for user_id, loading it on a miss (None if unknown)"""
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            USER_CACHE_LOOKUPS.labels('hit').inc()
+            return entry[1]
+        
+        self.misses += 1
+        USER_CACHE_LOOKUPS.labels('miss').inc()
+        # Always the primary: a lagging replica could hand back a balance
+        # whose invalidating event this worker has already seen
+        user = db.session.execute(
+            db.select(User).where(User.id == user_id), bind_arguments={'bind': db.engine}
+        ).scalar()
+        if not user:
+            return None
+        
+        profile = serialize_user(user)
+        if wallet_events_live():
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+        return profile
+    
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            # Each hit answers without the users SELECT a miss runs
+            'queries_saved': self.hits
+        }
+
+user_cache = UserProfileCache(app.config['USER_CACHE_TTL'])
+
+# Wallet events
+# Balance/transaction deltas pushed to /api/events. On Postgres they travel as
+# NOTIFY inside the writing transaction, so they are delivered only on commit
+# and reach every worker (and the settlement worker's reversals); each web
+# worker LISTENs once and fans out to its own streams. Elsewhere they go
+# straight to this process's subscribers after commit.
+WALLET_EVENTS_CHANNEL = 'wallet_events'
+# Postgres caps NOTIFY payloads at 8000 bytes; bigger events ask for a refetch
+WALLET_EVENT_MAX_BYTES = 7500
+
+class WalletEventBroker:
+    """Per-process fan-out of wallet events to at most max_streams open SSE streams"""
+    def __init__(self, max_streams, queue_size=100):
+        self.max_streams = max_streams
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._streams = 0
+        self._lock = threading.Lock()
+    
+    def subscribe(self, user_id):
+        """A queue of user_id's events, or None when the process is at max_streams"""
+        subscription = queue.Queue(self.queue_size)
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id, set())
+            if subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._streams -= 1
+            if not subscriptions:
+                self._subscribers.pop(user_id, None)
+    
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(event['user_id'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait(event)
+            except queue.Full:
+                # A stalled client misses deltas; it resyncs on reconnect
+                pass
+
+wallet_broker = WalletEventBroker(app.config['WALLET_EVENTS_MAX_STREAMS'])
+
+def publish_wallet_event(user_id, balance, transactions=()):
+    """Queue a wallet delta on the session; it is sent only if the session commits"""
+    event = {
+        'user_id': user_id,
+        'balance': balance,
+        'transactions': [serialize_transaction(t) for t in transactions]
+    }
+    if len(json.dumps(event)) > WALLET_EVENT_MAX_BYTES:
+        event = {'user_id': user_id, 'balance': balance, 'transactions': [], 'resync': True}
+    db.session.info.setdefault('wallet_events', []).append(event)
+
+@event.listens_for(db.session, 'before_commit')
+def _notify_wallet_events(session):
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    wallet_events = session.info.pop('wallet_events', [])
+    if wallet_events:
+        # One round trip for the whole commit, however many wallets it touched
+        session.execute(
+            db.text('SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload'),
+            {'channel': WALLET_EVENTS_CHANNEL, 'payloads': [json.dumps(e) for e in wallet_events]}
+        )
+
+def deliver_wallet_event(wallet_event):
+    """Hand a committed wallet event to this process: drop the cached
+    profile and push it to the user's open streams"""
+    user_cache.invalidate(wallet_event['user_id'])
+    wallet_broker.publish(wallet_event)
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_wallet_events(session):
+    for wallet_event in session.info.pop('wallet_events', []):
+        deliver_wallet_event(wallet_event)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_wallet_events(session):
+    session.info.pop('wallet_events', None)
+
+_listener_pid = None
+_listener_ready = threading.Event()  # set while this process is LISTENing
+
+def _run_wallet_listener():
+    while True:
+        connection = None
+        try:
+            with app.app_context():
+                connection = db.engine.raw_connection()
+            # Keep this connection for good instead of holding a pool slot
+            connection.detach()
+            listener = connection.driver_connection
+            listener.autocommit = True
+            listener.cursor().execute(f'LISTEN {WALLET_EVENTS_CHANNEL}')
+            # Events sent while we were not listening are lost; start clean
+            user_cache.clear()
+            _listener_ready.set()
+            while True:
+                if select.select([listener], [], [], 60) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    deliver_wallet_event(json.loads(listener.notifies.pop(0).payload))
+        except Exception as e:
+            _listener_ready.clear()
+            user_cache.clear()
+            print(f"Wallet event listener failed: {e}")
+            if connection is not None:
+                connection.close()
+            time.sleep(5)
+
+def ensure_wallet_listener():
+    """Start the LISTEN thread once per worker process (Postgres only)"""
+    global _listener_pid
+    if _listener_pid != os.getpid() and db.engine.dialect.name == 'postgresql':
+        _listener_pid = os.getpid()
+        _listener_ready.clear()
+        threading.Thread(target=_run_wallet_listener, daemon=True).start()
+
+def wallet_events_live():
+    """Whether every committed balance write reaches this process as an event"""
+    if db.engine.dialect.name != 'postgresql':
+        # Single-process development setup: events are delivered after
+        # commit, and the TTL covers a settlement worker run alongside
+        return True
+    ensure_wallet_listener()
+    return _listener_ready.is_set()
+
+# Fee schedule
+FEE_CHANNELS = ('send', 'bank', 'cashout')
+
+# Seeded into fee_rules; also the backstop for amounts no rule covers
+DEFAULT_FEE_RULES = [
+    {'channel': 'send', 'rate_bp': 500, 'flat': 0, 'min_fee': 500, 'note': '5%, minimum ₱5'},
+    {'channel': 'cashout', 'rate_bp': 500, 'flat': 0, 'min_fee': 500, 'note': '5%, minimum ₱5'},
+    {'channel': 'bank', 'rate_bp': 0, 'flat': 2500, 'min_fee': 0, 'note': 'Flat ₱25'},
+]
+
+def _fee_for(rule, amount):
+    rate_bp, flat, min_fee, max_fee = rule
+    fee = flat + (amount * rate_bp + 5000) // 10000  # rounded half up
+    fee = max(fee, min_fee)
+    return min(fee, max_fee) if max_fee is not None else fee
+
+class FeeSchedule:
+    """fee_rules compiled into per-channel tier tables, cached per worker.
+
+    Each channel maps to priority levels (highest first), each holding
+    sorted tier lower bounds for bisect. Promotions are rules with a time
+    window; the compiled table is only valid until the next window edge.
+    The worker re-reads fee_schedule_state.version every
+    FEE_SCHEDULE_CHECK_SECONDS and recompiles when it moved.
+    """
+    def __init__(self):
+        self._compiled = None
+        self._version = None
+        self._checked_at = 0.0
+        self._valid_until = None
+    
+    def quote(self, amount, channel):
+        # Every known channel ends in a backstop level from 0 (see _compile)
+        for _, boundaries, tiers in self._current().get(channel, ()):
+            i = bisect_right(boundaries, amount) - 1
+            if i >= 0:
+                return _fee_for(tiers[i], amount)
+        raise ValueError(f'No fee rule for {channel} amount {amount}')
+    
+    def invalidate(self):
+        self._compiled = None
+    
+    def _current(self):
+        now = datetime.utcnow()
+        stale = (
+            self._compiled is None
+            or (self._valid_until and now >= self._valid_until)
+            or time.monotonic() - self._checked_at > app.config['FEE_SCHEDULE_CHECK_SECONDS']
+        )
+        if stale:
+            version = db.session.query(FeeScheduleState.version).filter_by(id=1).scalar()
+            if self._compiled is None or version != self._version or (
+                self._valid_until and now >= self._valid_until
+            ):
+                rules = [
+                    (r.channel, r.min_amount, r.priority, r.starts_at, r.ends_at,
+                     (r.rate_bp, r.flat, r.min_fee, r.max_fee))
+                    for r in FeeRule.query.all()
+                ] or [
+                    (r['channel'], 0, 0, None, None, (r['rate_bp'], r['flat'], r['min_fee'], None))
+                    for r in DEFAULT_FEE_RULES
+                ]
+                self._compiled, self._valid_until = self._compile(rules, now)
+                self._version = version
+            self._checked_at = time.monotonic()
+        return self._compiled
+    
+    @staticmethod
+    def _compile(rules, now):
+        levels = {}
+        valid_until = None
+        for channel, min_amount, priority, starts_at, ends_at, rule in rules:
+            for edge in (starts_at, ends_at):
+                if edge and edge > now and (valid_until is None or edge < valid_until):
+                    valid_until = edge
+            if (starts_at and starts_at > now) or (ends_at and ends_at <= now):
+                continue
+            levels.setdefault(channel, {}).setdefault(priority, []).append((min_amount, rule))
+        
+        compiled = {}
+        for channel, by_priority in levels.items():
+            compiled[channel] = []
+            for priority in sorted(by_priority, reverse=True):
+                tiers = sorted(by_priority[priority], key=lambda tier: tier[0])
+                compiled[channel].append((
+                    priority, [tier[0] for tier in tiers], [tier[1] for tier in tiers]
+                ))
+        
+        # Amounts no configured tier covers (say the 0 tier was deleted) are
+        # charged the default fee instead of failing every quote
+        for default in DEFAULT_FEE_RULES:
+            compiled.setdefault(default['channel'], []).append((
+                None, [0], [(default['rate_bp'], default['flat'], default['min_fee'], None)]
+            ))
+        return compiled, valid_until
+
+fee_schedule = FeeSchedule()
+
+def fee_schedule_gaps():
+    """Channels without a permanent rule starting at 0, so some amounts
+    would fall through to the default fee"""
+    if not FeeRule.query.first():
+        return []  # an empty table means DEFAULT_FEE_RULES
+    covered = {channel for channel, in db.session.query(FeeRule.channel).filter(
+        FeeRule.min_amount == 0, FeeRule.starts_at.is_(None), FeeRule.ends_at.is_(None)
+    )}
+    return [channel for channel in FEE_CHANNELS if channel not in covered]
+
+def publish_fee_schedule():
+    """Commit pending fee rule changes unless they leave a channel uncovered"""
+    gaps = fee_schedule_gaps()
+    if gaps:
+        db.session.rollback()
+        raise click.ClickException(
+            f"No permanent rule from 0 for {', '.join(gaps)}; add one before removing the old one"
+        )
+    bump_fee_schedule_version()
+    db.session.commit()
+
+def bump_fee_schedule_version():
+    """Make every worker recompile its fee table on its next check"""
+    db.session.execute(
+        db.update(FeeScheduleState).where(FeeScheduleState.id == 1)
+        .values(version=FeeScheduleState.version + 1)
+    )
+
+@app.cli.command('list-fee-rules')
+def list_fee_rules_command():
+    """Show the fee schedule."""
+    for rule in FeeRule.query.order_by(FeeRule.channel, FeeRule.priority.desc(), FeeRule.min_amount):
+        window = f" {rule.starts_at or '-'}..{rule.ends_at or '-'}" if rule.starts_at or rule.ends_at else ''
+        print(f"#{rule.id} {rule.channel} from {format_pesos(rule.min_amount)}: "
+              f"{rule.rate_bp}bp + {format_pesos(rule.flat)}, min {format_pesos(rule.min_fee)}, "
+              f"max {format_pesos(rule.max_fee) if rule.max_fee is not None else '-'}, "
+              f"priority {rule.priority}{window} {rule.note or ''}")
+
+@app.cli.command('add-fee-rule')
+@click.option('--channel', type=click.Choice(FEE_CHANNELS), required=True)
+@click.option('--min-amount', default=0, help='Tier lower bound in centavos.')
+@click.option('--rate-bp', default=0, help='Percentage fee in basis points.')
+@click.option('--flat', default=0, help='Flat fee in centavos.')
+@click.option('--min-fee', default=0, help='Minimum fee in centavos.')
+@click.option('--max-fee', type=int, default=None, help='Maximum fee in centavos.')
+@click.option('--priority', default=0, help='Higher priority rules override lower ones.')
+@click.option('--starts-at', type=click.DateTime(), default=None, help='UTC start of a promotion.')
+@click.option('--ends-at', type=click.DateTime(), default=None, help='UTC end of a promotion.')
+@click.option('--note', default=None)
+def add_fee_rule_command(**fields):
+    """Add a fee rule and publish the new schedule."""
+    db.session.add(FeeRule(**fields))
+    db.session.flush()
+    publish_fee_schedule()
+    print("Fee rule added")
+
+@app.cli.command('delete-fee-rule')
+@click.argument('rule_id', type=int)
+def delete_fee_rule_command(rule_id):
+    """Remove a fee rule and publish the new schedule."""
+    FeeRule.query.filter_by(id=rule_id).delete()
+    publish_fee_schedule()
+    print(f"Fee rule {rule_id} deleted")
+
+# Settlement queue
+class SettlementRetry(Exception):
+    """Provider is temporarily unavailable; the job is retried with backoff"""
+
+class SettlementDeclined(Exception):
+    """Provider permanently rejected the payout; the user is refunded"""
+
+class StubSettlementProvider:
+    """Local provider for development and tests.
+
+    Settles everything, except that an account or method ending in 'decline'
+    is rejected and one ending in 'retry' fails transiently. Real providers
+    must forward job.idempotency_key so that settling a job twice pays once.
+    """
+    def settle(self, job):
+        transaction = job.transaction
+        target = (transaction.bank_details or {}).get('account') or transaction.cashout_method or ''
+        if target.endswith('decline'):
+            raise SettlementDeclined('Declined by stub provider')
+        if target.endswith('retry'):
+            raise SettlementRetry('Stub provider unavailable')
+        return f"STUB-{job.id}"
+
+SETTLEMENT_PROVIDERS = {
+    'stub': StubSettlementProvider,
+}
+
+def reverse_settlement(job, reason):
+    """Refund a payout that will never settle and record a Reversal row"""
+    transaction = job.transaction
+    amount, fee = -transaction.amount, -(transaction.fee or 0)
+    balance = db.session.execute(
+        db.update(User)
+        .where(User.id == transaction.user_id)
+        .values(balance=User.balance + amount + fee, balance_version=User.balance_version + 1)
+        .returning(User.balance)
+    ).scalar()
+    journal_id = post_journal('reversal', [
+        (wallet_account(transaction.user_id), transaction.user_id, amount + fee),
+        (f'clearing:{job.kind}', None, -amount),
+        (FEE_REVENUE_ACCOUNT, None, -fee),
+    ], memo=reason)
+    reversal = Transaction(
+        user_id=transaction.user_id,
+        type='Reversal',
+        amount=amount,
+        fee=fee,
+        note=f'Reversal: {transaction.note} ({reason})',
+        journal_id=journal_id,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(reversal)
+    publish_wallet_event(transaction.user_id, balance, [reversal])
+    job.status = 'reversed'
+
+def retry_settlement_later(job, error):
+    """Back a job off exponentially, parking it as failed once out of attempts"""
+    job.last_error = error
+    if job.attempts >= app.config['SETTLEMENT_MAX_ATTEMPTS']:
+        # Out of retries: park for manual review, funds stay held
+        job.status = 'failed'
+    else:
+        backoff = app.config['SETTLEMENT_BACKOFF_SECONDS'] * 2 ** (job.attempts - 1)
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=min(backoff, 3600))
+
+def settle_job(provider, job):
+    """Make one provider call for job and record its outcome (uncommitted)"""
+    job.attempts += 1
+    try:
+        job.provider_reference = provider.settle(job)
+    except SettlementDeclined as e:
+        job.last_error = str(e)
+        reverse_settlement(job, str(e))
+        return
+    except Exception as e:
+        retry_settlement_later(job, str(e))
+        return
+    
+    job.status = 'settled'
+    job.last_error = None
+    # Funds leave clearing for the external bank / agent network
+    post_journal('settlement', [
+        (f'clearing:{job.kind}', None, job.transaction.amount),
+        (f'external:{job.kind}', None, -job.transaction.amount),
+    ], memo=job.provider_reference)
+
+def process_settlement_batch(provider, batch_size=10):
+    """Settle up to batch_size due jobs; returns how many were handled.
+
+    Each job is claimed with FOR UPDATE SKIP LOCKED, so any number of
+    workers can poll the table, and committed on its own right after its
+    provider call: a later job failing can never roll back a payout the
+    provider already made. If the bookkeeping after a call fails, the job
+    is retried with the same idempotency key.
+    """
+    handled = 0
+    while handled < batch_size:
+        job = SettlementJob.query.filter(
+            SettlementJob.status == 'pending',
+            SettlementJob.next_attempt_at <= datetime.utcnow()
+        ).order_by(SettlementJob.next_attempt_at).limit(1).with_for_update(skip_locked=True).first()
+        if job is None:
+            break
+        
+        handled += 1
+        job_id = job.id
+        try:
+            settle_job(provider, job)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Settlement job {job_id} failed: {e}")
+            # The rollback released our lock; claim the row again and leave
+            # it alone if another worker has finished with it meanwhile
+            job = SettlementJob.query.filter_by(id=job_id).with_for_update().populate_existing().first()
+            if job is None or job.status != 'pending':
+                db.session.rollback()
+                continue
+            job.attempts += 1
+            retry_settlement_later(job, str(e))
+            db.session.commit()
+    
+    return handled
+
+@app.cli.command('settlement-worker')
+@click.option('--batch-size', default=10, help='Jobs claimed per poll.')
+@click.option('--poll-interval', default=2.0, help='Seconds to sleep when the queue is empty.')
+@click.option('--once', is_flag=True, help='Drain due jobs and exit.')
+def settlement_worker_command(batch_size, poll_interval, once):
+    """Settle pending bank transfers and cash-outs."""
+    provider = SETTLEMENT_PROVIDERS[app.config['SETTLEMENT_PROVIDER']]()
+    print(f"Settlement worker started ({app.config['SETTLEMENT_PROVIDER']} provider)")
+    next_partition_check = 0
+    next_rollup_refresh = 0
+    while True:
+        if time.time() >= next_rollup_refresh:
+            try:
+                refresh_rollups()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Rollup refresh failed: {e}")
+            next_rollup_refresh = time.time() + 60
+        if time.time() >= next_partition_check:
+            try:
+                with db.engine.begin() as conn:
+                    ensure_transaction_partitions(conn)
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+            next_partition_check = time.time() + PARTITION_CHECK_SECONDS
+        try:
+            handled = process_settlement_batch(provider, batch_size)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Settlement batch failed: {e}")
+            handled = 0
+        if once and not handled:
+            break
+        if not handled:
+            time.sleep(poll_interval)
+
+def claim_held_payout(job_id):
+    """Lock a held job for an operator decision (ValueError if it is not held)"""
+    job = SettlementJob.query.filter_by(id=job_id).with_for_update().first()
+    if job is None or job.status != 'held':
+        db.session.rollback()
+        raise ValueError(f"Settlement job {job_id} is not held for review")
+    return job
+
+def approve_held_payout(job_id):
+    """Release a held payout to the settlement worker right away"""
+    job = claim_held_payout(job_id)
+    job.status = 'pending'
+    job.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+
+def reject_held_payout(job_id, reason):
+    """Refund a held payout to the user's wallet instead of sending it"""
+    reverse_settlement(claim_held_payout(job_id), reason)
+    db.session.commit()
+
+@app.cli.command('list-held-payouts')
+def list_held_payouts_command():
+    """Show payouts held by the risk checks."""
+    for job in SettlementJob.query.filter_by(status='held').order_by(SettlementJob.created_at):
+        transaction = job.transaction
+        print(f"#{job.id} {job.kind} {format_pesos(-transaction.amount)} by user {transaction.user_id} "
+              f"at {job.created_at:%Y-%m-%d %H:%M}: {transaction.note}")
+
+@app.cli.command('approve-payout')
+@click.argument('job_id', type=int)
+def approve_payout_command(job_id):
+    """Send a held payout to the provider."""
+    try:
+        approve_held_payout(job_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Settlement job {job_id} released")
+
+@app.cli.command('reject-payout')
+@click.argument('job_id', type=int)
+@click.option('--reason', default='Rejected after security review')
+def reject_payout_command(job_id, reason):
+    """Refund a held payout instead of sending it."""
+    try:
+        reject_held_payout(job_id, reason)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"Settlement job {job_id} rejected and refunded")
+
+# Read replica routing
+def replica_reads(view):
+    """Serve a read-only view from the replica unless the user wrote recently"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only_route = True
+        g.read_replica = 'replica' in db.engines and session.get('primary_until', 0) <= time.time()
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.after_request
+def pin_reads_to_primary(response):
+    # Any successful non-GET outside the read-only views may have written
+    if (
+        'replica' in db.engines
+        and request.method != 'GET'
+        and not g.get('read_only_route')
+        and response.status_code < 400
+        and session.get('user_id')
+    ):
+        session['primary_until'] = time.time() + app.config['REPLICA_PIN_SECONDS']
+    return response
+
+# Rate limiting
+# (capacity, refill per second) token buckets, checked per client IP and,
+# when logged in, per user
+RATE_LIMITS = {
+    'auth': {'ip': (10, 10 / 60)},
+    'money': {'ip': (60, 1), 'user': (20, 20 / 60)},
+    'read': {'ip': (120, 2), 'user': (60, 1)},
+    'search': {'ip': (60, 1), 'user': (30, 0.5)},
+    'quote': {'ip': (60, 1)},
+}
+
+MAX_FAILED_LOGINS = 5
+LOGIN_LOCKOUT_SECONDS = 15 * 60
+
+class MemoryRateLimitStore:
+    """Process-local store; each gunicorn worker keeps its own buckets"""
+    shared = False
+    SWEEP_EVERY = 10000  # takes between sweeps of refilled buckets and expired counters
+    
+    def __init__(self):
+        self._buckets = {}
+        self._counters = {}
+        self._takes = 0
+        self._lock = threading.Lock()
+    
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            self._takes += 1
+            if self._takes % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Once full again the bucket is the same as no bucket, so it can go
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return (True, 0.0) if allowed else (False, (1 - tokens) / rate)
+    
+    def _sweep(self, now):
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+        for key in [k for k, (_, expires) in self._counters.items() if expires <= time.time()]:
+            del self._counters[key]
+    
+    def incr(self, key, ttl):
+        with self._lock:
+            count, expires = self._counters.get(key, (0, 0))
+            count = count + 1 if expires > time.time() else 1
+            self._counters[key] = (count, time.time() + ttl)
+            return count
+    
+    def get(self, key):
+        with self._lock:
+            count, expires = self._counters.get(key, (0, 0))
+        return count if expires > time.time() else 0
+    
+    def delete(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+class RedisRateLimitStore:
+    """Shared store for all workers; each check is one atomic Lua call"""
+    shared = True
+    TAKE_SCRIPT = """
+    local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = math.min(capacity, (tonumber(state[1]) or capacity) + (now - (tonumber(state[2]) or now)) * rate)
+    local allowed, retry = 0, (1 - tokens) / rate
+    if tokens >= 1 then
+        tokens, allowed, retry = tokens - 1, 1, 0
+    end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(retry)}
+    """
+    
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self.TAKE_SCRIPT)
+    
+    def take(self, key, capacity, rate, now):
+        allowed, retry = self._take(keys=[f'rl:{key}'], args=[capacity, rate, now])
+        return bool(allowed), float(retry)
+    
+    def incr(self, key, ttl):
+        pipe = self._redis.pipeline()
+        pipe.incr(f'rc:{key}')
+        pipe.expire(f'rc:{key}', ttl)
+        return pipe.execute()[0]
+    
+    def get(self, key):
+        return int(self._redis.get(f'rc:{key}') or 0)
+    
+    def delete(self, key):
+        self._redis.delete(f'rc:{key}')
+
+def create_rate_limit_store(url):
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisRateLimitStore(url)
+    return MemoryRateLimitStore()
+
+rate_limit_store = create_rate_limit_store(app.config['RATE_LIMIT_STORAGE_URL'])
+
+def record_login_failure(user):
+    """Count a failed PIN for user and return the count, locking at MAX_FAILED_LOGINS.
+
+    A shared store keeps the count off the users table. A process-local one
+    cannot be trusted with it (per worker, lost on recycle), so then it is
+    kept on the users row with an atomic UPDATE.
+    """
+    if rate_limit_store.shared:
+        return rate_limit_store.incr(f'login-failures:{user.id}', LOGIN_LOCKOUT_SECONDS)
+    
+    failures = db.session.execute(
+        db.update(User).where(User.id == user.id)
+        .values(failed_login_attempts=User.failed_login_attempts + 1)
+        .returning(User.failed_login_attempts)
+    ).scalar()
+    if failures >= MAX_FAILED_LOGINS:
+        # The lock starts a fresh count, so it lapses after LOGIN_LOCKOUT_SECONDS
+        db.session.execute(
+            db.update(User).where(User.id == user.id).values(
+                failed_login_attempts=0,
+                locked_until=datetime.utcnow() + timedelta(seconds=LOGIN_LOCKOUT_SECONDS)
+            )
+        )
+    db.session.commit()
+    return failures
+
+def clear_login_failures(user):
+    if rate_limit_store.shared:
+        rate_limit_store.delete(f'login-failures:{user.id}')
+    elif user.failed_login_attempts:
+        user.failed_login_attempts = 0
+        db.session.commit()
+
+def rate_limited(profile):
+    """Reject with 429 once the client IP or session user runs out of tokens.
+
+    Only the signed session cookie and the store are consulted, never the
+    database, so throttled floods stay off Postgres.
+    """
+    limits = RATE_LIMITS[profile]
+    
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if app.config['RATE_LIMIT_ENABLED']:
+                now = time.time()
+                subjects = [('ip', request.remote_addr)]
+                if 'user' in limits and session.get('user_id'):
+                    subjects.append(('user', session['user_id']))
+                for scope, subject in subjects:
+                    if scope not in limits:
+                        continue
+                    capacity, rate = limits[scope]
+                    allowed, retry_after = rate_limit_store.take(
+                        f'{profile}:{scope}:{subject}', capacity, rate, now
+                    )
+                    if not allowed:
+                        wait = max(1, int(retry_after + 0.999))
+                        response = jsonify({
+                            'success': False,
+                            'error': f'Too many requests. Try again in {wait} seconds'
+                        })
+                        response.status_code = 429
+                        response.headers['Retry-After'] = str(wait)
+                        return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Idempotency keys
+def idempotent(view):
+    """Replay the stored response when a client retries with the same Idempotency-Key.
+
+    The key row is flushed before the view runs, so it commits in the same
+    transaction as the money movement and a concurrent duplicate blocks on
+    the primary key. Views commit through commit_response(), which stores
+    the response on the key row in that same commit. Only successful
+    responses are stored; anything else is rolled back so the client can
+    retry with the same key.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        user_id = session.get('user_id')
+        if not key or not user_id:
+            return view(*args, **kwargs)
+        
+        if len(key) > 100:
+            return jsonify({'success': False, 'error': 'Idempotency-Key too long'}), 400
+        
+        ensure_idempotency_sweeper()
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        
+        claim = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            endpoint=request.endpoint,
+            request_hash=request_hash
+        )
+        try:
+            db.session.add(claim)
+            db.session.flush()
+        except db.exc.IntegrityError:
+            db.session.rollback()
+            stored = db.session.get(IdempotencyKey, (user_id, key))
+            if stored is None or stored.response is None:
+                return jsonify({'success': False, 'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            if stored.endpoint != request.endpoint or stored.request_hash != request_hash:
+                return jsonify({'success': False, 'error': 'Idempotency-Key was already used for a different request'}), 422
+            response = jsonify(stored.response)
+            response.status_code = stored.status_code
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        g.idempotency_claim = claim
+        response = app.make_response(view(*args, **kwargs))
+        
+        if 200 <= response.status_code < 300:
+            if claim.response is None:
+                claim.status_code = response.status_code
+                claim.response = response.get_json()
+                db.session.commit()
+        else:
+            db.session.rollback()
+            # A claim committed with its response means the money moved and
+            # only a later step failed; keep it so retries replay the success
+            if db.inspect(claim).persistent and claim.response is None:
+                db.session.delete(claim)
+                db.session.commit()
+        
+        return response
+    
+    return wrapper
+
+def commit_response(body, status_code=200):
+    """Commit the request's changes and return body as its JSON response.
+
+    Under @idempotent the response is written to the key row before the
+    commit, so a retry never finds the money moved but the response missing.
+    """
+    claim = g.get('idempotency_claim')
+    if claim is not None:
+        claim.status_code = status_code
+        claim.response = body
+    db.session.commit()
+    return jsonify(body), status_code
+
+def sweep_idempotency_keys():
+    """Delete idempotency keys older than IDEMPOTENCY_KEY_TTL; returns the count"""
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config['IDEMPOTENCY_KEY_TTL'])
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete()
+    db.session.commit()
+    return deleted
+
+_sweeper_pid = None
+
+def _run_idempotency_sweeper():
+    while True:
+        time.sleep(app.config['IDEMPOTENCY_SWEEP_INTERVAL'])
+        with app.app_context():
+            try:
+                sweep_idempotency_keys()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Idempotency key sweep failed: {e}")
+
+def ensure_idempotency_sweeper():
+    """Start the background sweep thread once per worker process (fork-safe)"""
+    global _sweeper_pid
+    if _sweeper_pid != os.getpid():
+        _sweeper_pid = os.getpid()
+        threading.Thread(target=_run_idempotency_sweeper, daemon=True).start()
+
+@app.cli.command('sweep-idempotency-keys')
+def sweep_idempotency_keys_command():
+    """Delete expired idempotency keys."""
+    print(f"Deleted {sweep_idempotency_keys()} expired idempotency keys")
+
+# Ledger
+FEE_REVENUE_ACCOUNT = 'revenue:fees'
+PROMOTIONS_ACCOUNT = 'equity:promotions'
+SIGNUP_BONUS = 50000  # ₱500
+
+# Postings younger than this may still belong to uncommitted transactions,
+# so reconciliation leaves them for the next run
+LEDGER_SETTLE_SECONDS = 60
+
+def wallet_account(user_id):
+    return f'wallet:{user_id}'
+
+def post_journal(kind, postings, memo=None):
+    """Write one balanced journal entry and return its id.
+
+    postings are (account, user_id, amount) tuples; user_id is only set for
+    wallet accounts. Zero-amount legs are dropped.
+    """
+    if sum(amount for _, _, amount in postings) != 0:
+        raise ValueError(f'Unbalanced {kind} journal entry')
+    
+    journal_id = db.session.execute(
+        db.insert(JournalEntry).values(kind=kind, memo=memo).returning(JournalEntry.id)
+    ).scalar()
+    db.session.execute(db.insert(Posting), [
+        {'journal_id': journal_id, 'account': account, 'user_id': user_id, 'amount': amount}
+        for account, user_id, amount in postings if amount
+    ])
+    return journal_id
+
+def reconcile_ledger(full=False):
+    """Check users.balance against the ledger, incrementally.
+
+    Postings since the last run's watermark are folded into per-user
+    checkpoints, and only the users they touch are verified: snapshot must
+    equal checkpoint + any postings newer than the watermark. With full=True
+    checkpoints are rebuilt from the first posting. Returns
+    (users_checked, [(user_id, snapshot, ledger), ...] for mismatches).
+    """
+    previous = 0
+    if full:
+        LedgerCheckpoint.query.delete()
+    else:
+        previous = db.session.query(db.func.max(ReconciliationRun.watermark)).scalar() or 0
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=LEDGER_SETTLE_SECONDS)
+    watermark = max(previous, db.session.query(db.func.max(Posting.id)).filter(
+        Posting.created_at < cutoff
+    ).scalar() or 0)
+    
+    deltas = db.session.query(Posting.user_id, db.func.sum(Posting.amount)).filter(
+        Posting.user_id.isnot(None),
+        Posting.id > previous,
+        Posting.id <= watermark
+    ).group_by(Posting.user_id).all()
+    
+    checkpoints = {c.user_id: c for c in LedgerCheckpoint.query.filter(
+        LedgerCheckpoint.user_id.in_([user_id for user_id, _ in deltas])
+    )} if deltas else {}
+    for user_id, delta in deltas:
+        checkpoint = checkpoints.get(user_id)
+        if checkpoint is None:
+            checkpoint = LedgerCheckpoint(user_id=user_id, balance=0)
+            db.session.add(checkpoint)
+        checkpoint.balance += delta
+        checkpoint.posting_id = watermark
+    db.session.flush()
+    
+    mismatches = []
+    if deltas:
+        newer = db.select(
+            Posting.user_id, db.func.sum(Posting.amount).label('amount')
+        ).where(Posting.id > watermark, Posting.user_id.isnot(None)).group_by(Posting.user_id).subquery()
+        ledger_balance = LedgerCheckpoint.balance + db.func.coalesce(newer.c.amount, 0)
+        mismatches = db.session.query(User.id, User.balance, ledger_balance).join(
+            LedgerCheckpoint, LedgerCheckpoint.user_id == User.id
+        ).outerjoin(newer, newer.c.user_id == User.id).filter(
+            LedgerCheckpoint.posting_id == watermark,
+            User.balance != ledger_balance
+        ).all()
+    
+    db.session.add(ReconciliationRun(
+        watermark=watermark, users_checked=len(deltas), mismatches=len(mismatches)
+    ))
+    db.session.commit()
+    return len(deltas), mismatches
+
+@app.cli.command('reconcile-ledger')
+@click.option('--full', is_flag=True, help='Rebuild checkpoints from the first posting.')
+def reconcile_ledger_command(full):
+    """Verify wallet balances against ledger postings."""
+    checked, mismatches = reconcile_ledger(full)
+    for user_id, snapshot, ledger in mismatches:
+        print(f"User {user_id}: balance {snapshot} != ledger {ledger}")
+    print(f"Checked {checked} wallets, {len(mismatches)} mismatches")
+
+# Velocity risk scoring
+# Thresholds; tune them against history with `flask replay-risk`
+RISK_RULES = {
+    'transfers_per_minute': 5,
+    'outflow_per_hour': 2000000,  # ₱20,000 sent or paid out
+    'new_recipients_per_hour': 5,
+    'pass_through_seconds': 600,  # payout mostly funded by money received this recently
+    'pass_through_ratio': 0.8,
+}
+RISK_REVIEW_SCORE = 50
+RISK_DENY_SCORE = 80
+RISK_HORIZON_SECONDS = 3600  # longest window any rule looks at
+RISK_MAX_EVENTS = 100  # per key; enough to exceed every threshold
+RISK_KNOWN_RECIPIENTS = 50  # per user; older recipients count as new again
+RISK_DENIED_MESSAGE = 'This transaction was blocked by our security checks. Please try again later or contact support.'
+
+class MemoryRiskStore:
+    """Per-process sliding windows: a bounded ring of (timestamp, value) per key"""
+    def __init__(self):
+        self._events = {}
+        self._known = {}
+        self._adds = 0
+        self._lock = threading.Lock()
+    
+    def add_many(self, entries, now):
+        """Append (key, value) samples, all stamped now"""
+        with self._lock:
+            for key, value in entries:
+                events = self._events.get(key)
+                if events is None:
+                    events = self._events[key] = deque(maxlen=RISK_MAX_EVENTS)
+                events.append((now, value))
+            previous, self._adds = self._adds, self._adds + len(entries)
+            if previous // 10000 != self._adds // 10000:
+                # Forget keys that have been idle longer than any window
+                for idle in [k for k, e in self._events.items() if e[-1][0] < now - RISK_HORIZON_SECONDS]:
+                    del self._events[idle]
+    
+    def events(self, key, since):
+        """(timestamp, value) pairs at or after since, newest first"""
+        with self._lock:
+            events = self._events.get(key, ())
+            recent = []
+            for timestamp, value in reversed(events):
+                if timestamp < since:
+                    break
+                recent.append((timestamp, value))
+        return recent
+    
+    def known(self, key, members):
+        """The subset of members remembered under key"""
+        with self._lock:
+            remembered = self._known.get(key, {})
+            return {member for member in members if member in remembered}
+    
+    def remember(self, key, members, now):
+        with self._lock:
+            remembered = self._known.setdefault(key, OrderedDict())
+            for member in members:
+                remembered[member] = now
+                remembered.move_to_end(member)
+            while len(remembered) > RISK_KNOWN_RECIPIENTS:
+                remembered.popitem(last=False)
+
+class RedisRiskStore:
+    """Shared windows as sorted sets scored by timestamp, trimmed to the horizon"""
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+    
+    def add_many(self, entries, now):
+        """Append (key, value) samples, all stamped now, in one round trip"""
+        pipe = self._redis.pipeline()
+        for key, value in entries:
+            name = f'risk:{key}'
+            pipe.zadd(name, {f'{now}:{value}:{secrets.token_hex(4)}': now})
+            pipe.zremrangebyscore(name, '-inf', now - RISK_HORIZON_SECONDS)
+            pipe.expire(name, RISK_HORIZON_SECONDS + 60)
+        pipe.execute()
+    
+    def events(self, key, since):
+        members = self._redis.zrevrangebyscore(f'risk:{key}', '+inf', since, start=0, num=RISK_MAX_EVENTS)
+        recent = []
+        for member in members:
+            timestamp, value, _ = member.decode().split(':')
+            recent.append((float(timestamp), int(value)))
+        return recent
+    
+    def known(self, key, members):
+        members = list(members)
+        pipe = self._redis.pipeline()
+        for member in members:
+            pipe.zscore(f'risk:known:{key}', member)
+        return {member for member, score in zip(members, pipe.execute()) if score is not None}
+    
+    def remember(self, key, members, now):
+        name = f'risk:known:{key}'
+        pipe = self._redis.pipeline()
+        pipe.zadd(name, {member: now for member in members})
+        pipe.zremrangebyrank(name, 0, -(RISK_KNOWN_RECIPIENTS + 1))
+        pipe.expire(name, 90 * 86400)
+        pipe.execute()
+
+def create_risk_store(url):
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisRiskStore(url)
+    return MemoryRiskStore()
+
+class RiskEngine:
+    """Scores outgoing money against per-user sliding windows.
+
+    score() only reads the store; record() feeds it once a transfer has
+    committed. Outflows live under out:<user>, money received under
+    in:<user> and first-time recipients under new:<user>.
+    """
+    def __init__(self, store, rules=None, review_score=RISK_REVIEW_SCORE, deny_score=RISK_DENY_SCORE):
+        self.store = store
+        self.rules = rules or RISK_RULES
+        self.review_score = review_score
+        self.deny_score = deny_score
+    
+    def score(self, user_id, kind, amount, recipient_ids=(), now=None):
+        """Return (decision, score, reasons) with decision allow, review or deny"""
+        now = time.time() if now is None else now
+        rules = self.rules
+        score = 0
+        reasons = []
+        
+        outflows = self.store.events(f'out:{user_id}', now - RISK_HORIZON_SECONDS)
+        per_minute = 1 + sum(1 for timestamp, _ in outflows if timestamp >= now - 60)
+        if per_minute >= 2 * rules['transfers_per_minute']:
+            score += 80
+            reasons.append('velocity')
+        elif per_minute >= rules['transfers_per_minute']:
+            score += 40
+            reasons.append('velocity')
+        
+        if amount + sum(value for _, value in outflows) >= rules['outflow_per_hour']:
+            score += 30
+            reasons.append('hourly_outflow')
+        
+        if recipient_ids:
+            new_now = len(set(recipient_ids) - self.store.known(f'recipients:{user_id}', set(recipient_ids)))
+            new_recently = len(self.store.events(f'new:{user_id}', now - RISK_HORIZON_SECONDS))
+            if new_now and new_now + new_recently >= rules['new_recipients_per_hour']:
+                score += 30
+                reasons.append('new_recipients')
+        
+        if kind in ('bank', 'cashout'):
+            received = sum(value for _, value in self.store.events(
+                f'in:{user_id}', now - rules['pass_through_seconds']
+            ))
+            if received and received >= rules['pass_through_ratio'] * amount:
+                score += 50
+                reasons.append('pass_through')
+        
+        if score >= self.deny_score:
+            decision = 'deny'
+        elif score >= self.review_score:
+            decision = 'review'
+        else:
+            decision = 'allow'
+        return decision, score, reasons
+    
+    def record(self, user_id, amount, credits=(), now=None):
+        """Feed a committed outflow of amount and its (recipient_id, amount) credits"""
+        now = time.time() if now is None else now
+        entries = [(f'out:{user_id}', amount)]
+        if credits:
+            # However many credits, a fixed three store round trips
+            recipient_ids = {recipient_id for recipient_id, _ in credits}
+            new_recipients = recipient_ids - self.store.known(f'recipients:{user_id}', recipient_ids)
+            entries += [(f'new:{user_id}', 1)] * len(new_recipients)
+            entries += [(f'in:{recipient_id}', credit) for recipient_id, credit in credits]
+            self.store.remember(f'recipients:{user_id}', recipient_ids, now)
+        self.store.add_many(entries, now)
+
+risk_engine = RiskEngine(create_risk_store(app.config['RISK_STORAGE_URL']))
+
+def settlement_job(transaction, kind, risk):
+    """Queue a payout; ones scored 'review' are held, untouched by the
+    settlement worker, until approve-payout or reject-payout"""
+    return SettlementJob(transaction=transaction, kind=kind, status='held' if risk == 'review' else 'pending')
+
+def assess_risk(user_id, kind, amount, recipient_ids=()):
+    """Score a transfer on the request path; logs anything that is not 'allow'"""
+    with RISK_SCORE_SECONDS.time():
+        decision, score, reasons = risk_engine.score(user_id, kind, amount, recipient_ids)
+    RISK_DECISIONS.labels(kind, decision).inc()
+    if decision != 'allow':
+        app.logger.warning(
+            f"Risk {decision} for user {user_id}: {kind} of {amount} scored {score} ({', '.join(reasons)})"
+        )
+    return decision
+
+def queue_risk_activity(user_id, amount, credits=()):
+    """Feed the risk windows once the current session commits"""
+    db.session.info.setdefault('risk_activity', []).append((user_id, amount, list(credits)))
+
+@event.listens_for(db.session, 'after_commit')
+def _record_risk_activity(session):
+    for user_id, amount, credits in session.info.pop('risk_activity', []):
+        try:
+            risk_engine.record(user_id, amount, credits)
+        except Exception as e:
+            # Losing one sample must never fail a committed transfer
+            print(f"Risk activity not recorded: {e}")
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_risk_activity(session):
+    session.info.pop('risk_activity', None)
+
+@app.cli.command('replay-risk')
+@click.option('--since', default=None, help='Only replay transactions from this date (YYYY-MM-DD).')
+@click.option('--rule', 'overrides', multiple=True, help='Override a rule, e.g. --rule transfers_per_minute=3.')
+@click.option('--review-score', type=int, default=RISK_REVIEW_SCORE)
+@click.option('--deny-score', type=int, default=RISK_DENY_SCORE)
+@click.option('--top', type=int, default=10, help='Most flagged users to list.')
+def replay_risk_command(since, overrides, review_score, deny_score, top):
+    """Score historical transfers with fresh windows to tune the risk thresholds."""
+    rules = dict(RISK_RULES)
+    for override in overrides:
+        name, _, value = override.partition('=')
+        if name not in rules:
+            raise click.BadParameter(f"Unknown rule {name}")
+        rules[name] = float(value) if '.' in value else int(value)
+    engine = RiskEngine(MemoryRiskStore(), rules, review_score, deny_score)
+    
+    kinds = {'Sent': 'send', 'Bank Transfer': 'bank', 'Cash Out': 'cashout'}
+    query = db.select(
+        Transaction.user_id, Transaction.type, Transaction.amount, Transaction.recipient_id,
+        Transaction.journal_id, Transaction.created_at
+    ).where(Transaction.type.in_(list(kinds))).order_by(Transaction.created_at, Transaction.id)
+    if since:
+        query = query.where(Transaction.created_at >= datetime.strptime(since, '%Y-%m-%d'))
+    
+    decisions = {'allow': 0, 'review': 0, 'deny': 0}
+    reason_counts = {}
+    flagged_users = {}
+    
+    def replay(user_id, kind, credits, created_at):
+        now = created_at.timestamp()
+        amount = sum(credit for _, credit in credits)
+        decision, _, reasons = engine.score(user_id, kind, amount, [r for r, _ in credits if r], now)
+        decisions[decision] += 1
+        for reason in reasons:
+            reason_counts[reason] = reason_counts.get(reason, 0) + 1
+        if decision != 'allow':
+            flagged_users[user_id] = flagged_users.get(user_id, 0) + 1
+        engine.record(user_id, amount, [(r, credit) for r, credit in credits if r], now)
+    
+    # Rows of one bulk send share a journal entry; score them as one transfer like the API does
+    pending = None
+    for user_id, type_, amount, recipient_id, journal_id, created_at in db.session.execute(
+        query.execution_options(yield_per=1000)
+    ):
+        group = (user_id, type_, journal_id)
+        if pending and (pending[0] != group or journal_id is None):
+            replay(*pending[1])
+            pending = None
+        if pending:
+            pending[1][2].append((recipient_id, abs(amount)))
+        else:
+            pending = (group, (user_id, kinds[type_], [(recipient_id, abs(amount))], created_at))
+    if pending:
+        replay(*pending[1])
+    
+    total = sum(decisions.values())
+    print(f"Replayed {total} transfers with {rules}")
+    for decision, count in decisions.items():
+        print(f"  {decision}: {count} ({count / total:.1%})" if total else f"  {decision}: 0")
+    for reason, count in sorted(reason_counts.items(), key=lambda item: -item[1]):
+        print(f"  reason {reason}: {count}")
+    for user_id, count in sorted(flagged_users.items(), key=lambda item: -item[1])[:top]:
+        print(f"  user {user_id}: {count} flagged")
+
+# Transfer engine
+DAILY_SEND_LIMIT = 5000000  # ₱50,000
+
+class TransferError(Exception):
+    """Transfer rejected by a business rule; the message is shown to the user"""
+
+MAX_BULK_TRANSFERS = 500
+
+def execute_transfer(sender, recipient, amount, fee, purpose):
+    """Move amount + fee out of sender and amount into recipient.
+
+    Returns the sender's new balance. The caller owns commit/rollback.
+    """
+    return execute_transfers(sender, [(recipient, amount, fee, purpose)])
+
+def record_transfer_metrics(kind, count, amount, fee):
+    """Queue transfer counters on the session; they are only published on commit"""
+    db.session.info.setdefault('transfer_metrics', []).append((kind, count, amount, fee))
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_transfer_metrics(session):
+    for kind, count, amount, fee in session.info.pop('transfer_metrics', []):
+        TRANSFERS_TOTAL.labels(kind).inc(count)
+        TRANSFER_CENTAVOS.labels(kind).inc(amount)
+        TRANSFER_FEE_CENTAVOS.labels(kind).inc(fee)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_transfer_metrics(session):
+    session.info.pop('transfer_metrics', None)
+
+def execute_transfers(sender, transfers):
+    """Apply a batch of (recipient, amount, fee, purpose) transfers from sender.
+
+    All involved user rows are locked in id order so overlapping transfers
+    cannot deadlock, the daily limit and balance are checked once for the
+    batch total, and the debit is a guarded UPDATE so the balance check and
+    the write are a single statement. Either every transfer applies or
+    TransferError is raised. Returns the sender's new balance. The caller
+    owns commit/rollback.
+    """
+    total_amount = sum(amount for _, amount, _, _ in transfers)
+    total_deduction = total_amount + sum(fee for _, _, fee, _ in transfers)
+    
+    credits = {}
+    for recipient, amount, _, _ in transfers:
+        credits[recipient.id] = credits.get(recipient.id, 0) + amount
+    
+    db.session.execute(
+        db.select(User.id)
+        .where(User.id.in_([sender.id, *credits]))
+        .order_by(User.id)
+        .with_for_update()
+    ).all()
+    
+    # Daily limit is checked after locking so parallel sends are serialised
+    today = datetime.utcnow().date()
+    today_sent = db.session.execute(
+        db.select(DailySendTotal.total)
+        .where(DailySendTotal.user_id == sender.id, DailySendTotal.day == today)
+    ).scalar()
+    
+    if (today_sent or 0) + total_amount > DAILY_SEND_LIMIT:
+        raise TransferError('Daily sending limit exceeded (₱50,000)')
+    
+    new_balance = db.session.execute(
+        db.update(User)
+        .where(User.id == sender.id, User.balance >= total_deduction)
+        .values(balance=User.balance - total_deduction, balance_version=User.balance_version + 1)
+        .returning(User.balance)
+    ).scalar()
+    
+    if new_balance is None:
+        raise TransferError('Insufficient balance')
+    
+    if today_sent is None:
+        db.session.execute(db.insert(DailySendTotal).values(
+            user_id=sender.id, day=today, total=total_amount
+        ))
+    else:
+        db.session.execute(
+            db.update(DailySendTotal)
+            .where(DailySendTotal.user_id == sender.id, DailySendTotal.day == today)
+            .values(total=DailySendTotal.total + total_amount)
+        )
+    
+    journal_id = post_journal('transfer', [
+        (wallet_account(sender.id), sender.id, -total_deduction),
+        *[(wallet_account(recipient_id), recipient_id, credit) for recipient_id, credit in credits.items()],
+        (FEE_REVENUE_ACCOUNT, None, total_deduction - total_amount),
+    ])
+    
+    users = User.__table__
+    db.session.execute(
+        db.update(users)
+        .where(users.c.id == db.bindparam('recipient_id'))
+        .values(
+            balance=users.c.balance + db.bindparam('credit'),
+            balance_version=users.c.balance_version + 1
+        ),
+        [{'recipient_id': recipient_id, 'credit': credit} for recipient_id, credit in credits.items()]
+    )
+    
+    recipient_balances = dict(db.session.execute(
+        db.select(User.id, User.balance).where(User.id.in_(credits))
+    ).all())
+    
+    now = datetime.utcnow()
+    rows = []
+    for recipient, amount, fee, purpose in transfers:
+        rows.append({
+            'user_id': sender.id,
+            'type': 'Sent',
+            'amount': -amount,
+            'fee': -fee,
+            'note': f'To {recipient.name} ({purpose})',
+            'recipient_id': recipient.id,
+            'recipient_name': recipient.name,
+            'journal_id': journal_id,
+            'created_at': now
+        })
+        rows.append({
+            'user_id': recipient.id,
+            'type': 'Received',
+            'amount': amount,
+            'fee': 0,
+            'note': f'From {sender.name} ({purpose})',
+            'recipient_id': sender.id,
+            'recipient_name': sender.name,
+            'journal_id': journal_id,
+            'created_at': now
+        })
+    db.session.execute(db.insert(Transaction), rows)
+    
+    # Newest first, the order the history list shows them in
+    transaction_rows = {}
+    for row in reversed(rows):
+        transaction_rows.setdefault(row['user_id'], []).append(Transaction(**row))
+    publish_wallet_event(sender.id, new_balance, transaction_rows[sender.id])
+    for recipient_id in credits:
+        publish_wallet_event(recipient_id, recipient_balances[recipient_id], transaction_rows[recipient_id])
+    record_transfer_metrics('send', len(transfers), total_amount, total_deduction - total_amount)
+    queue_risk_activity(sender.id, total_amount, credits.items())
+    
+    return new_balance
+
+def execute_payout(user, kind, amount, fee, **details):
+    """Debit amount + fee for a payout leaving the wallet (bank or cashout).
+
+    The amount moves to the clearing:<kind> account until settlement and the
+    fee to revenue. Returns (new_balance, transaction); the caller owns
+    commit/rollback.
+    """
+    total_deduction = amount + fee
+    new_balance = db.session.execute(
+        db.update(User)
+        .where(User.id == user.id, User.balance >= total_deduction)
+        .values(balance=User.balance - total_deduction, balance_version=User.balance_version + 1)
+        .returning(User.balance)
+    ).scalar()
+    
+    if new_balance is None:
+        raise TransferError('Insufficient balance')
+    
+    journal_id = post_journal(kind, [
+        (wallet_account(user.id), user.id, -total_deduction),
+        (f'clearing:{kind}', None, amount),
+        (FEE_REVENUE_ACCOUNT, None, fee),
+    ])
+    
+    transaction = Transaction(
+        user_id=user.id,
+        amount=-amount,
+        fee=-fee,
+        journal_id=journal_id,
+        created_at=datetime.utcnow(),
+        **details
+    )
+    db.session.add(transaction)
+    publish_wallet_event(user.id, new_balance, [transaction])
+    record_transfer_metrics(kind, 1, amount, fee)
+    queue_risk_activity(user.id, amount)
+    return new_balance, transaction
+
+def reconcile_daily_send_totals():
+    """Rebuild daily_send_totals from the 'Sent' rows in transactions.
+
+    Returns the number of counters that were missing or disagreed with the
+    transaction log. Days in archived months are left alone: their rows are
+    no longer in the table to count.
+    """
+    archived_through = db.session.query(db.func.max(TransactionArchive.month)).scalar()
+    live_from = add_months(datetime.combine(archived_through, datetime.min.time()), 1) if archived_through else datetime.min
+    
+    sent_day = db.func.date(Transaction.created_at)
+    expected = {}
+    for user_id, day, total in db.session.query(
+        Transaction.user_id, sent_day, -db.func.sum(Transaction.amount)
+    ).filter(
+        Transaction.type == 'Sent', Transaction.created_at >= live_from
+    ).group_by(Transaction.user_id, sent_day):
+        if isinstance(day, str):
+            day = datetime.strptime(day, '%Y-%m-%d').date()
+        expected[(user_id, day)] = total
+
+    corrected = 0
+    for counter in DailySendTotal.query.filter(DailySendTotal.day >= live_from.date()):
+        total = expected.pop((counter.user_id, counter.day), 0)
+        if counter.total != total:
+            counter.total = total
+            corrected += 1
+
+    for (user_id, day), total in expected.items():
+        db.session.add(DailySendTotal(user_id=user_id, day=day, total=total))
+        corrected += 1
+
+    db.session.commit()
+    return corrected
+
+@app.cli.command('reconcile-daily-totals')
+def reconcile_daily_totals_command():
+    """Backfill and repair the per-day send counters."""
+    corrected = reconcile_daily_send_totals()
+    print(f"Reconciled daily send totals ({corrected} counters corrected)")
+
+# Transaction partitions and archive
+PARTITION_CHECK_SECONDS = 3600
+PARTITION_LOCK_ID = 72110402  # pg_advisory_xact_lock key for partition creation
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return datetime(month.year + years, month_index + 1, 1)
+
+def partition_name(month):
+    return f"transactions_{month:%Y_%m}"
+
+def transactions_partitioned(conn):
+    if conn.dialect.name != 'postgresql':
+        return False
+    return conn.execute(db.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('transactions')"
+    )).first() is not None
+
+def create_transaction_partition(conn, month):
+    """Create the partition for one month; returns False if it already exists"""
+    name = partition_name(month)
+    if conn.execute(db.text('SELECT to_regclass(:name)'), {'name': name}).scalar():
+        return False
+    
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    in_month = {'start': month, 'end': add_months(month, 1)}
+    strays = conn.execute(db.text(
+        'SELECT 1 FROM transactions_default WHERE created_at >= :start AND created_at < :end LIMIT 1'
+    ), in_month).first()
+    if strays is None:
+        conn.execute(db.text(f"CREATE TABLE {name} PARTITION OF transactions {bounds}"))
+        return True
+    
+    # The month was missed and its rows went to transactions_default, which
+    # Postgres will not let a new partition overlap: move them, then attach
+    conn.execute(db.text(f'CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS)'))
+    conn.execute(db.text(
+        f'WITH moved AS (DELETE FROM transactions_default '
+        f'WHERE created_at >= :start AND created_at < :end RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    ), in_month)
+    conn.execute(db.text(f'ALTER TABLE transactions ATTACH PARTITION {name} {bounds}'))
+    return True
+
+def ensure_transaction_partitions(conn, months_ahead=None):
+    """Create this month's partition and the next months_ahead; returns how many were new.
+
+    Rows outside every partition land in transactions_default, so partitions
+    are made well before they are needed: hourly in every web worker (from
+    its first request) and in the settlement worker, and by create-partitions.
+    """
+    if not transactions_partitioned(conn):
+        return 0
+    # Every worker runs this; one at a time, and the rest find nothing to do
+    conn.execute(db.text('SELECT pg_advisory_xact_lock(:id)'), {'id': PARTITION_LOCK_ID})
+    if months_ahead is None:
+        months_ahead = app.config['PARTITION_MONTHS_AHEAD']
+    month = month_start(datetime.utcnow())
+    created = 0
+    for offset in range(months_ahead + 1):
+        created += create_transaction_partition(conn, add_months(month, offset))
+    return created
+
+_partition_maintainer_pid = None
+
+def _run_partition_maintainer():
+    while True:
+        with app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    ensure_transaction_partitions(conn)
+            except Exception as e:
+                print(f"Partition maintenance failed: {e}")
+        time.sleep(PARTITION_CHECK_SECONDS)
+
+def ensure_partition_maintainer():
+    """Start the hourly partition check once per worker process (Postgres only)"""
+    global _partition_maintainer_pid
+    if _partition_maintainer_pid != os.getpid() and db.engine.dialect.name == 'postgresql':
+        _partition_maintainer_pid = os.getpid()
+        threading.Thread(target=_run_partition_maintainer, daemon=True).start()
+
+@app.before_request
+def start_partition_maintainer():
+    # Not at import: with preload_app the master imports, and its threads
+    # do not survive the fork into the workers
+    ensure_partition_maintainer()
+
+@app.cli.command('create-partitions')
+@click.option('--months-ahead', type=int, default=None, help='Future months to create (default PARTITION_MONTHS_AHEAD).')
+def create_partitions_command(months_ahead):
+    """Create upcoming monthly transactions partitions."""
+    with db.engine.begin() as conn:
+        if not transactions_partitioned(conn):
+            print("transactions is not partitioned (Postgres only)")
+            return
+        print(f"Created {ensure_transaction_partitions(conn, months_ahead)} partitions")
 
-# Configure PostgreSQL database
-DATABASE_URL = os.environ.get('DATABASE_URL')
+ARCHIVE_COLUMNS = [column.name for column in Transaction.__table__.columns]
 
-# Fix URL format for newer PostgreSQL
-if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
-    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+def archive_path(filename):
+    return os.path.join(app.config['TRANSACTION_ARCHIVE_DIR'], filename)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_recycle': 300,
-    'pool_pre_ping': True,
-}
+def _archive_csv(rows, header=False):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(ARCHIVE_COLUMNS)
+    for values in rows:
+        writer.writerow([
+            json.dumps(values[name]) if name == 'bank_details' and values[name] is not None
+            else values[name].isoformat() if name == 'created_at'
+            else values[name]
+            for name in ARCHIVE_COLUMNS
+        ])
+    return buffer.getvalue().encode()
 
-db = SQLAlchemy(app)
+def archive_transaction_month(conn, month):
+    """Move one month of transactions to CSV.gz and drop them from the database.
 
-# Models
-class User(db.Model):
-    __tablename__ = 'users'
+    The header and then each user's rows (newest first) are written as
+    separate gzip members, so the file still reads as one CSV with
+    gzip.open, while history seeks straight to a user's member via the
+    offsets in TransactionArchiveUser. Returns the number of rows archived.
+    """
+    start, end = month, add_months(month, 1)
+    in_month = (Transaction.created_at >= start) & (Transaction.created_at < end)
     
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    phone = db.Column(db.String(20), unique=True, nullable=False)
-    birthdate = db.Column(db.Date)
-    address = db.Column(db.Text)
-    wallet_id = db.Column(db.String(20), unique=True, nullable=False)
-    pin_hash = db.Column(db.String(200), nullable=False)
-    balance = db.Column(db.Float, default=500.0, nullable=False)
-    failed_login_attempts = db.Column(db.Integer, default=0)
-    locked_until = db.Column(db.DateTime, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Reversals still need the original row, and since the partition rebuild
+    # there is no foreign key to stop it disappearing under an open job
+    unsettled = conn.execute(
+        db.select(db.func.count()).select_from(SettlementJob)
+        .join(Transaction, SettlementJob.transaction_id == Transaction.id)
+        .where(SettlementJob.status.in_(('pending', 'held', 'failed')), in_month)
+    ).scalar()
+    if unsettled:
+        raise ValueError(f"{month:%Y-%m} still has {unsettled} pending, held or failed settlement jobs")
+    
+    # Rollups are built from live rows, so they must have seen the month first
+    last_id = conn.execute(db.select(db.func.max(Transaction.id)).where(in_month)).scalar()
+    watermark = conn.execute(db.select(RollupState.watermark).where(RollupState.id == 1)).scalar()
+    if last_id and (watermark or 0) < last_id:
+        raise ValueError(f"{month:%Y-%m} is not rolled up yet; run refresh-rollups first")
+    
+    filename = f"transactions_{month:%Y_%m}.csv.gz"
+    path = archive_path(filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    
+    members = []
+    result = conn.execution_options(yield_per=1000).execute(
+        db.select(Transaction.__table__)
+        .where(in_month)
+        .order_by(Transaction.user_id, Transaction.created_at.desc(), Transaction.id.desc())
+    )
+    with open(f"{path}.tmp", 'wb') as archive:
+        archive.write(gzip.compress(_archive_csv([], header=True)))
+        
+        def write_member(user_id, rows):
+            member = gzip.compress(_archive_csv(rows))
+            members.append({'user_id': user_id, 'row_count': len(rows),
+                            'byte_offset': archive.tell(), 'byte_length': len(member)})
+            archive.write(member)
+        
+        user_id, rows = None, []
+        for row in result:
+            if row.user_id != user_id and rows:
+                write_member(user_id, rows)
+                rows = []
+            user_id = row.user_id
+            rows.append(row._mapping)
+        if rows:
+            write_member(user_id, rows)
+    if not members:
+        os.remove(f"{path}.tmp")
+        return 0
+    os.replace(f"{path}.tmp", path)
+    
+    row_count = sum(member['row_count'] for member in members)
+    archive_id = conn.execute(
+        db.insert(TransactionArchive).values(
+            month=start.date(), filename=filename, row_count=row_count
+        ).returning(TransactionArchive.id)
+    ).scalar()
+    conn.execute(db.insert(TransactionArchiveUser), [{'archive_id': archive_id, **member} for member in members])
+    
+    # Dropping the partition is instant and leaves no dead tuples; the DELETE
+    # then only finds stragglers in transactions_default (or does it all off Postgres)
+    if transactions_partitioned(conn) and conn.execute(
+        db.text('SELECT to_regclass(:name)'), {'name': partition_name(month)}
+    ).scalar():
+        conn.execute(db.text(f'DROP TABLE {partition_name(month)}'))
+    conn.execute(db.delete(Transaction).where(in_month))
+    return row_count
 
-class Transaction(db.Model):
-    __tablename__ = 'transactions'
+def archive_transactions(older_than_months):
+    """Archive every month older than the cutoff; returns [(month, rows)]"""
+    cutoff = add_months(month_start(datetime.utcnow()), -older_than_months)
+    with db.engine.connect() as conn:
+        oldest = conn.execute(
+            db.select(db.func.min(Transaction.created_at)).where(Transaction.created_at < cutoff)
+        ).scalar()
     
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    type = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    fee = db.Column(db.Float, default=0.0)
-    note = db.Column(db.Text)
-    recipient_id = db.Column(db.Integer, nullable=True)
-    recipient_name = db.Column(db.String(100))
-    bank_details = db.Column(db.JSON, nullable=True)
-    cashout_method = db.Column(db.String(50), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    archived = []
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        # One transaction per month: the file is only referenced once its rows are gone
+        with db.engine.begin() as conn:
+            archived.append((month, archive_transaction_month(conn, month)))
+        month = add_months(month, 1)
+    return archived
 
-# Helper functions
-def calculate_fee(amount):
-    """Calculate 5% fee with minimum ₱5"""
-    fee = amount * 0.05  # 5%
-    return max(fee, 5.0)  # Minimum ₱5
+@app.cli.command('archive-transactions')
+@click.option('--older-than', type=int, default=12, help='Archive months older than this many months.')
+def archive_transactions_command(older_than):
+    """Move old months of transactions to compressed CSV files."""
+    for month, rows in archive_transactions(older_than):
+        print(f"{month:%Y-%m}: archived {rows} transactions")
 
-def validate_pin(pin):
-    """Validate PIN is 4 digits"""
-    return bool(re.match(r'^\d{4}$', pin))
+def _parse_archive_row(row):
+    values = {name: row[name] or None for name in ARCHIVE_COLUMNS}
+    for name in ('id', 'user_id', 'amount', 'fee', 'recipient_id', 'journal_id'):
+        if values[name] is not None:
+            values[name] = int(values[name])
+    if values['bank_details'] is not None:
+        values['bank_details'] = json.loads(values['bank_details'])
+    values['created_at'] = datetime.fromisoformat(values['created_at'])
+    return Transaction(**values)
 
-def check_account_lock(user):
-    """Check if account is locked due to failed attempts"""
-    if user.locked_until and user.locked_until > datetime.utcnow():
-        return True
-    return False
+def _read_archive(filename, user_id, byte_offset=None, byte_length=None):
+    """Yield one user's archived transactions from a file, newest first"""
+    if byte_offset is not None:
+        with open(archive_path(filename), 'rb') as archive:
+            archive.seek(byte_offset)
+            member = gzip.decompress(archive.read(byte_length)).decode()
+        for row in csv.DictReader(io.StringIO(member, newline=''), fieldnames=ARCHIVE_COLUMNS):
+            yield _parse_archive_row(row)
+        return
+    
+    # Older single-member archives: scan up to the user's block
+    with gzip.open(archive_path(filename), 'rt', newline='') as archive:
+        for row in csv.DictReader(archive):
+            row_user = int(row['user_id'])
+            if row_user < user_id:
+                continue
+            if row_user > user_id:
+                return
+            yield _parse_archive_row(row)
+
+def _user_archives(user_id):
+    """(month, filename, byte_offset, byte_length) of every archive holding user_id, newest first"""
+    return db.session.execute(
+        db.select(
+            TransactionArchive.month, TransactionArchive.filename,
+            TransactionArchiveUser.byte_offset, TransactionArchiveUser.byte_length
+        )
+        .join(TransactionArchiveUser, TransactionArchiveUser.archive_id == TransactionArchive.id)
+        .where(TransactionArchiveUser.user_id == user_id)
+        .order_by(TransactionArchive.month.desc())
+    ).all()
+
+def read_archived_transactions(user_id, before, limit):
+    """Up to limit archived transactions for a user older than the (created_at, id)
+    cursor, newest first. They come back as unsaved Transaction objects."""
+    transactions = []
+    for month, filename, byte_offset, byte_length in _user_archives(user_id):
+        if before and month > before[0].date():
+            continue
+        for transaction in _read_archive(filename, user_id, byte_offset, byte_length):
+            if before and (transaction.created_at, transaction.id) >= before:
+                continue
+            transactions.append(transaction)
+            if len(transactions) == limit:
+                return transactions
+    return transactions
+
+def iter_archived_transactions(user_id, start, end=None):
+    """Yield a user's archived transactions with start <= created_at < end, oldest first"""
+    for month, filename, byte_offset, byte_length in reversed(_user_archives(user_id)):
+        if add_months(datetime.combine(month, datetime.min.time()), 1) <= start:
+            continue
+        if end and datetime.combine(month, datetime.min.time()) >= end:
+            return
+        # One user's month at a time, reversed into date order
+        for transaction in reversed(list(_read_archive(filename, user_id, byte_offset, byte_length))):
+            if transaction.created_at >= start and (end is None or transaction.created_at < end):
+                yield transaction
+
+# Analytics rollups
+ROLLUP_BATCH_SIZE = 50000  # transaction ids folded per refresh_rollups() call
+INSIGHTS_MAX_MONTHS = 24
+TOP_RECIPIENTS = 5
+
+def refresh_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """Fold transactions past the watermark into the monthly rollups.
+
+    Like reconcile_ledger, rows younger than LEDGER_SETTLE_SECONDS are left
+    for the next run so a slow commit with a lower id is not skipped. The
+    state row is locked, so concurrent runs queue instead of double counting.
+    Returns the number of transactions folded.
+    """
+    state = db.session.execute(
+        db.select(RollupState).where(RollupState.id == 1).with_for_update()
+    ).scalar_one()
+    previous = state.watermark
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=LEDGER_SETTLE_SECONDS)
+    watermark = min(previous + batch_size, max(previous, db.session.query(db.func.max(Transaction.id)).filter(
+        Transaction.created_at < cutoff
+    ).scalar() or 0))
+    
+    totals = {}
+    recipients = {}
+    rows = db.session.execute(
+        db.select(
+            Transaction.user_id, Transaction.type, Transaction.amount, Transaction.fee,
+            Transaction.recipient_id, Transaction.recipient_name, Transaction.created_at
+        ).where(Transaction.id > previous, Transaction.id <= watermark)
+        .execution_options(yield_per=1000)
+    )
+    folded = 0
+    for user_id, type_, amount, fee, recipient_id, recipient_name, created_at in rows:
+        folded += 1
+        month = month_start(created_at).date()
+        total = totals.setdefault((user_id, month, type_), [0, 0, 0])
+        total[0] += 1
+        total[1] += abs(amount)
+        # Fees are stored as debits (negative); a Reversal's positive fee is
+        # a refund and nets out of the fees paid
+        total[2] -= fee or 0
+        if type_ == 'Sent' and recipient_id is not None:
+            sent = recipients.setdefault((user_id, month, recipient_id), [recipient_name, 0, 0])
+            sent[0] = recipient_name
+            sent[1] += 1
+            sent[2] += abs(amount)
+    
+    if totals:
+        existing = {(r.user_id, r.month, r.type): r for r in MonthlyRollup.query.filter(
+            db.tuple_(MonthlyRollup.user_id, MonthlyRollup.month, MonthlyRollup.type).in_(list(totals))
+        )}
+        for key, (count, amount, fees) in totals.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                rollup = MonthlyRollup(user_id=key[0], month=key[1], type=key[2], count=0, amount=0, fees=0)
+                db.session.add(rollup)
+            rollup.count += count
+            rollup.amount += amount
+            rollup.fees += fees
+    
+    if recipients:
+        existing = {(r.user_id, r.month, r.recipient_id): r for r in RecipientRollup.query.filter(
+            db.tuple_(RecipientRollup.user_id, RecipientRollup.month, RecipientRollup.recipient_id).in_(list(recipients))
+        )}
+        for key, (name, count, amount) in recipients.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                rollup = RecipientRollup(user_id=key[0], month=key[1], recipient_id=key[2], count=0, amount=0)
+                db.session.add(rollup)
+            rollup.recipient_name = name
+            rollup.count += count
+            rollup.amount += amount
+    
+    state.watermark = watermark
+    state.updated_at = datetime.utcnow()
+    db.session.commit()
+    return folded
+
+@app.cli.command('refresh-rollups')
+def refresh_rollups_command():
+    """Fold new transactions into the analytics rollups."""
+    total = 0
+    while True:
+        folded = refresh_rollups()
+        total += folded
+        if not folded:
+            break
+    print(f"Folded {total} transactions into rollups")
+
+def insights_window():
+    """First month (a date) of the window requested with ?months=, or None if invalid"""
+    try:
+        months = min(max(int(request.args.get('months', 6)), 1), INSIGHTS_MAX_MONTHS)
+    except ValueError:
+        return None
+    return add_months(month_start(datetime.utcnow()), -(months - 1)).date()
+
+def sum_bigint(column):
+    # SUM over BIGINT is NUMERIC on Postgres and would serialize as a string
+    return db.cast(db.func.sum(column), db.BigInteger)
+
+def top_recipients_query(user_id, since):
+    return db.select(
+        RecipientRollup.recipient_id,
+        db.func.max(RecipientRollup.recipient_name),
+        sum_bigint(RecipientRollup.count),
+        sum_bigint(RecipientRollup.amount).label('amount')
+    ).where(
+        RecipientRollup.user_id == user_id, RecipientRollup.month >= since
+    ).group_by(RecipientRollup.recipient_id).order_by(db.desc('amount')).limit(TOP_RECIPIENTS)
+
+def platform_totals_query(since):
+    """(month, type, count, amount, fees) over every user's rollups"""
+    return db.select(
+        MonthlyRollup.month, MonthlyRollup.type, sum_bigint(MonthlyRollup.count),
+        sum_bigint(MonthlyRollup.amount), sum_bigint(MonthlyRollup.fees)
+    ).where(MonthlyRollup.month >= since).group_by(MonthlyRollup.month, MonthlyRollup.type)
+
+def rollup_as_of():
+    return db.session.execute(
+        db.select(RollupState.updated_at).where(RollupState.id == 1)
+    ).scalar()
+
+# User search
+SEARCH_LIMIT = 10
+SEARCH_FALLBACK_SCAN = 1000  # matches ranked in-process where pg_trgm is unavailable
+IDENTIFIER_PREFIX_RE = re.compile(r'^(\+?\d+|cash\d*)$', re.IGNORECASE)
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input is matched literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def trigrams(text):
+    """pg_trgm's trigram set: lower-cased words padded with two spaces in front and one behind"""
+    grams = set()
+    for word in re.findall(r'[^\W_]+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def trigram_similarity(a, b):
+    """pg_trgm's similarity(): shared trigrams over the trigrams of both strings"""
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+def find_users(query, exclude_user_id):
+    """Search users by wallet ID, phone or name.
+
+    Wallet ID / phone prefixes are answered from B-tree range scans. Other
+    queries are substring matches, which PostgreSQL serves from the pg_trgm
+    GIN indexes and ranks by similarity. Other databases (SQLite in tests
+    and local runs) have no pg_trgm, so the first SEARCH_FALLBACK_SCAN
+    matches are ranked in-process by trigram_similarity() instead, which
+    gives the same order.
+    """
+    pattern = escape_like(query)
+    candidates = User.query.filter(User.id != exclude_user_id)
+    
+    if IDENTIFIER_PREFIX_RE.match(query):
+        users = candidates.filter(
+            User.wallet_id.like(pattern.upper() + '%', escape='\\') |
+            User.phone.like(pattern + '%', escape='\\')
+        ).order_by(User.wallet_id).limit(SEARCH_LIMIT).all()
+        if users:
+            return users
+    
+    # Trigram indexes need at least three characters for an infix match
+    if len(query) < 3:
+        return candidates.filter(
+            User.name.ilike(pattern + '%', escape='\\')
+        ).order_by(User.name).limit(SEARCH_LIMIT).all()
+    
+    candidates = candidates.filter(
+        User.wallet_id.ilike(f'%{pattern}%', escape='\\') |
+        User.phone.ilike(f'%{pattern}%', escape='\\') |
+        User.name.ilike(f'%{pattern}%', escape='\\')
+    )
+    
+    if db.engine.dialect.name == 'postgresql':
+        return candidates.order_by(db.func.similarity(User.name, query).desc()).limit(SEARCH_LIMIT).all()
+    
+    matches = candidates.limit(SEARCH_FALLBACK_SCAN).all()
+    matches.sort(key=lambda user: trigram_similarity(user.name, query), reverse=True)
+    return matches[:SEARCH_LIMIT]
+
+# HTTP caching and compression
+STATIC_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'text/javascript', 'application/javascript', 'text/plain'
+}
+
+_asset_digests = {}
+_compressed_assets = {}
+_shell_page = {}
+
+def asset_digest(filename):
+    """Content hash of a file under static/, computed once per worker"""
+    digest = _asset_digests.get(filename)
+    if digest is None or app.debug:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        _asset_digests[filename] = digest
+    return digest
+
+def asset_url(filename):
+    """Fingerprinted static URL: the content hash changes whenever the file
+    does, so browsers may cache each URL forever"""
+    return url_for('static', filename=filename, v=asset_digest(filename))
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+def cached_json(etag, build):
+    """jsonify(build()) under a weak ETag the browser revalidates on every
+    request; while etag is unchanged it gets a bodiless 304 and build() (the
+    query and serialization) is skipped"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def compress_body(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level == 'max' else 5)
+    return gzip.compress(data, compresslevel=9 if level == 'max' else 6)
+
+@app.after_request
+def cache_static_assets(response):
+    # Only the URL asset_url() handed out is immutable; a stale ?v= gets the
+    # default revalidating headers so it cannot pin new content to an old URL
+    if (request.endpoint == 'static' and response.status_code == 200
+            and request.args.get('v') == asset_digest(request.view_args['filename'])):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses with brotli (when installed) or gzip.
+
+    Streams (SSE, exports) are left alone so they keep flushing per chunk.
+    Fingerprinted assets are compressed once per worker at the highest level.
+    """
+    static = request.endpoint == 'static'
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or (response.is_streamed and not static)):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+    
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    
+    if static:
+        key = (request.view_args['filename'], request.args.get('v'), encoding)
+        if key not in _compressed_assets:
+            _compressed_assets[key] = compress_body(data, encoding, 'max')
+        response.set_data(_compressed_assets[key])
+    else:
+        response.set_data(compress_body(data, encoding, 'fast'))
+    response.headers['Content-Encoding'] = encoding
+    
+    # The compressed bytes differ from the identity ones, so a strong
+    # validator would be wrong for them
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
 
 # Routes
 @app.route('/')
 def home():
-    return render_template('index.html')
+    # The shell only changes on deploy (asset URLs carry their own hashes), so
+    # it is rendered once per worker and revalidated against its ETag
+    if 'body' not in _shell_page or app.debug:
+        body = render_template('index.html')
+        _shell_page['etag'] = hashlib.sha256(body.encode()).hexdigest()[:16]
+        _shell_page['body'] = body
+    
+    response = app.response_class(_shell_page['body'], mimetype='text/html')
+    response.set_etag(_shell_page['etag'], weak=True)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/register', methods=['POST'])
+@rate_limited('auth')
 def register():
     try:
         data = request.get_json()
@@ -106,16 +2749,18 @@ def register():
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
             return jsonify({'success': False, 'error': 'Invalid email format'}), 400
         
-        # Check if email or phone exists
-        if User.query.filter_by(email=email).first():
+        # Check if email or phone exists (one query for both)
+        taken = db.session.query(User.email, User.phone).filter(
+            (User.email == email) | (User.phone == phone)
+        ).all()
+        
+        if any(existing_email == email for existing_email, _ in taken):
             return jsonify({'success': False, 'error': 'Email already registered'}), 400
         
-        if User.query.filter_by(phone=phone).first():
+        if taken:
             return jsonify({'success': False, 'error': 'Phone number already registered'}), 400
         
-        # Generate wallet ID
-        count = db.session.query(User).count()
-        wallet_id = f"CASH{datetime.now().strftime('%y%m%d')}{count + 10000:04d}"
+        wallet_id = generate_wallet_id()
         
         # Create user
         user = User(
@@ -125,12 +2770,17 @@ def register():
             birthdate=datetime.strptime(birthdate, '%Y-%m-%d') if birthdate else None,
             address=address,
             wallet_id=wallet_id,
-            pin_hash=generate_password_hash(pin),
-            balance=500.0,
+            pin_hash=pin_hasher.hash(pin),
+            balance=SIGNUP_BONUS,
             failed_login_attempts=0
         )
         
         db.session.add(user)
+        db.session.flush()
+        post_journal('opening', [
+            (wallet_account(user.id), user.id, SIGNUP_BONUS),
+            (PROMOTIONS_ACCOUNT, None, -SIGNUP_BONUS),
+        ])
         db.session.commit()
         
         return jsonify({
@@ -146,11 +2796,17 @@ def register():
             }
         })
         
+    except db.exc.IntegrityError:
+        # Lost a race with a concurrent signup for the same email/phone
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Email or phone number already registered'}), 400
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited('auth')
 def login():
     try:
         data = request.get_json()
@@ -170,88 +2826,84 @@ def login():
         if not user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
-        # Check if account is locked
+        # Check if account is locked (in the row, or by failures counted in a shared store)
         if check_account_lock(user):
             return jsonify({
                 'success': False, 
                 'error': f'Account locked. Try again at {user.locked_until.strftime("%H:%M:%S")}'
             }), 423
         
+        if rate_limit_store.shared and rate_limit_store.get(f'login-failures:{user.id}') >= MAX_FAILED_LOGINS:
+            return jsonify({
+                'success': False, 
+                'error': 'Account locked for 15 minutes due to too many failed attempts'
+            }), 423
+        
         # Check PIN
-        if not check_password_hash(user.pin_hash, pin):
-            user.failed_login_attempts += 1
+        if not pin_hasher.verify(user.pin_hash, pin):
+            failures = record_login_failure(user)
             
             # Lock account after 5 failed attempts for 15 minutes
-            if user.failed_login_attempts >= 5:
-                user.locked_until = datetime.utcnow() + timedelta(minutes=15)
-                db.session.commit()
+            if failures >= MAX_FAILED_LOGINS:
                 return jsonify({
                     'success': False, 
                     'error': 'Account locked for 15 minutes due to too many failed attempts'
                 }), 423
             
-            db.session.commit()
             return jsonify({
                 'success': False, 
-                'error': f'Invalid PIN. {5 - user.failed_login_attempts} attempts remaining'
+                'error': f'Invalid PIN. {MAX_FAILED_LOGINS - failures} attempts remaining'
             }), 401
         
-        # Reset failed attempts on successful login
-        user.failed_login_attempts = 0
-        user.locked_until = None
-        db.session.commit()
+        clear_login_failures(user)
+        
+        # Upgrade hashes made with older parameters while we have the PIN
+        if pin_hasher.needs_rehash(user.pin_hash):
+            user.pin_hash = pin_hasher.hash(pin)
+            db.session.commit()
         
         # Set session
         session['user_id'] = user.id
         session.permanent = True
+        grant_pin_step_up(user, pin)
         
         return jsonify({
             'success': True,
-            'user': {
-                'id': user.id,
-                'name': user.name,
-                'email': user.email,
-                'phone': user.phone,
-                'wallet_id': user.wallet_id,
-                'balance': user.balance,
-                'address': user.address,
-                'birthdate': user.birthdate.strftime('%Y-%m-%d') if user.birthdate else None
-            }
+            'user': serialize_user(user)
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/logout', methods=['POST'])
+@rate_limited('read')
 def logout():
     session.pop('user_id', None)
+    session.pop('pin_step_up', None)
     return jsonify({'success': True, 'message': 'Logged out'})
 
 @app.route('/api/current-user', methods=['GET'])
+@rate_limited('read')
+@replica_reads
 def get_current_user():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    user = User.query.get(user_id)
-    if not user:
+    profile = user_cache.get(user_id)
+    if not profile:
         return jsonify({'success': False, 'error': 'User not found'}), 404
     
-    return jsonify({
+    # Cached profiles are dropped by the wallet event of every balance write,
+    # so the ETag moves as soon as one commits
+    return cached_json(f"user-{user_id}-{profile['balance_version']}", lambda: {
         'success': True,
-        'user': {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'phone': user.phone,
-            'wallet_id': user.wallet_id,
-            'balance': user.balance,
-            'address': user.address,
-            'birthdate': user.birthdate.strftime('%Y-%m-%d') if user.birthdate else None
-        }
+        'user': profile
     })
 
 @app.route('/api/send-money', methods=['POST'])
+@rate_limited('money')
+@idempotent
 def send_money():
     try:
         user_id = session.get('user_id')
@@ -260,20 +2912,20 @@ def send_money():
         
         data = request.get_json()
         recipient_identifier = data.get('to')
-        amount = float(data.get('amount', 0))
+        amount = parse_centavos(data.get('amount', 0))
         purpose = data.get('purpose', 'Money Transfer')
         pin = data.get('pin')
         
         # Validations
-        if amount <= 0:
+        if amount is None or amount <= 0:
             return jsonify({'success': False, 'error': 'Invalid amount'}), 400
         
-        if amount < 10:
+        if amount < 1000:
             return jsonify({'success': False, 'error': 'Minimum amount is ₱10'}), 400
         
         # Get sender
-        sender = User.query.get(user_id)
-        if not check_password_hash(sender.pin_hash, pin):
+        sender = db.session.get(User, user_id)
+        if not verify_user_pin(sender, pin):
             return jsonify({'success': False, 'error': 'Invalid PIN'}), 401
         
         # Find recipient
@@ -288,57 +2940,21 @@ def send_money():
         if recipient.id == sender.id:
             return jsonify({'success': False, 'error': 'Cannot send money to yourself'}), 400
         
-        # Calculate fee (5% with minimum ₱5)
-        fee = calculate_fee(amount)
-        total_deduction = amount + fee
-        
-        # Check daily limit (₱50,000)
-        today = datetime.utcnow().date()
-        today_sent = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == sender.id,
-            Transaction.type == 'Sent',
-            Transaction.created_at >= today
-        ).scalar() or 0
-        
-        if today_sent + amount > 50000:
-            return jsonify({'success': False, 'error': 'Daily sending limit exceeded (₱50,000)'}), 400
-        
-        if sender.balance < total_deduction:
-            return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-        
-        # Update balances
-        sender.balance -= total_deduction
-        recipient.balance += amount
-        
-        # Create transactions
-        sender_transaction = Transaction(
-            user_id=sender.id,
-            type='Sent',
-            amount=-amount,
-            fee=-fee,
-            note=f'To {recipient.name} ({purpose})',
-            recipient_id=recipient.id,
-            recipient_name=recipient.name
-        )
+        if assess_risk(sender.id, 'send', amount, [recipient.id]) == 'deny':
+            return jsonify({'success': False, 'error': RISK_DENIED_MESSAGE}), 403
         
-        recipient_transaction = Transaction(
-            user_id=recipient.id,
-            type='Received',
-            amount=amount,
-            fee=0,
-            note=f'From {sender.name} ({purpose})',
-            recipient_id=sender.id,
-            recipient_name=sender.name
-        )
+        fee = calculate_fee(amount, 'send')
         
-        db.session.add(sender_transaction)
-        db.session.add(recipient_transaction)
-        db.session.commit()
+        try:
+            new_balance = execute_transfer(sender, recipient, amount, fee, purpose)
+        except TransferError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        return jsonify({
+        return commit_response({
             'success': True,
             'message': f'Money sent successfully to {recipient.name}',
-            'new_balance': sender.balance,
+            'new_balance': new_balance,
             'fee': fee
         })
         
@@ -346,7 +2962,98 @@ def send_money():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/send-money/bulk', methods=['POST'])
+@rate_limited('money')
+@idempotent
+def send_money_bulk():
+    try:
+        user_id = session.get('user_id')
+        if not user_id:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+        
+        data = request.get_json()
+        lines = data.get('recipients') or []
+        default_purpose = data.get('purpose', 'Money Transfer')
+        pin = data.get('pin')
+        
+        if not isinstance(lines, list) or not lines:
+            return jsonify({'success': False, 'error': 'At least one recipient is required'}), 400
+        
+        if len(lines) > MAX_BULK_TRANSFERS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BULK_TRANSFERS} recipients per request'}), 400
+        
+        # One PIN check for the whole batch
+        sender = db.session.get(User, user_id)
+        if not verify_user_pin(sender, pin):
+            return jsonify({'success': False, 'error': 'Invalid PIN'}), 401
+        
+        # Resolve every recipient with a single IN query
+        identifiers = [str(line.get('to', '')) for line in lines if isinstance(line, dict)]
+        recipients = {}
+        for user in User.query.filter(User.wallet_id.in_(identifiers) | User.phone.in_(identifiers)):
+            recipients[user.wallet_id] = user
+            recipients[user.phone] = user
+        
+        results = []
+        transfers = []
+        for index, line in enumerate(lines):
+            line = line if isinstance(line, dict) else {}
+            identifier = str(line.get('to', ''))
+            amount = parse_centavos(line.get('amount', 0))
+            recipient = recipients.get(identifier)
+            result = {'index': index, 'to': identifier}
+            
+            if amount is None or amount <= 0:
+                result['error'] = 'Invalid amount'
+            elif amount < 1000:
+                result['error'] = 'Minimum amount is ₱10'
+            elif not recipient:
+                result['error'] = 'Recipient not found'
+            elif recipient.id == sender.id:
+                result['error'] = 'Cannot send money to yourself'
+            else:
+                fee = calculate_fee(amount, 'send')
+                transfers.append((recipient, amount, fee, line.get('purpose') or default_purpose))
+                result.update({'amount': amount, 'fee': fee, 'recipient_name': recipient.name})
+            
+            result['status'] = 'failed' if 'error' in result else 'sent'
+            results.append(result)
+        
+        if not transfers:
+            return jsonify({'success': False, 'error': 'No valid transfers', 'results': results}), 400
+        
+        # The batch is scored as one outflow to all of its recipients
+        if assess_risk(
+            sender.id, 'send', sum(amount for _, amount, _, _ in transfers),
+            [recipient.id for recipient, _, _, _ in transfers]
+        ) == 'deny':
+            return jsonify({'success': False, 'error': RISK_DENIED_MESSAGE}), 403
+        
+        try:
+            new_balance = execute_transfers(sender, transfers)
+        except TransferError as e:
+            db.session.rollback()
+            for result in results:
+                if result['status'] == 'sent':
+                    result.update({'status': 'failed', 'error': str(e)})
+            return jsonify({'success': False, 'error': str(e), 'results': results}), 400
+        
+        return commit_response({
+            'success': True,
+            'message': f'Sent {len(transfers)} of {len(lines)} transfers',
+            'new_balance': new_balance,
+            'total_amount': sum(amount for _, amount, _, _ in transfers),
+            'total_fee': sum(fee for _, _, fee, _ in transfers),
+            'results': results
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/bank-transfer', methods=['POST'])
+@rate_limited('money')
+@idempotent
 def bank_transfer():
     try:
         user_id = session.get('user_id')
@@ -357,47 +3064,46 @@ def bank_transfer():
         bank = data.get('bank')
         account = data.get('account')
         account_name = data.get('account_name')
-        amount = float(data.get('amount', 0))
+        amount = parse_centavos(data.get('amount', 0))
         pin = data.get('pin')
         
-        if amount <= 0:
+        if amount is None or amount <= 0:
             return jsonify({'success': False, 'error': 'Invalid amount'}), 400
         
-        if amount < 100:
+        if amount < 10000:
             return jsonify({'success': False, 'error': 'Minimum bank transfer is ₱100'}), 400
         
-        user = User.query.get(user_id)
-        if not check_password_hash(user.pin_hash, pin):
+        user = db.session.get(User, user_id)
+        if not verify_user_pin(user, pin):
             return jsonify({'success': False, 'error': 'Invalid PIN'}), 401
         
-        fee = 25.0  # Flat fee for bank transfer
-        total_deduction = amount + fee
-        
-        if user.balance < total_deduction:
-            return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-        
-        user.balance -= total_deduction
-        
-        transaction = Transaction(
-            user_id=user.id,
-            type='Bank Transfer',
-            amount=-amount,
-            fee=-fee,
-            note=f'To {bank} - {account_name}',
-            bank_details={
-                'bank': bank,
-                'account': account,
-                'account_name': account_name
-            }
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
+        risk = assess_risk(user.id, 'bank', amount)
+        if risk == 'deny':
+            return jsonify({'success': False, 'error': RISK_DENIED_MESSAGE}), 403
+        
+        fee = calculate_fee(amount, 'bank')
+        
+        try:
+            new_balance, transaction = execute_payout(
+                user, 'bank', amount, fee,
+                type='Bank Transfer',
+                note=f'To {bank} - {account_name}',
+                bank_details={
+                    'bank': bank,
+                    'account': account,
+                    'account_name': account_name
+                }
+            )
+        except TransferError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        return jsonify({
+        db.session.add(settlement_job(transaction, 'bank', risk))
+        return commit_response({
             'success': True,
-            'message': 'Bank transfer initiated',
-            'new_balance': user.balance
+            'message': 'Bank transfer held for a security review' if risk == 'review' else 'Bank transfer initiated',
+            'new_balance': new_balance,
+            'settlement_status': 'held' if risk == 'review' else 'pending'
         })
         
     except Exception as e:
@@ -405,6 +3111,8 @@ def bank_transfer():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/cash-out', methods=['POST'])
+@rate_limited('money')
+@idempotent
 def cash_out():
     try:
         user_id = session.get('user_id')
@@ -412,47 +3120,46 @@ def cash_out():
             return jsonify({'success': False, 'error': 'Not authenticated'}), 401
         
         data = request.get_json()
-        amount = float(data.get('amount', 0))
+        amount = parse_centavos(data.get('amount', 0))
         method = data.get('method')
         pin = data.get('pin')
         
-        if amount <= 0:
+        if amount is None or amount <= 0:
             return jsonify({'success': False, 'error': 'Invalid amount'}), 400
         
-        if amount < 50:
+        if amount < 5000:
             return jsonify({'success': False, 'error': 'Minimum cash out is ₱50'}), 400
         
-        user = User.query.get(user_id)
-        if not check_password_hash(user.pin_hash, pin):
+        user = db.session.get(User, user_id)
+        if not verify_user_pin(user, pin):
             return jsonify({'success': False, 'error': 'Invalid PIN'}), 401
         
-        # Calculate fee (5% with minimum ₱5)
-        fee = calculate_fee(amount)
-        total_deduction = amount + fee
-        
-        if user.balance < total_deduction:
-            return jsonify({'success': False, 'error': 'Insufficient balance'}), 400
-        
-        user.balance -= total_deduction
+        risk = assess_risk(user.id, 'cashout', amount)
+        if risk == 'deny':
+            return jsonify({'success': False, 'error': RISK_DENIED_MESSAGE}), 403
         
-        transaction = Transaction(
-            user_id=user.id,
-            type='Cash Out',
-            amount=-amount,
-            fee=-fee,
-            note=f'Via {method}',
-            cashout_method=method
-        )
+        fee = calculate_fee(amount, 'cashout')
         
-        db.session.add(transaction)
-        db.session.commit()
+        try:
+            new_balance, transaction = execute_payout(
+                user, 'cashout', amount, fee,
+                type='Cash Out',
+                note=f'Via {method}',
+                cashout_method=method
+            )
+        except TransferError as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        return jsonify({
+        db.session.add(settlement_job(transaction, 'cashout', risk))
+        return commit_response({
             'success': True,
-            'message': f'Cash out request submitted via {method}',
-            'new_balance': user.balance,
+            'message': (f'Cash out via {method} held for a security review' if risk == 'review'
+                        else f'Cash out request submitted via {method}'),
+            'new_balance': new_balance,
             'fee': fee,
-            'you_receive': amount
+            'you_receive': amount,
+            'settlement_status': 'held' if risk == 'review' else 'pending'
         })
         
     except Exception as e:
@@ -460,41 +3167,292 @@ def cash_out():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/transactions', methods=['GET'])
+@rate_limited('read')
+@replica_reads
 def get_transactions():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({'success': False, 'error': 'Not authenticated'}), 401
     
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.created_at.desc()).limit(50).all()
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+    
+    cursor = None
+    if request.args.get('before'):
+        try:
+            cursor = decode_cursor(request.args['before'])
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    
+    # Every new transaction comes with a balance write, so an unchanged
+    # balance_version means the page the client holds is still current; on a
+    # profile cache hit the 304 costs no query at all
+    profile = user_cache.get(user_id)
+    if not profile:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+    return cached_json(
+        f"transactions-{user_id}-{profile['balance_version']}", lambda: transactions_page(user_id, cursor, limit)
+    )
+
+def transactions_page(user_id, cursor, limit):
+    """One keyset page of user_id's history, continuing into archived months"""
+    query = Transaction.query.filter_by(user_id=user_id)
+    
+    # Keyset pagination: seek past the cursor instead of OFFSET-scanning
+    if cursor:
+        query = query.filter(
+            db.tuple_(Transaction.created_at, Transaction.id) < cursor,
+            # Redundant with the tuple comparison, but lets Postgres prune partitions
+            Transaction.created_at <= cursor[0]
+        )
+    
+    transactions = query.order_by(
+        Transaction.created_at.desc(), Transaction.id.desc()
+    ).limit(limit + 1).all()
+    
+    # Past the oldest live row, keep paging into archived months
+    if len(transactions) <= limit:
+        if transactions:
+            cursor = (transactions[-1].created_at, transactions[-1].id)
+        transactions += read_archived_transactions(user_id, cursor, limit + 1 - len(transactions))
+    
+    has_more = len(transactions) > limit
+    transactions = transactions[:limit]
+    
+    return {
+        'success': True,
+        'next_cursor': encode_cursor(transactions[-1]) if has_more else None,
+        'transactions': [serialize_transaction(t) for t in transactions]
+    }
+
+STATEMENT_COLUMNS = ['id', 'date', 'type', 'amount', 'fee', 'balance', 'note', 'counterparty']
+
+def statement_snapshot_query(user_id, start):
+    """SELECT (opening balance at start, last transaction id) for an export.
+
+    Opening balance = current balance minus everything live since the range
+    start (the caller also takes off archived rows). One statement, so it
+    shares a snapshot with last_id, which caps the stream so rows committed
+    mid-export cannot skew the running total.
+    """
+    # SUM over BIGINT is NUMERIC on Postgres and would come back as Decimal
+    later = db.select(
+        db.cast(db.func.coalesce(
+            db.func.sum(Transaction.amount + db.func.coalesce(Transaction.fee, 0)), 0
+        ), db.BigInteger).label('delta'),
+        db.func.coalesce(db.func.max(Transaction.id), 0).label('last_id')
+    ).where(Transaction.user_id == user_id, Transaction.created_at >= start).subquery()
+    return (
+        db.select(User.balance - later.c.delta, later.c.last_id)
+        .join(later, db.true())
+        .where(User.id == user_id)
+    )
+
+@app.route('/api/transactions/export', methods=['GET'])
+@rate_limited('read')
+@replica_reads
+def export_transactions():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'Format must be csv or ndjson'}), 400
+    
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else datetime.min
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    snapshot = db.session.execute(statement_snapshot_query(user_id, start)).first()
+    if not snapshot:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+    opening_balance, last_id = snapshot
+    # The snapshot only sees live rows; archived months since start count too
+    opening_balance -= sum(t.amount + (t.fee or 0) for t in iter_archived_transactions(user_id, start))
+    
+    query = db.select(Transaction).where(
+        Transaction.user_id == user_id,
+        Transaction.created_at >= start,
+        Transaction.id <= last_id
+    )
+    if end:
+        query = query.where(Transaction.created_at < end)
+    query = query.order_by(Transaction.created_at, Transaction.id).execution_options(yield_per=1000)
+    
+    def generate():
+        balance = opening_balance
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(STATEMENT_COLUMNS)
+        
+        # Archived months come first (one user-month in memory at a time),
+        # then yield_per streams live rows through a server-side cursor
+        for t in chain(iter_archived_transactions(user_id, start, end), db.session.execute(query).scalars()):
+            balance += t.amount + (t.fee or 0)
+            date = t.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            if export_format == 'csv':
+                writer.writerow([
+                    t.id, date, t.type, format_pesos(t.amount), format_pesos(t.fee or 0),
+                    format_pesos(balance), t.note, t.recipient_name
+                ])
+            else:
+                buffer.write(json.dumps(dict(zip(STATEMENT_COLUMNS, [
+                    t.id, date, t.type, t.amount, t.fee or 0, balance, t.note, t.recipient_name
+                ])), ensure_ascii=False) + '\n')
+            
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        
+        yield buffer.getvalue()
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f"statement-{request.args.get('from', 'all')}-{request.args.get('to', 'now')}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.route('/api/events', methods=['GET'])
+@rate_limited('read')
+def wallet_events():
+    """Server-Sent Events stream of the logged-in user's balance and new transactions"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    ensure_wallet_listener()
+    subscription = wallet_broker.subscribe(user_id)
+    if subscription is None:
+        # No stream slot left in this process; 204 tells EventSource not to
+        # reconnect, and the page falls back to polling /api/current-user
+        return '', 204
+    keepalive = app.config['WALLET_EVENTS_KEEPALIVE']
+    
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    wallet_event = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: wallet\ndata: {json.dumps(wallet_event)}\n\n"
+        finally:
+            wallet_broker.unsubscribe(user_id, subscription)
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop Render's / nginx's proxy from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/insights', methods=['GET'])
+@rate_limited('read')
+@replica_reads
+def get_insights():
+    """Monthly totals by type, fees paid and top recipients, served from rollups"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    since = insights_window()
+    if since is None:
+        return jsonify({'success': False, 'error': 'Invalid months'}), 400
+    
+    months = {}
+    for rollup in MonthlyRollup.query.filter(
+        MonthlyRollup.user_id == user_id, MonthlyRollup.month >= since
+    ).order_by(MonthlyRollup.month.desc(), MonthlyRollup.type):
+        month = months.setdefault(rollup.month, {
+            'month': rollup.month.strftime('%Y-%m'), 'types': {}, 'fees': 0
+        })
+        month['types'][rollup.type] = {'count': rollup.count, 'amount': rollup.amount}
+        month['fees'] += rollup.fees
+    
+    top_recipients = db.session.execute(top_recipients_query(user_id, since)).all()
     
+    as_of = rollup_as_of()
     return jsonify({
         'success': True,
-        'transactions': [{
-            'id': t.id,
-            'type': t.type,
-            'amount': t.amount,
-            'fee': t.fee,
-            'note': t.note,
-            'recipient_name': t.recipient_name,
-            'bank_details': t.bank_details,
-            'cashout_method': t.cashout_method,
-            'date': t.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        } for t in transactions]
+        'months': list(months.values()),
+        'top_recipients': [
+            {'recipient_id': recipient_id, 'name': name, 'count': count, 'amount': amount}
+            for recipient_id, name, count, amount in top_recipients
+        ],
+        'as_of': as_of.isoformat() if as_of else None
+    })
+
+@app.route('/api/admin/insights', methods=['GET'])
+@rate_limited('read')
+@replica_reads
+def get_admin_insights():
+    """Platform-wide monthly totals by type, served from rollups"""
+    token = app.config['ADMIN_API_TOKEN']
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    since = insights_window()
+    if since is None:
+        return jsonify({'success': False, 'error': 'Invalid months'}), 400
+    
+    months = {}
+    for month, active_users in db.session.query(
+        MonthlyRollup.month, db.func.count(db.distinct(MonthlyRollup.user_id))
+    ).filter(MonthlyRollup.month >= since).group_by(MonthlyRollup.month).order_by(MonthlyRollup.month.desc()):
+        months[month] = {'month': month.strftime('%Y-%m'), 'active_users': active_users, 'types': {}, 'fees': 0}
+    
+    for month, type_, count, amount, fees in db.session.execute(platform_totals_query(since)):
+        months[month]['types'][type_] = {'count': count, 'amount': amount}
+        months[month]['fees'] += fees
+    
+    as_of = rollup_as_of()
+    return jsonify({
+        'success': True,
+        'months': list(months.values()),
+        'as_of': as_of.isoformat() if as_of else None
     })
 
 @app.route('/api/calculate-fee', methods=['POST'])
+@rate_limited('quote')
+@replica_reads
 def calculate_fee_endpoint():
     data = request.get_json()
-    amount = float(data.get('amount', 0))
     transaction_type = data.get('type', 'send')
     
-    if amount <= 0:
+    if transaction_type not in FEE_CHANNELS:
+        return jsonify({'success': False, 'error': 'Type must be send, bank or cashout'}), 400
+    
+    # Batch form: {"amounts": [...]} quotes many amounts in one request
+    if 'amounts' in data:
+        amounts = data['amounts'] if isinstance(data['amounts'], list) else []
+        if not amounts or len(amounts) > 100:
+            return jsonify({'success': False, 'error': 'Provide between 1 and 100 amounts'}), 400
+        
+        quotes = []
+        for raw in amounts:
+            amount = parse_centavos(raw)
+            if amount is None or amount <= 0:
+                return jsonify({'success': False, 'error': 'Invalid amount'}), 400
+            fee = calculate_fee(amount, transaction_type)
+            quotes.append({'amount': amount, 'fee': fee, 'total': amount + fee})
+        
+        return jsonify({'success': True, 'quotes': quotes})
+    
+    amount = parse_centavos(data.get('amount', 0))
+    if amount is None or amount <= 0:
         return jsonify({'success': False, 'error': 'Invalid amount'}), 400
     
-    if transaction_type == 'bank':
-        fee = 25.0
-    else:
-        fee = calculate_fee(amount)
+    fee = calculate_fee(amount, transaction_type)
     
     return jsonify({
         'success': True,
@@ -504,6 +3462,8 @@ def calculate_fee_endpoint():
     })
 
 @app.route('/api/users/search', methods=['POST'])
+@rate_limited('search')
+@replica_reads
 def search_users():
     try:
         user_id = session.get('user_id')
@@ -516,11 +3476,7 @@ def search_users():
         if not query:
             return jsonify({'success': True, 'users': []})
         
-        users = User.query.filter(
-            (User.wallet_id.ilike(f'%{query}%')) |
-            (User.phone.ilike(f'%{query}%')) |
-            (User.name.ilike(f'%{query}%'))
-        ).filter(User.id != user_id).limit(10).all()
+        users = find_users(query, user_id)
         
         return jsonify({
             'success': True,
@@ -535,6 +3491,7 @@ def search_users():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/update-pin', methods=['POST'])
+@rate_limited('money')
 def update_pin():
     try:
         user_id = session.get('user_id')
@@ -545,15 +3502,16 @@ def update_pin():
         old_pin = data.get('old_pin')
         new_pin = data.get('new_pin')
         
-        user = User.query.get(user_id)
-        if not check_password_hash(user.pin_hash, old_pin):
+        user = db.session.get(User, user_id)
+        if not verify_user_pin(user, old_pin):
             return jsonify({'success': False, 'error': 'Invalid current PIN'}), 401
         
         if not validate_pin(new_pin):
             return jsonify({'success': False, 'error': 'New PIN must be exactly 4 digits'}), 400
         
-        user.pin_hash = generate_password_hash(new_pin)
+        user.pin_hash = pin_hasher.hash(new_pin)
         db.session.commit()
+        grant_pin_step_up(user, new_pin)
         
         return jsonify({'success': True, 'message': 'PIN updated successfully'})
         
@@ -561,41 +3519,303 @@ def update_pin():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    if app.config['SQL_DEBUG']:
+        g.sql_statements = {}
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    # Label by URL rule, not path, so ids in paths cannot explode cardinality
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+        time.perf_counter() - g.request_started
+    )
+    REQUEST_QUERIES.labels(route).observe(g.sql_queries)
+    REQUEST_QUERY_SECONDS.labels(route).observe(g.sql_seconds)
+    if app.config['SQL_DEBUG']:
+        for statement, count in g.sql_statements.items():
+            if count >= app.config['SQL_REPEAT_THRESHOLD']:
+                app.logger.warning(f"Possible N+1 on {route}: {count} x {statement[:500]}")
+    return response
+
+@app.route('/metrics')
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
 @app.route('/health')
 def health():
     return jsonify({
         'status': 'ok',
         'service': 'Cashine eWallet',
         'timestamp': datetime.utcnow().isoformat(),
-        'database': 'connected' if db.session.execute('SELECT 1').first() else 'disconnected'
+        'database': 'connected' if db.session.execute(db.text('SELECT 1')).first() else 'disconnected',
+        'user_cache': user_cache.stats()
     })
 
-# Initialize database - WITH FIXED SCHEMA HANDLING
+# Schema migrations
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Arbitrary constant identifying the migration lock in pg_advisory_lock
+MIGRATION_LOCK_ID = 7201104
+
+def _create_schema(conn):
+    db.metadata.create_all(conn)
+    
+    admin_exists = conn.execute(
+        db.select(User.id).where(User.email == 'admin@cashine.com')
+    ).first()
+    if not admin_exists:
+        conn.execute(db.insert(User).values(
+            name='Admin User',
+            email='admin@cashine.com',
+            phone='+639123456789',
+            wallet_id='CASH00000001',
+            pin_hash=pin_hasher.hash('1234'),
+            balance=1000000,
+            failed_login_attempts=0
+        ))
+
+def _money_to_centavos(conn):
+    # Databases created before integer money still have float peso columns
+    if conn.dialect.name != 'postgresql':
+        return
+    
+    inspector = db.inspect(conn)
+    for table, column in [('users', 'balance'), ('transactions', 'amount'), ('transactions', 'fee')]:
+        column_type = next(c['type'] for c in inspector.get_columns(table) if c['name'] == column)
+        if isinstance(column_type, db.Integer):
+            continue
+        # numeric round() is half away from zero, matching the fee schedule
+        conn.execute(db.text(
+            f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT '
+            f'USING round(({column} * 100)::numeric)::bigint'
+        ))
+
+def _create_indexes(conn):
+    # create_all() only indexes tables it creates; backfill older tables
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _create_ledger(conn):
+    for model in (JournalEntry, Posting, LedgerCheckpoint, ReconciliationRun):
+        model.__table__.create(conn, checkfirst=True)
+    
+    columns = [c['name'] for c in db.inspect(conn).get_columns('transactions')]
+    if 'journal_id' not in columns:
+        conn.execute(db.text(
+            'ALTER TABLE transactions ADD COLUMN journal_id INTEGER REFERENCES journal_entries(id)'
+        ))
+    
+    # Open every existing wallet at its current balance in one journal entry
+    unposted = conn.execute(
+        db.select(User.id, User.balance)
+        .where(~db.exists().where(Posting.user_id == User.id))
+    ).all()
+    if not unposted:
+        return
+    journal_id = conn.execute(
+        db.insert(JournalEntry).values(kind='opening', memo='ledger backfill').returning(JournalEntry.id)
+    ).scalar()
+    conn.execute(db.insert(Posting), [
+        {'journal_id': journal_id, 'account': wallet_account(user_id), 'user_id': user_id, 'amount': balance}
+        for user_id, balance in unposted
+    ] + [
+        {'journal_id': journal_id, 'account': PROMOTIONS_ACCOUNT, 'user_id': None,
+         'amount': -sum(balance for _, balance in unposted)}
+    ])
+
+def _create_fee_schedule(conn):
+    FeeRule.__table__.create(conn, checkfirst=True)
+    FeeScheduleState.__table__.create(conn, checkfirst=True)
+    if not conn.execute(db.select(FeeRule.id).limit(1)).first():
+        conn.execute(db.insert(FeeRule), DEFAULT_FEE_RULES)
+    if not conn.execute(db.select(FeeScheduleState.id)).first():
+        conn.execute(db.insert(FeeScheduleState).values(id=1, version=1))
+
+def _create_transaction_archive(conn):
+    TransactionArchive.__table__.create(conn, checkfirst=True)
+    TransactionArchiveUser.__table__.create(conn, checkfirst=True)
+
+def partition_transactions(conn):
+    """Rebuild transactions as a monthly range-partitioned table (Postgres).
+
+    Returns False if there is nothing to do. The copy holds an exclusive lock
+    on the whole table, so this is never run at boot: an operator runs
+    `flask migrate --partition-transactions` in a quiet window.
+    """
+    if conn.dialect.name != 'postgresql' or transactions_partitioned(conn):
+        return False
+    
+    conn.execute(db.text('ALTER TABLE transactions RENAME TO transactions_unpartitioned'))
+    conn.execute(db.text(
+        'ALTER TABLE transactions_unpartitioned RENAME CONSTRAINT transactions_pkey TO transactions_unpartitioned_pkey'
+    ))
+    for index in Transaction.__table__.indexes:
+        conn.execute(db.text(f'DROP INDEX IF EXISTS {index.name}'))
+    # A unique key on a partitioned table must include created_at, so
+    # settlement_jobs.transaction_id can no longer be a real foreign key
+    conn.execute(db.text(
+        'ALTER TABLE settlement_jobs DROP CONSTRAINT IF EXISTS settlement_jobs_transaction_id_fkey'
+    ))
+    conn.execute(db.text(
+        'CREATE TABLE transactions (LIKE transactions_unpartitioned INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (created_at)'
+    ))
+    conn.execute(db.text('ALTER TABLE transactions ADD PRIMARY KEY (id, created_at)'))
+    conn.execute(db.text('ALTER TABLE transactions ADD FOREIGN KEY (user_id) REFERENCES users (id)'))
+    conn.execute(db.text(
+        'ALTER TABLE transactions ADD FOREIGN KEY (journal_id) REFERENCES journal_entries (id)'
+    ))
+    conn.execute(db.text('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT'))
+    
+    oldest = conn.execute(db.text('SELECT min(created_at) FROM transactions_unpartitioned')).scalar()
+    month = month_start(oldest or datetime.utcnow())
+    while month <= month_start(datetime.utcnow()):
+        create_transaction_partition(conn, month)
+        month = add_months(month, 1)
+    ensure_transaction_partitions(conn)
+    
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    copied = ', '.join('COALESCE(created_at, now())' if name == 'created_at' else name for name in ARCHIVE_COLUMNS)
+    conn.execute(db.text(f'INSERT INTO transactions ({columns}) SELECT {copied} FROM transactions_unpartitioned'))
+    
+    # The id sequence belongs to the old table; move it before dropping that
+    sequence = conn.execute(
+        db.text("SELECT pg_get_serial_sequence('transactions_unpartitioned', 'id')")
+    ).scalar()
+    conn.execute(db.text(f'ALTER SEQUENCE {sequence} OWNED BY transactions.id'))
+    conn.execute(db.text('DROP TABLE transactions_unpartitioned'))
+    for index in Transaction.__table__.indexes:
+        index.create(conn)
+    return True
+
+def _create_rollups(conn):
+    for model in (MonthlyRollup, RecipientRollup, RollupState):
+        model.__table__.create(conn, checkfirst=True)
+    # Existing history is backfilled by refresh-rollups from watermark 0
+    if not conn.execute(db.select(RollupState.id)).first():
+        conn.execute(db.insert(RollupState).values(id=1, watermark=0))
+
+def _add_balance_version(conn):
+    columns = [c['name'] for c in db.inspect(conn).get_columns('users')]
+    if 'balance_version' not in columns:
+        conn.execute(db.text('ALTER TABLE users ADD COLUMN balance_version BIGINT NOT NULL DEFAULT 0'))
+
+def _net_reversal_fees(conn):
+    # Rollups used to add abs(fee), counting a refunded fee as paid twice
+    conn.execute(db.update(MonthlyRollup).where(
+        MonthlyRollup.type == 'Reversal', MonthlyRollup.fees > 0
+    ).values(fees=-MonthlyRollup.fees))
+
+def _add_archive_offsets(conn):
+    columns = [c['name'] for c in db.inspect(conn).get_columns('transaction_archive_users')]
+    for column in ('byte_offset', 'byte_length'):
+        if column not in columns:
+            conn.execute(db.text(f'ALTER TABLE transaction_archive_users ADD COLUMN {column} BIGINT'))
+
+# Append-only: (version, description, callable taking a Connection)
+MIGRATIONS = [
+    (1, 'baseline schema and admin user', _create_schema),
+    (2, 'money columns to integer centavos', _money_to_centavos),
+    (3, 'history and search indexes', _create_indexes),
+    (4, 'settlement queue', lambda conn: SettlementJob.__table__.create(conn, checkfirst=True)),
+    (5, 'double-entry ledger with opening balances', _create_ledger),
+    (6, 'fee schedule', _create_fee_schedule),
+    (7, 'transaction archive tables', _create_transaction_archive),
+    (8, 'analytics rollups', _create_rollups),
+    (9, 'balance version counter', _add_balance_version),
+    (10, 'net refunded fees out of rollups', _net_reversal_fees),
+    (11, 'per-user offsets into transaction archives', _add_archive_offsets),
+]
+
+def current_schema_version(conn):
+    """Highest applied migration, 0 for a fresh database"""
+    try:
+        return conn.execute(db.select(db.func.max(SchemaMigration.version))).scalar() or 0
+    except (db.exc.ProgrammingError, db.exc.OperationalError):
+        conn.rollback()
+        return 0
+
+def run_migrations():
+    """Apply pending migrations; returns the list of versions applied.
+
+    The common case, an up-to-date schema, costs a single SELECT. Otherwise
+    a PostgreSQL advisory lock ensures only one booting worker migrates
+    while the others wait and then find nothing left to do.
+    """
+    latest = MIGRATIONS[-1][0]
+    with db.engine.connect() as conn:
+        if current_schema_version(conn) >= latest:
+            return []
+        
+        is_postgres = conn.dialect.name == 'postgresql'
+        if is_postgres:
+            conn.execute(db.text('SELECT pg_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+            conn.commit()
+        
+        applied = []
+        try:
+            SchemaMigration.__table__.create(conn, checkfirst=True)
+            conn.commit()
+            version = current_schema_version(conn)
+            conn.commit()
+            for migration_version, description, migrate in MIGRATIONS:
+                if migration_version <= version:
+                    continue
+                with conn.begin():
+                    migrate(conn)
+                    conn.execute(db.insert(SchemaMigration).values(
+                        version=migration_version, description=description
+                    ))
+                applied.append(migration_version)
+                print(f"Applied migration {migration_version}: {description}")
+        finally:
+            if is_postgres:
+                conn.execute(db.text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+                conn.commit()
+        
+        return applied
+
+@app.cli.command('migrate')
+@click.option('--partition-transactions', 'partition', is_flag=True,
+              help='Also rebuild transactions as a partitioned table (Postgres; locks it while copying).')
+def migrate_command(partition):
+    """Apply pending schema migrations."""
+    applied = run_migrations()
+    print(f"Applied {len(applied)} migrations" if applied else "Schema already current")
+    if partition:
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(db.text('SELECT pg_advisory_xact_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+            rebuilt = partition_transactions(conn)
+        print("Partitioned transactions by month" if rebuilt else "transactions is already partitioned (or not on Postgres)")
+
+# Initialize database: no-op unless migrations are pending
 with app.app_context():
     try:
-        # Drop all tables and recreate them (for development only!)
-        # WARNING: This will delete all data!
-        db.drop_all()
-        print("Dropped all tables")
-        
-        # Create all tables with new schema
-        db.create_all()
-        print("Database tables created successfully")
-        
-        # Create admin user if none exists
-        if not User.query.filter_by(email='admin@cashine.com').first():
-            admin = User(
-                name='Admin User',
-                email='admin@cashine.com',
-                phone='+639123456789',
-                wallet_id='CASH00000001',
-                pin_hash=generate_password_hash('1234'),
-                balance=10000.0
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user created")
-            
+        run_migrations()
     except Exception as e:
         print(f"Database initialization error: {e}")
 
@@ -0,0 +1,81 @@
+"""One /api/send-money/bulk request against N sequential /api/send-money calls.
+
+    DATABASE_URL=postgresql://... python benchmarks/bulk_transfer.py --recipients 500
+
+A payroll run pays --recipients wallets. Each mode starts from a freshly
+seeded sender, so the daily limit and velocity windows are the same for
+both. Sequential calls are timed twice: with the PIN step-up token (what
+a logged-in client gets after the first call) and with it cleared, so
+every call runs the KDF. SQL statements are counted on the engine. The
+sender must end with the same balance in every mode.
+"""
+import argparse
+import statistics
+
+from sqlalchemy import event
+
+import harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipients', type=int, default=200)
+    parser.add_argument('--amount', type=int, default=1000, help='Centavos per recipient.')
+    parser.add_argument('--rounds', type=int, default=3, help='Runs per mode; the median is reported.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    db, User = cashine.db, cashine.User
+    recipient_ids = harness.seed_users(cashine, args.recipients, 0)
+    with cashine.app.app_context():
+        wallets = [wallet_id for wallet_id, in db.session.execute(
+            db.select(User.wallet_id).where(User.id.in_(recipient_ids)).order_by(User.id)
+        )]
+        engine = db.engine
+        dialect = engine.dialect.name
+
+    statements = [0]
+    event.listen(engine, 'before_cursor_execute', lambda *_: statements.__setitem__(0, statements[0] + 1))
+
+    def sequential(client, step_up):
+        for wallet_id in wallets:
+            if not step_up:
+                with client.session_transaction() as session:
+                    session.pop('pin_step_up', None)
+            response = client.post('/api/send-money', json={'to': wallet_id, 'amount': args.amount, 'pin': harness.PIN})
+            if response.status_code != 200:
+                raise SystemExit(f"send-money failed: {response.get_json()}")
+
+    def bulk(client, step_up):
+        response = client.post('/api/send-money/bulk', json={
+            'recipients': [{'to': wallet_id, 'amount': args.amount} for wallet_id in wallets], 'pin': harness.PIN
+        })
+        if response.status_code != 200:
+            raise SystemExit(f"bulk send failed: {response.get_json()}")
+
+    rows = []
+    final_balances = set()
+    for label, call, step_up in [('sequential, KDF each call', sequential, False),
+                                 ('sequential, PIN step-up', sequential, True),
+                                 ('bulk, one request', bulk, True)]:
+        samples = []
+        queries = []
+        for _ in range(args.rounds):
+            sender_id, = harness.seed_users(cashine, 1, args.recipients * args.amount * 2)
+            client = harness.client_for(cashine, sender_id)
+            statements[0] = 0
+            _, seconds = harness.timed(lambda: call(client, step_up))
+            samples.append(seconds)
+            queries.append(statements[0])
+            with cashine.app.app_context():
+                final_balances.add(db.session.get(User, sender_id).balance)
+        seconds = statistics.median(samples)
+        rows.append([label, f'{seconds * 1000:.0f}', f'{seconds * 1000 / args.recipients:.2f}',
+                     f'{args.recipients / seconds:.0f}', int(statistics.median(queries))])
+
+    print(f"{dialect}: {args.recipients} recipients x {args.amount} centavos, median of {args.rounds}")
+    harness.print_table(['mode', 'total ms', 'ms/transfer', 'transfers/s', 'SQL statements'], rows)
+    if len(final_balances) != 1:
+        raise SystemExit(f"sender balances differ between modes: {sorted(final_balances)}")
+
+if __name__ == '__main__':
+    main()
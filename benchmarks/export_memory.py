@@ -0,0 +1,94 @@
+"""Peak Python memory of /api/transactions/export against loading the same rows.
+
+    DATABASE_URL=postgresql://... python benchmarks/export_memory.py --rows 1000000
+
+One user gets --rows transactions. The export is read chunk by chunk (as a
+client download would) under tracemalloc, then the same rows are fetched
+with .all() and serialized the way /api/transactions builds its list. The
+streamed peak should stay flat as --rows grows; exits 1 if it passes
+--max-peak-mb.
+"""
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+import harness
+
+def traced(call):
+    """(result, seconds, peak MiB) of call() under tracemalloc"""
+    tracemalloc.start()
+    try:
+        result, seconds = harness.timed(call)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--max-peak-mb', type=float, default=32.0, help='Fail if the streamed export peaks above this.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    db, User, Transaction = cashine.db, cashine.User, cashine.Transaction
+    user_id, = harness.seed_users(cashine, 1, 0)
+
+    print(f"Seeding {args.rows} transactions...")
+    started = datetime.utcnow() - timedelta(milliseconds=args.rows)
+    with cashine.app.app_context():
+        balance = 0
+        for first in range(0, args.rows, 10000):
+            rows = []
+            for i in range(first, min(first + 10000, args.rows)):
+                received = i % 2 == 0
+                rows.append({
+                    'user_id': user_id,
+                    'type': 'Received' if received else 'Sent',
+                    'amount': 50000 if received else -30000,
+                    'fee': 0 if received else -1000,
+                    'note': 'Benchmark transfer',
+                    'recipient_name': 'Bench Counterparty',
+                    'created_at': started + timedelta(milliseconds=i),
+                })
+                balance += rows[-1]['amount'] + rows[-1]['fee']
+            db.session.execute(db.insert(Transaction), rows)
+            db.session.commit()
+        db.session.execute(db.update(User).where(User.id == user_id).values(balance=balance))
+        db.session.commit()
+        dialect = db.engine.dialect.name
+
+    client = harness.client_for(cashine, user_id)
+
+    def stream(export_format):
+        response = client.get(f'/api/transactions/export?format={export_format}', buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def materialize():
+        with cashine.app.app_context():
+            transactions = db.session.execute(
+                db.select(Transaction).where(Transaction.user_id == user_id)
+                .order_by(Transaction.created_at, Transaction.id)
+            ).scalars().all()
+            return len(cashine.json.dumps([cashine.serialize_transaction(t) for t in transactions]))
+
+    rows = []
+    peaks = {}
+    for label, call in [('export csv (streamed)', lambda: stream('csv')),
+                        ('export ndjson (streamed)', lambda: stream('ndjson')),
+                        ('.all() + serialize', materialize)]:
+        size, seconds, peak = traced(call)
+        peaks[label] = peak
+        rows.append([label, f'{size / 2 ** 20:.1f}', f'{seconds:.2f}', f'{peak:.1f}'])
+
+    print(f"{dialect}: {args.rows} rows for one user (timings include tracemalloc overhead)")
+    harness.print_table(['path', 'output MiB', 'seconds', 'peak MiB'], rows)
+    streamed_peak = max(peaks['export csv (streamed)'], peaks['export ndjson (streamed)'])
+    print(f"streamed peak: {streamed_peak:.1f} MiB (limit {args.max_peak_mb:g})")
+    if streamed_peak > args.max_peak_mb:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Shared setup for the scripts in benchmarks/.
+
+app.py configures itself and migrates at import, so scripts call load_app()
+before touching it. Without DATABASE_URL it runs against a fresh SQLite
+file; point DATABASE_URL at a scratch Postgres database for numbers that
+mean anything (SQLite has no row locks and a single writer).
+"""
+import math
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIN = '1234'
+
+def load_app(**env):
+    """Import app.py with env applied on top of benchmark defaults"""
+    if not os.environ.get('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'cashine-bench.db')
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    for name, value in env.items():
+        os.environ[name] = str(value)
+    sys.path.insert(0, ROOT)
+    import app as cashine
+
+    # Velocity rules would (rightly) stop one client firing this fast;
+    # benchmarks measure the code path, not the fraud thresholds
+    cashine.risk_engine.review_score = cashine.risk_engine.deny_score = float('inf')
+    return cashine
+
+def seed_users(cashine, count, balance, pin=PIN, name=None):
+    """Insert count users holding balance each, opened in the ledger; returns their ids.
+
+    Rows go in with one bulk insert per 10,000 and share a single PIN hash,
+    so seeding a million users does not run the KDF a million times.
+    name(i) picks display names (default "Bench <run> <i>"). Wallet IDs and
+    phones are shaped like real ones, under a random run number.
+    """
+    db, User = cashine.db, cashine.User
+    run = f'{secrets.randbelow(10 ** 6):06d}'
+    name = name or (lambda i: f'Bench {run} {i}')
+    pin_hash = cashine.pin_hasher.hash(pin)
+    ids = []
+    with cashine.app.app_context():
+        for start in range(0, count, 10000):
+            rows = [{
+                'name': name(i),
+                'email': f'bench-{run}-{i}@example.com',
+                'phone': f'09{run}{i:07d}',
+                'wallet_id': f'CASH9{run}{i:07d}',
+                'pin_hash': pin_hash,
+                'balance': balance,
+                'failed_login_attempts': 0,
+            } for i in range(start, min(start + 10000, count))]
+            db.session.execute(db.insert(User), rows)
+            batch = [user_id for user_id, in db.session.execute(
+                db.select(User.id).where(User.email.in_([row['email'] for row in rows]))
+            )]
+            if balance:
+                cashine.post_journal('opening', [
+                    *[(cashine.wallet_account(user_id), user_id, balance) for user_id in batch],
+                    (cashine.PROMOTIONS_ACCOUNT, None, -balance * len(batch)),
+                ], memo='benchmark seed')
+            db.session.commit()
+            ids += batch
+    return sorted(ids)
+
+def client_for(cashine, user_id):
+    """A test client whose session is logged in as user_id (no KDF)"""
+    client = cashine.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+def timed(call):
+    """(result, seconds) of call()"""
+    started = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - started
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def print_table(headers, rows):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max([len(str(header))] + [len(row[i]) for row in rows]) for i, header in enumerate(headers)]
+    for row in [headers, *rows]:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
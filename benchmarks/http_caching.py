@@ -0,0 +1,117 @@
+"""Bytes on the wire and latency for identity, gzip and brotli responses, and for 304 revalidations.
+
+    python benchmarks/http_caching.py --rows 50 --requests 200
+
+Seeds one wallet with --rows transactions, then fetches /api/transactions
+(one page of --rows), /api/current-user, the shell page and the
+fingerprinted app.js with each Accept-Encoding, and the two JSON
+endpoints again with the ETag they returned. Requests go through the
+Flask test client, so latency is server time without the network; wire
+bytes are the body plus the status line and headers. Bodies under
+COMPRESS_MIN_BYTES are served as identity whatever was requested. Also
+times serializing the transactions page with the orjson provider against
+the stdlib one. Compressed bodies must decode to the identity body and 304s
+must be bodiless; exits 1 otherwise.
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+from datetime import datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+
+import harness
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+def wire_bytes(response):
+    """Approximate HTTP/1.1 size: status line, headers and body"""
+    head = len(f'HTTP/1.1 {response.status}\r\n') + 2
+    head += sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return head + len(response.get_data())
+
+def decoded(cashine, response):
+    body = response.get_data()
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'br':
+        return cashine.brotli.decompress(body)
+    return body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50, help='Transactions on the page (at most 100).')
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint and encoding.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    db, Transaction = cashine.db, cashine.Transaction
+    user_id, = harness.seed_users(cashine, 1, 10000000)
+    peers = harness.seed_users(cashine, 20, 0)
+    rng = random.Random(24)
+    now = datetime.utcnow()
+    with cashine.app.app_context():
+        db.session.execute(db.insert(Transaction), [{
+            'user_id': user_id, 'type': 'Sent', 'amount': -rng.randrange(1000, 500000), 'fee': 0,
+            'recipient_id': peer, 'recipient_name': f'Bench {peer}', 'note': rng.choice(['Rent', 'Lunch', None]),
+            'created_at': now - timedelta(hours=i),
+        } for i, peer in enumerate(rng.choices(peers, k=args.rows))])
+        db.session.commit()
+    with cashine.app.test_request_context():
+        script = cashine.asset_url('js/app.js')
+
+    client = harness.client_for(cashine, user_id)
+    limit = min(args.rows, 100)
+    endpoints = [('/api/transactions', f'/api/transactions?limit={limit}'),
+                 ('/api/current-user', '/api/current-user'),
+                 ('shell page', '/'),
+                 ('app.js', script)]
+    encodings = ENCODINGS if cashine.brotli is not None else ENCODINGS[:2]
+
+    rows = []
+    mismatched = 0
+    for label, url in endpoints:
+        identity = client.get(url, headers={'Accept-Encoding': 'identity'})
+        etag = identity.headers.get('ETag')
+        runs = [(encoding, {'Accept-Encoding': encoding}) for encoding in encodings]
+        if etag and label.startswith('/api'):
+            runs.append(('If-None-Match', {'Accept-Encoding': 'gzip, br', 'If-None-Match': etag}))
+        for encoding, headers in runs:
+            samples = []
+            for _ in range(args.requests):
+                response, seconds = harness.timed(lambda: client.get(url, headers=headers))
+                samples.append(seconds)
+            served = response.headers.get('Content-Encoding', 'identity')
+            if encoding == 'If-None-Match':
+                mismatched += response.status_code != 304 or response.get_data() != b''
+            else:
+                mismatched += decoded(cashine, response) != identity.get_data()
+            rows.append([label, encoding, str(response.status_code) if encoding == 'If-None-Match' else served, wire_bytes(response),
+                         f'{statistics.median(samples) * 1000:.2f}', f'{harness.percentile(samples, 0.95) * 1000:.2f}'])
+
+    print(f"{args.rows} transactions on the page, {args.requests} requests per row")
+    harness.print_table(['endpoint', 'requested', 'served', 'wire bytes', 'p50 ms', 'p95 ms'], rows)
+
+    with cashine.app.test_request_context():
+        page = cashine.transactions_page(user_id, None, limit)
+        providers = [('stdlib json', DefaultJSONProvider(cashine.app))]
+        if cashine.orjson is not None:
+            providers.insert(0, ('orjson', cashine.OrjsonProvider(cashine.app)))
+        rows = []
+        outputs = []
+        for label, provider in providers:
+            samples = [harness.timed(lambda: provider.dumps(page))[1] for _ in range(args.requests)]
+            outputs.append(json.loads(provider.dumps(page)))
+            rows.append([label, f'{statistics.median(samples) * 1e6:.0f}', f'{harness.percentile(samples, 0.95) * 1e6:.0f}'])
+    print()
+    harness.print_table(['serializer', 'p50 us', 'p95 us'], rows)
+
+    print(f"responses that did not decode to the identity body or were not a bodiless 304: {mismatched}")
+    if mismatched or any(output != outputs[0] for output in outputs):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""/api/insights and /api/admin/insights queries: rollups against the raw GROUP BY scan.
+
+    DATABASE_URL=postgresql://... python benchmarks/insights.py --users 10000 --rows-per-user 100
+
+Seeds --users wallets with --rows-per-user transactions spread over the
+last year, folds them with refresh_rollups (timed, as the one-off backfill
+cost), then times the queries behind both endpoints against the
+equivalent aggregates over raw transactions for a 12-month window.
+The two must agree; exits 1 if they do not.
+"""
+import argparse
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import harness
+
+TYPES = [('Sent', 45), ('Received', 35), ('Bank Transfer', 12), ('Cash Out', 8)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--rows-per-user', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=50, help='Per-user lookups timed per path.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    db, Transaction, MonthlyRollup = cashine.db, cashine.Transaction, cashine.MonthlyRollup
+    user_ids = harness.seed_users(cashine, args.users, 0)
+    rng = random.Random(22)
+    now = datetime.utcnow() - timedelta(minutes=5)  # past LEDGER_SETTLE_SECONDS, so refresh folds it all
+    since = cashine.add_months(cashine.month_start(now), -11)
+
+    print(f"Seeding {args.users * args.rows_per_user} transactions...")
+    with cashine.app.app_context():
+        rows = []
+        for user_id in user_ids:
+            for _ in range(args.rows_per_user):
+                type_ = rng.choices([t for t, _ in TYPES], [w for _, w in TYPES])[0]
+                amount = rng.randrange(1000, 500000)
+                recipient_id = rng.choice(user_ids) if type_ == 'Sent' else None
+                rows.append({
+                    'user_id': user_id, 'type': type_,
+                    'amount': amount if type_ == 'Received' else -amount,
+                    'fee': 0 if type_ == 'Received' else -rng.choice((0, 1000, 1500, 2500)),
+                    'recipient_id': recipient_id, 'recipient_name': recipient_id and f'Bench {recipient_id}',
+                    'created_at': since + (now - since) * rng.random(),
+                })
+            if len(rows) >= 10000:
+                db.session.execute(db.insert(Transaction), rows)
+                db.session.commit()
+                rows = []
+        if rows:
+            db.session.execute(db.insert(Transaction), rows)
+            db.session.commit()
+
+        folded, build_seconds = harness.timed(lambda: sum(iter(cashine.refresh_rollups, 0)))
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            db.session.execute(db.text('ANALYZE transactions'))
+            db.session.commit()
+            month_of = db.func.date_trunc('month', Transaction.created_at)
+        else:
+            month_of = db.func.strftime('%Y-%m', Transaction.created_at)
+        in_window = Transaction.created_at >= since
+
+        def rollup_user(user_id):
+            totals = {(str(r.month)[:7], r.type): (r.count, r.amount, r.fees) for r in MonthlyRollup.query.filter(
+                MonthlyRollup.user_id == user_id, MonthlyRollup.month >= since.date()
+            )}
+            return totals, db.session.execute(cashine.top_recipients_query(user_id, since.date())).all()
+
+        def raw_user(user_id):
+            totals = {(str(month)[:7], type_): (count, amount, fees) for month, type_, count, amount, fees in db.session.execute(
+                db.select(month_of, Transaction.type, db.func.count(),
+                          cashine.sum_bigint(db.func.abs(Transaction.amount)),
+                          cashine.sum_bigint(-db.func.coalesce(Transaction.fee, 0)))
+                .where(Transaction.user_id == user_id, in_window).group_by(month_of, Transaction.type)
+            )}
+            top = db.session.execute(
+                db.select(Transaction.recipient_id, db.func.max(Transaction.recipient_name), db.func.count(),
+                          cashine.sum_bigint(db.func.abs(Transaction.amount)).label('amount'))
+                .where(Transaction.user_id == user_id, Transaction.type == 'Sent', in_window)
+                .group_by(Transaction.recipient_id).order_by(db.desc('amount')).limit(cashine.TOP_RECIPIENTS)
+            ).all()
+            return totals, top
+
+        def rollup_platform():
+            return {(str(month)[:7], type_): (count, amount, fees) for month, type_, count, amount, fees
+                    in db.session.execute(cashine.platform_totals_query(since.date()))}
+
+        def raw_platform():
+            return {(str(month)[:7], type_): (count, amount, fees) for month, type_, count, amount, fees in db.session.execute(
+                db.select(month_of, Transaction.type, db.func.count(),
+                          cashine.sum_bigint(db.func.abs(Transaction.amount)),
+                          cashine.sum_bigint(-db.func.coalesce(Transaction.fee, 0)))
+                .where(in_window).group_by(month_of, Transaction.type)
+            )}
+
+        def comparable(result):
+            # Row objects from the two paths differ in type; compare values
+            if isinstance(result, tuple):
+                totals, top = result
+                return totals, [tuple(row) for row in top]
+            return result
+
+        sample = rng.sample(user_ids, min(args.queries, len(user_ids)))
+        results = {}
+        rows = []
+        for scope, path, call, targets in [('per user', 'rollups', rollup_user, sample),
+                                           ('per user', 'raw scan', raw_user, sample),
+                                           ('platform', 'rollups', lambda _: rollup_platform(), [None] * 3),
+                                           ('platform', 'raw scan', lambda _: raw_platform(), [None] * 3)]:
+            samples = []
+            for target in targets:
+                result, seconds = harness.timed(lambda: call(target))
+                db.session.rollback()
+                samples.append(seconds)
+                results.setdefault((scope, target), {})[path] = comparable(result)
+            rows.append([f'{scope}, {path}', len(samples), f'{statistics.median(samples) * 1000:.2f}',
+                         f'{harness.percentile(samples, 0.95) * 1000:.2f}'])
+
+    print(f"{dialect}: {folded} transactions folded into rollups in {build_seconds:.1f}s")
+    harness.print_table(['query', 'runs', 'p50 ms', 'p95 ms'], rows)
+    mismatched = sum(1 for paths in results.values() if paths['rollups'] != paths['raw scan'])
+    print(f"results differing between rollups and raw scan: {mismatched}")
+    if mismatched:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Locust-style load test of a running server: RPS and latency percentiles per endpoint.
+
+    RATE_LIMIT_ENABLED=0 gunicorn -c gunicorn.conf.py app:app
+    python benchmarks/loadtest.py --url http://127.0.0.1:10000 --users 50 --duration 60
+
+Each virtual user registers and logs in over real HTTP (its own cookie
+jar), then loops over a weighted mix of dashboard reads, searches, fee
+quotes and transfers to the other virtual users until --duration runs
+out. Start the server with rate limiting off, or most requests measure the
+429 path. 4xx answers (say, a balance running out) count as rejected;
+5xx answers and connection failures count as errors and make it exit 1.
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import harness
+
+# (weight, label, method, path, body(rng, wallets)); mirrors the dashboard
+MIX = [
+    (40, 'GET /api/current-user', 'GET', '/api/current-user', None),
+    (25, 'GET /api/transactions', 'GET', '/api/transactions', None),
+    (10, 'GET /api/insights', 'GET', '/api/insights', None),
+    (10, 'POST /api/users/search', 'POST', '/api/users/search', lambda rng, wallets: {'query': 'Load'}),
+    (5, 'POST /api/calculate-fee', 'POST', '/api/calculate-fee',
+     lambda rng, wallets: {'type': 'send', 'amount': rng.randrange(1000, 100000)}),
+    (10, 'POST /api/send-money', 'POST', '/api/send-money',
+     lambda rng, wallets: {'to': rng.choice(wallets), 'amount': 1000, 'pin': harness.PIN}),
+]
+
+def request(opener, url, method, body=None):
+    """(status, seconds); status 0 when the connection itself failed"""
+    data = json.dumps(body).encode() if body is not None else None
+    call = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    try:
+        with opener.open(call, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:10000', help='Base URL of the running server.')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load after signup.')
+    parser.add_argument('--think-time', type=float, default=0, help='Seconds each user waits between requests.')
+    args = parser.parse_args()
+
+    run = f'{secrets.randbelow(10 ** 6):06d}'
+    openers = [urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+               for _ in range(args.users)]
+    wallets = []
+    for i, opener in enumerate(openers):
+        email = f'load-{run}-{i}@example.com'
+        for path, body in [('/api/register', {'name': f'Load {run} {i}', 'email': email,
+                                              'phone': f'07{run}{i:07d}', 'pin': harness.PIN}),
+                           ('/api/login', {'identifier': email, 'pin': harness.PIN})]:
+            call = urllib.request.Request(args.url + path, data=json.dumps(body).encode(), method='POST',
+                                          headers={'Content-Type': 'application/json'})
+            with opener.open(call, timeout=30) as response:
+                profile = json.load(response)
+        wallets.append(profile['user']['wallet_id'])
+
+    weights = [weight for weight, *_ in MIX]
+    samples = {label: [] for _, label, *_ in MIX}
+    statuses = {label: {} for _, label, *_ in MIX}
+    lock = threading.Lock()
+    start = threading.Barrier(args.users + 1)
+
+    def virtual_user(i):
+        rng = random.Random(i)
+        others = [wallet for wallet in wallets if wallet != wallets[i]] or wallets
+        start.wait()
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            _, label, method, path, body = rng.choices(MIX, weights)[0]
+            status, seconds = request(openers[i], args.url + path, method, body and body(rng, others))
+            with lock:
+                samples[label].append(seconds)
+                statuses[label][status] = statuses[label].get(status, 0) + 1
+            if args.think_time:
+                time.sleep(args.think_time)
+
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    _, elapsed = harness.timed(lambda: [thread.join() for thread in threads])
+
+    rows = []
+    total_errors = 0
+    for _, label, *_ in MIX:
+        latencies = samples[label]
+        rejected = sum(count for status, count in statuses[label].items() if 400 <= status < 500)
+        errors = sum(count for status, count in statuses[label].items() if status == 0 or status >= 500)
+        total_errors += errors
+        rows.append([label, len(latencies), rejected, errors, f'{len(latencies) / elapsed:.1f}',
+                     *(f'{harness.percentile(latencies, p) * 1000:.1f}' for p in (0.5, 0.95, 0.99))])
+    every = [seconds for latencies in samples.values() for seconds in latencies]
+    rows.append(['all', len(every), '', total_errors, f'{len(every) / elapsed:.1f}',
+                 *(f'{harness.percentile(every, p) * 1000:.1f}' for p in (0.5, 0.95, 0.99))])
+
+    print(f"{args.url}: {args.users} users for {elapsed:.1f}s")
+    harness.print_table(['endpoint', 'requests', 'rejected', 'errors', 'RPS', 'p50 ms', 'p95 ms', 'p99 ms'], rows)
+    if total_errors:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
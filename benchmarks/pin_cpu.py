@@ -0,0 +1,72 @@
+"""CPU time per request for the endpoints that check a PIN, per hash method.
+
+    python benchmarks/pin_cpu.py --method scrypt --method pbkdf2:sha256:50000
+
+For each method every user is hashed with it, then each endpoint is called
+--repeat times and the median process CPU time is reported. Money routes
+are measured both cold (step-up token cleared, so the KDF runs) and warm
+(token from the previous call, one HMAC instead).
+"""
+import argparse
+import statistics
+import time
+
+import harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', action='append', help='Werkzeug hash method (repeatable).')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    methods = args.method or ['scrypt', 'pbkdf2:sha256', cashine.app.config['PIN_HASH_METHOD']]
+    recipient_id, = harness.seed_users(cashine, 1, 0)
+    with cashine.app.app_context():
+        recipient = cashine.db.session.get(cashine.User, recipient_id).wallet_id
+
+    rows = []
+    for method in methods:
+        cashine.pin_hasher = cashine.PinHasher(method)
+        user_id, = harness.seed_users(cashine, 1, 100000000)
+        with cashine.app.app_context():
+            email = cashine.db.session.get(cashine.User, user_id).email
+        client = harness.client_for(cashine, user_id)
+        pins = ['1234', '4321']
+
+        def forget_step_up():
+            with client.session_transaction() as session:
+                session.pop('pin_step_up', None)
+
+        def update_pin():
+            pins.reverse()
+            return client.post('/api/update-pin', json={'old_pin': pins[1], 'new_pin': pins[0]})
+
+        calls = {
+            'login': (None, lambda: client.post('/api/login', json={'identifier': email, 'pin': pins[0]})),
+            'send-money (KDF)': (forget_step_up, lambda: client.post(
+                '/api/send-money', json={'to': recipient, 'amount': 1000, 'pin': pins[0]})),
+            'send-money (step-up)': (None, lambda: client.post(
+                '/api/send-money', json={'to': recipient, 'amount': 1000, 'pin': pins[0]})),
+            'bank-transfer (KDF)': (forget_step_up, lambda: client.post('/api/bank-transfer', json={
+                'bank': 'BPI', 'account': '0001', 'account_name': 'Bench', 'amount': 10000, 'pin': pins[0]})),
+            'cash-out (KDF)': (forget_step_up, lambda: client.post(
+                '/api/cash-out', json={'amount': 5000, 'method': 'gcash', 'pin': pins[0]})),
+            'update-pin (KDF)': (forget_step_up, update_pin),
+        }
+        for endpoint, (prepare, call) in calls.items():
+            samples = []
+            for _ in range(args.repeat):
+                if prepare:
+                    prepare()
+                started = time.process_time()
+                response = call()
+                samples.append(time.process_time() - started)
+                if response.status_code != 200:
+                    raise SystemExit(f"{endpoint} failed: {response.get_json()}")
+            rows.append([method, endpoint, f'{statistics.median(samples) * 1000:.2f}'])
+
+    harness.print_table(['method', 'endpoint', 'CPU ms (median)'], rows)
+
+if __name__ == '__main__':
+    main()
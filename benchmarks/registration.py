@@ -0,0 +1,81 @@
+"""Concurrent signups through /api/register: throughput and wallet ID uniqueness.
+
+    DATABASE_URL=postgresql://... python benchmarks/registration.py --threads 32
+
+Each thread registers --users accounts with distinct emails and phones, so
+every request should succeed. The PIN is hashed with a cheap method by
+default so the numbers are about wallet ID allocation and the existence
+check, not the KDF. Afterwards every wallet ID must be unique and carry a
+valid check digit. Exits 1 on any failed signup or bad wallet ID.
+"""
+import argparse
+import secrets
+import threading
+
+import harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32, help='Parallel registering threads.')
+    parser.add_argument('--users', type=int, default=50, help='Signups per thread.')
+    parser.add_argument('--pin-method', default='pbkdf2:sha256:1000', help='Werkzeug hash method for PINs.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app(DB_POOL_SIZE=args.threads, DB_MAX_OVERFLOW=2, PIN_HASH_METHOD=args.pin_method)
+    db, User = cashine.db, cashine.User
+    run = f'{secrets.randbelow(10 ** 6):06d}'
+
+    latencies = []
+    statuses = {}
+    failures = {}
+    lock = threading.Lock()
+    start = threading.Barrier(args.threads + 1)
+
+    def registrar(thread):
+        client = cashine.app.test_client()
+        start.wait()
+        for i in range(args.users):
+            n = thread * args.users + i
+            response, seconds = harness.timed(lambda: client.post('/api/register', json={
+                'name': f'Signup {run} {n}', 'email': f'signup-{run}-{n}@example.com',
+                'phone': f'08{run}{n:07d}', 'pin': harness.PIN
+            }))
+            with lock:
+                latencies.append(seconds)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code != 200:
+                    message = str(response.get_json().get('error')).splitlines()[0]
+                    error = f"{response.status_code} {message[:200]}"
+                    failures[error] = failures.get(error, 0) + 1
+
+    threads = [threading.Thread(target=registrar, args=(thread,)) for thread in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    _, elapsed = harness.timed(lambda: [thread.join() for thread in threads])
+
+    with cashine.app.app_context():
+        wallet_ids = [wallet_id for wallet_id, in db.session.execute(
+            db.select(User.wallet_id).where(User.email.like(f'signup-{run}-%'))
+        )]
+        dialect = db.engine.dialect.name
+
+    registered = statuses.get(200, 0)
+    failed = sum(count for status, count in statuses.items() if status != 200)
+    duplicates = len(wallet_ids) - len(set(wallet_ids))
+    invalid = sum(1 for wallet_id in wallet_ids if cashine.luhn_check_digit(wallet_id[4:-1]) != wallet_id[-1])
+
+    print(f"{dialect}: {args.threads} threads x {args.users} signups")
+    harness.print_table(
+        ['registered', 'failed', 'seconds', 'signups/s', 'p50 ms', 'p99 ms'],
+        [[registered, failed, f'{elapsed:.2f}', f'{registered / elapsed:.1f}',
+          f'{harness.percentile(latencies, 0.5) * 1000:.1f}', f'{harness.percentile(latencies, 0.99) * 1000:.1f}']]
+    )
+    for error, count in failures.items():
+        print(f"  {count} x {error}")
+    print(f"duplicate wallet IDs: {duplicates}, bad check digits: {invalid}, failed signups: {failed}")
+    if duplicates or invalid or failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
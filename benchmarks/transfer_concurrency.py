@@ -0,0 +1,93 @@
+"""Parallel senders hammering /api/send-money: throughput and money conservation.
+
+    DATABASE_URL=postgresql://... python benchmarks/transfer_concurrency.py --senders 60
+
+Every sender also receives, and transfers cross in both directions, so the
+run exercises the id-ordered row locks and the guarded debit. Balances are
+kept low enough that some sends fail for lack of funds. Afterwards the
+seeded wallets plus the fees collected must still hold exactly what they
+were seeded with, no balance may be negative and every wallet must match
+its ledger postings. Exits 1 if any of that fails or a request errored.
+"""
+import argparse
+import random
+import threading
+
+import harness
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--senders', type=int, default=50, help='Parallel sending threads.')
+    parser.add_argument('--transfers', type=int, default=20, help='Sends per thread.')
+    parser.add_argument('--balance', type=int, default=20000, help='Seed balance per wallet, centavos.')
+    args = parser.parse_args()
+
+    # One pooled connection per sender, so the pool is not what is measured
+    cashine = harness.load_app(DB_POOL_SIZE=args.senders, DB_MAX_OVERFLOW=2)
+    db, User, Transaction, Posting = cashine.db, cashine.User, cashine.Transaction, cashine.Posting
+    user_ids = harness.seed_users(cashine, args.senders, args.balance)
+    with cashine.app.app_context():
+        wallets = dict(db.session.execute(db.select(User.id, User.wallet_id).where(User.id.in_(user_ids))).all())
+        dialect = db.engine.dialect.name
+
+    latencies = []
+    statuses = {}
+    failures = {}
+    lock = threading.Lock()
+    start = threading.Barrier(args.senders + 1)
+
+    def sender(user_id):
+        client = harness.client_for(cashine, user_id)
+        others = [other for other in user_ids if other != user_id]
+        rng = random.Random(user_id)
+        start.wait()
+        for _ in range(args.transfers):
+            to = wallets[rng.choice(others)]
+            response, seconds = harness.timed(lambda: client.post('/api/send-money', json={
+                'to': to, 'amount': rng.randrange(1000, 5001), 'pin': harness.PIN
+            }))
+            with lock:
+                latencies.append(seconds)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code not in (200, 400):
+                    message = str(response.get_json().get('error')).splitlines()[0]
+                    error = f"{response.status_code} {message[:200]}"
+                    failures[error] = failures.get(error, 0) + 1
+
+    threads = [threading.Thread(target=sender, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    _, elapsed = harness.timed(lambda: [thread.join() for thread in threads])
+
+    with cashine.app.app_context():
+        balances = dict(db.session.execute(db.select(User.id, User.balance).where(User.id.in_(user_ids))).all())
+        fees = -(db.session.execute(db.select(db.func.sum(Transaction.fee)).where(
+            Transaction.user_id.in_(user_ids), Transaction.type == 'Sent'
+        )).scalar() or 0)
+        ledger = dict(db.session.execute(
+            db.select(Posting.user_id, db.func.sum(Posting.amount))
+            .where(Posting.user_id.in_(user_ids)).group_by(Posting.user_id)
+        ).all())
+
+    sent = statuses.get(200, 0)
+    rejected = statuses.get(400, 0)
+    errors = sum(count for status, count in statuses.items() if status not in (200, 400))
+    drift = sum(balances.values()) + fees - args.balance * len(user_ids)
+    negative = sum(1 for balance in balances.values() if balance < 0)
+    mismatched = sum(1 for user_id, balance in balances.items() if ledger.get(user_id) != balance)
+
+    print(f"{dialect}: {args.senders} senders x {args.transfers} transfers")
+    harness.print_table(
+        ['sent', 'rejected', 'errors', 'seconds', 'transfers/s', 'p50 ms', 'p99 ms'],
+        [[sent, rejected, errors, f'{elapsed:.2f}', f'{sent / elapsed:.1f}',
+          f'{harness.percentile(latencies, 0.5) * 1000:.1f}', f'{harness.percentile(latencies, 0.99) * 1000:.1f}']]
+    )
+    for error, count in failures.items():
+        print(f"  {count} x {error}")
+    print(f"balance drift: {drift} centavos, negative balances: {negative}, ledger mismatches: {mismatched}")
+    if drift or negative or mismatched or errors:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
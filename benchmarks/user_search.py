@@ -0,0 +1,65 @@
+"""p50/p95 latency of find_users() per query shape over a large users table.
+
+    DATABASE_URL=postgresql://... python benchmarks/user_search.py --users 1000000
+
+Queries run in-process (no HTTP) so the numbers are the search backend:
+B-tree prefix scans for wallet IDs and phones, the name-prefix path for
+short queries, and trigram substring matches (pg_trgm on Postgres, the
+in-process ranking elsewhere).
+"""
+import argparse
+import random
+
+import harness
+
+FIRST_NAMES = ['Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Angel', 'Kristine', 'John', 'Michelle', 'Paolo',
+               'Rhea', 'Carlo', 'Joy', 'Miguel', 'Camille', 'Rafael', 'Bea', 'Gabriel', 'Nicole', 'Enrique']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas',
+              'Andres', 'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino', 'Navarro']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200, help='Queries timed per shape.')
+    args = parser.parse_args()
+
+    cashine = harness.load_app()
+    db, User = cashine.db, cashine.User
+    rng = random.Random(7)
+    names = [f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(args.users)]
+    print(f"Seeding {args.users} users...")
+    user_ids = harness.seed_users(cashine, args.users, 0, name=names.__getitem__)
+
+    with cashine.app.app_context():
+        sample = db.session.execute(
+            db.select(User.wallet_id, User.phone).where(User.id.in_(rng.sample(user_ids, min(100, len(user_ids)))))
+        ).all()
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE users'))
+            db.session.commit()
+        shapes = {
+            'wallet ID prefix': lambda: rng.choice(sample)[0][:10],
+            'full wallet ID': lambda: rng.choice(sample)[0],
+            'phone prefix': lambda: rng.choice(sample)[1][:8],
+            'short name': lambda: rng.choice(FIRST_NAMES)[:2],
+            'name substring': lambda: rng.choice(LAST_NAMES)[1:5].lower(),
+            'full name': lambda: f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'no match': lambda: 'zzqx' + str(rng.randrange(1000)),
+        }
+        rows = []
+        for shape, make_query in shapes.items():
+            latencies = []
+            for _ in range(args.queries):
+                query = make_query()
+                _, seconds = harness.timed(lambda: cashine.find_users(query, 0))
+                db.session.rollback()
+                latencies.append(seconds)
+            rows.append([shape, f'{harness.percentile(latencies, 0.5) * 1000:.2f}',
+                         f'{harness.percentile(latencies, 0.95) * 1000:.2f}'])
+        dialect = db.engine.dialect.name
+
+    print(f"{dialect}: {args.users} seeded users, {args.queries} queries per shape")
+    harness.print_table(['query', 'p50 ms', 'p95 ms'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Gunicorn serving profile, loaded with `gunicorn -c gunicorn.conf.py app:app`
+import glob
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+
+# The KDF and Postgres round trips dominate request time, so a few processes
+# with threads each keep the CPU busy without multiplying pool connections
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Each open /api/events stream holds a gthread thread for its lifetime, so
+# the app lets streams take at most half of them (WALLET_EVENTS_MAX_STREAMS)
+# and further dashboards poll instead. For push to every dashboard, switch
+# to GUNICORN_WORKER_CLASS=gevent (gevent and psycogreen are in requirements).
+# gevent only: greenlets per worker (psycopg2 must be patched, see post_fork)
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks never reach the memory limit
+max_requests = 1000
+max_requests_jitter = 100
+
+# Import the app once in the master (migrations run there, before forking);
+# workers then share its memory copy-on-write
+preload_app = True
+
+# Workers write metric samples here and /metrics aggregates them. This has
+# to happen at config load: with preload the app (and prometheus_client) is
+# imported before any server hook runs. Sample files left by a previous
+# master are removed so they are not summed into ours; only prometheus_client's
+# *.db files, in case the variable points at a directory holding anything else.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/cashine-metrics')
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+for sample_file in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+    os.remove(sample_file)
+
+accesslog = '-'
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+    # Pooled connections opened in the master (by migrations) must not be
+    # shared with the children; drop them without closing the master's sockets
+    from app import app, db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
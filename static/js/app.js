@@ -0,0 +1,628 @@
+const API_BASE = 'https://cashine-ewallet.onrender.com';
+
+let currentUser = null;
+let transactionsCursor = null;
+let walletEvents = null;
+let walletPoll = null;
+
+// Toggle between login and signup
+function toggleAuth() {
+  document.getElementById("authSection").classList.toggle("hidden");
+  document.getElementById("signupSection").classList.toggle("hidden");
+}
+
+// Quote a fee (in pesos) from the server-side fee schedule
+async function calculateFee(amount, type) {
+  const response = await fetch(`${API_BASE}/api/calculate-fee`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ amount: toCentavos(amount), type }),
+    credentials: 'include'
+  });
+  
+  const data = await response.json();
+  return data.success ? data.fee / 100 : 0;
+}
+
+// API amounts are integer centavos
+function toCentavos(pesos) {
+  return Math.round(pesos * 100);
+}
+
+function formatPeso(centavos) {
+  return (centavos / 100).toFixed(2);
+}
+
+// Signup function with API call
+async function signup() {
+  const name = document.getElementById("signupName").value.trim();
+  const email = document.getElementById("signupEmail").value.trim();
+  const phone = document.getElementById("signupPhone").value.trim();
+  const birthdate = document.getElementById("signupBirthdate").value;
+  const address = document.getElementById("signupAddress").value.trim();
+  const pin = document.getElementById("signupPIN").value.trim();
+  
+  if (!name || !email || !phone || !birthdate || !address || pin.length !== 4) {
+    alert("Please fill all fields correctly. PIN must be 4 digits.");
+    return;
+  }
+  
+  if (!validateEmail(email)) {
+    alert("Please enter a valid email address.");
+    return;
+  }
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/register`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ name, email, phone, birthdate, address, pin }),
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      alert(`✅ Account created successfully!\n\nYour Wallet ID: ${data.user.wallet_id}\nStarting Balance: ₱500.00\n\nPlease keep your Wallet ID and PIN safe.`);
+      
+      // Clear form and show login
+      document.getElementById("signupName").value = "";
+      document.getElementById("signupEmail").value = "";
+      document.getElementById("signupPhone").value = "";
+      document.getElementById("signupBirthdate").value = "";
+      document.getElementById("signupAddress").value = "";
+      document.getElementById("signupPIN").value = "";
+      
+      toggleAuth();
+    } else {
+      alert(`❌ Error: ${data.error}`);
+    }
+  } catch (error) {
+    alert("❌ Network error. Please try again.");
+    console.error(error);
+  }
+}
+
+// Login function with API call
+async function login() {
+  const id = document.getElementById("loginID").value.trim();
+  const pin = document.getElementById("loginPIN").value.trim();
+  
+  if (!id || !pin) {
+    alert("Please enter your ID/Phone and PIN.");
+    return;
+  }
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/login`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ identifier: id, pin }),
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      currentUser = data.user;
+      
+      // Show dashboard
+      document.getElementById("authSection").classList.add("hidden");
+      document.getElementById("signupSection").classList.add("hidden");
+      document.getElementById("dashboard").classList.remove("hidden");
+      
+      // Update dashboard info
+      document.getElementById("welcomeMsg").innerText = `Welcome, ${currentUser.name}!`;
+      document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+      document.getElementById("myWalletID").innerText = currentUser.wallet_id;
+      openWalletEvents();
+    } else {
+      alert(`❌ Login failed: ${data.error}`);
+    }
+  } catch (error) {
+    alert("❌ Network error. Please try again.");
+    console.error(error);
+  }
+}
+
+// Logout function
+async function logout() {
+  if (confirm("Are you sure you want to logout?")) {
+    try {
+      await fetch(`${API_BASE}/api/logout`, {
+        method: 'POST',
+        credentials: 'include'
+      });
+      
+      currentUser = null;
+      closeWalletEvents();
+      document.getElementById("dashboard").classList.add("hidden");
+      document.getElementById("authSection").classList.remove("hidden");
+      
+      // Clear login form
+      document.getElementById("loginID").value = "";
+      document.getElementById("loginPIN").value = "";
+    } catch (error) {
+      console.error(error);
+    }
+  }
+}
+
+// Live balance and transaction updates pushed by the server
+function openWalletEvents() {
+  closeWalletEvents();
+  walletEvents = new EventSource(`${API_BASE}/api/events`, { withCredentials: true });
+  walletEvents.addEventListener("wallet", event => applyWalletEvent(JSON.parse(event.data)));
+  walletEvents.addEventListener("error", () => {
+    // CLOSED means the server turned the stream away (e.g. 204 when busy);
+    // transient drops stay CONNECTING and reconnect on their own
+    if (walletEvents && walletEvents.readyState === EventSource.CLOSED) {
+      walletEvents = null;
+      pollWallet();
+    }
+  });
+}
+
+function closeWalletEvents() {
+  if (walletEvents) {
+    walletEvents.close();
+    walletEvents = null;
+  }
+  if (walletPoll) {
+    clearInterval(walletPoll);
+    walletPoll = null;
+  }
+}
+
+// Fallback when no stream is available: revalidate the profile every 30s
+// (a 304 while nothing changed) and resync the history when the balance moved
+function pollWallet() {
+  walletPoll = setInterval(async () => {
+    if (!currentUser) return;
+    try {
+      const response = await fetch(`${API_BASE}/api/current-user`, { credentials: 'include' });
+      const data = await response.json();
+      if (data.success && data.user.balance_version !== currentUser.balance_version) {
+        currentUser.balance_version = data.user.balance_version;
+        applyWalletEvent({ balance: data.user.balance, transactions: [], resync: true });
+      }
+    } catch (error) {
+      console.error(error);
+    }
+  }, 30000);
+}
+
+function applyWalletEvent(update) {
+  if (!currentUser) return;
+  
+  currentUser.balance = update.balance;
+  document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+  
+  // Only touch the history list while it is on screen
+  if (document.getElementById("transactionsModal").classList.contains("hidden")) return;
+  
+  if (update.resync) {
+    showTransactions();
+  } else if (update.transactions.length > 0) {
+    prependTransactions(update.transactions);
+  }
+}
+
+// Modal functions
+function showSend() {
+  document.getElementById("sendModal").classList.remove("hidden");
+  document.getElementById("sendAmount").addEventListener("input", updateFeeCalculation);
+}
+
+function showBankTransfer() {
+  document.getElementById("bankTransferModal").classList.remove("hidden");
+}
+
+function showCashOut() {
+  document.getElementById("cashOutModal").classList.remove("hidden");
+  document.getElementById("cashOutAmount").addEventListener("input", updateCashOutFee);
+}
+
+async function showTransactions() {
+  try {
+    const response = await fetch(`${API_BASE}/api/transactions`, {
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      loadTransactionHistory(data.transactions);
+      setTransactionsCursor(data.next_cursor);
+    } else {
+      alert("❌ Failed to load transactions.");
+    }
+  } catch (error) {
+    alert("❌ Network error.");
+    console.error(error);
+  }
+  
+  document.getElementById("transactionsModal").classList.remove("hidden");
+}
+
+async function loadMoreTransactions() {
+  if (!transactionsCursor) return;
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/transactions?before=${encodeURIComponent(transactionsCursor)}`, {
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      loadTransactionHistory(data.transactions, true);
+      setTransactionsCursor(data.next_cursor);
+    } else {
+      alert("❌ Failed to load transactions.");
+    }
+  } catch (error) {
+    alert("❌ Network error.");
+    console.error(error);
+  }
+}
+
+function setTransactionsCursor(cursor) {
+  transactionsCursor = cursor;
+  document.getElementById("loadMoreTransactions").classList.toggle("hidden", !cursor);
+}
+
+function showProfile() {
+  if (currentUser) {
+    document.getElementById("profileName").innerText = currentUser.name;
+    document.getElementById("profileWalletID").innerText = `Wallet ID: ${currentUser.wallet_id}`;
+    document.getElementById("profileEmail").value = currentUser.email;
+    document.getElementById("profilePhone").value = currentUser.phone;
+    document.getElementById("profileBirthdate").value = currentUser.birthdate || '';
+    document.getElementById("profileAddress").value = currentUser.address || '';
+    document.getElementById("profileModal").classList.remove("hidden");
+  }
+}
+
+function showReceive() {
+  if (currentUser) {
+    document.getElementById("receiveWalletID").innerText = currentUser.wallet_id;
+    document.getElementById("receivePhone").innerText = currentUser.phone;
+    document.getElementById("receiveModal").classList.remove("hidden");
+  }
+}
+
+function closeModal(modalId) {
+  document.getElementById(modalId).classList.add("hidden");
+}
+
+// Send money with API call
+async function sendMoney() {
+  const to = document.getElementById("sendTo").value.trim();
+  const amount = parseFloat(document.getElementById("sendAmount").value);
+  const purpose = document.getElementById("sendPurpose").value.trim() || "Money Transfer";
+  const pin = document.getElementById("sendPIN").value.trim();
+  
+  if (!to || isNaN(amount) || amount <= 0 || !pin) {
+    alert("❌ Please fill all fields correctly.");
+    return;
+  }
+  
+  if (amount < 1) {
+    alert("❌ Minimum amount is ₱1.00");
+    return;
+  }
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/send-money`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Idempotency-Key': crypto.randomUUID() },
+      body: JSON.stringify({ to, amount: toCentavos(amount), purpose, pin }),
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      // Update current user balance
+      currentUser.balance = data.new_balance;
+      document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+      
+      alert(`✅ ${data.message}\n\nFee: ₱${formatPeso(data.fee)}\nNew Balance: ₱${formatPeso(data.new_balance)}`);
+      
+      // Clear form and close modal
+      document.getElementById("sendTo").value = "";
+      document.getElementById("sendAmount").value = "";
+      document.getElementById("sendPurpose").value = "";
+      document.getElementById("sendPIN").value = "";
+      document.getElementById("feeCalculation").innerHTML = "";
+      
+      closeModal("sendModal");
+    } else {
+      alert(`❌ Error: ${data.error}`);
+    }
+  } catch (error) {
+    alert("❌ Network error. Please try again.");
+    console.error(error);
+  }
+}
+
+// Process bank transfer with API call
+async function processBankTransfer() {
+  const bank = document.getElementById("bankSelect").value;
+  const account = document.getElementById("bankAccount").value.trim();
+  const accountName = document.getElementById("bankAccountName").value.trim();
+  const amount = parseFloat(document.getElementById("bankAmount").value);
+  const pin = document.getElementById("bankPIN").value.trim();
+  
+  if (!bank || !account || !accountName || isNaN(amount) || amount <= 0 || !pin) {
+    alert("❌ Please fill all fields correctly.");
+    return;
+  }
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/bank-transfer`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Idempotency-Key': crypto.randomUUID() },
+      body: JSON.stringify({ bank, account, account_name: accountName, amount: toCentavos(amount), pin }),
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      // Update current user balance
+      currentUser.balance = data.new_balance;
+      document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+      
+      alert(`✅ ${data.message}\n\nTransfer will be processed within 24 hours.\nNew Balance: ₱${formatPeso(data.new_balance)}`);
+      
+      // Clear form and close modal
+      document.getElementById("bankSelect").value = "";
+      document.getElementById("bankAccount").value = "";
+      document.getElementById("bankAccountName").value = "";
+      document.getElementById("bankAmount").value = "";
+      document.getElementById("bankPIN").value = "";
+      
+      closeModal("bankTransferModal");
+    } else {
+      alert(`❌ Error: ${data.error}`);
+    }
+  } catch (error) {
+    alert("❌ Network error. Please try again.");
+    console.error(error);
+  }
+}
+
+// Process cash out with API call
+async function processCashOut() {
+  const amount = parseFloat(document.getElementById("cashOutAmount").value);
+  const method = document.getElementById("cashOutMethod").value;
+  const pin = document.getElementById("cashOutPIN").value.trim();
+  
+  if (isNaN(amount) || amount <= 0 || !pin) {
+    alert("❌ Please enter a valid amount and PIN.");
+    return;
+  }
+  
+  try {
+    const response = await fetch(`${API_BASE}/api/cash-out`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Idempotency-Key': crypto.randomUUID() },
+      body: JSON.stringify({ amount: toCentavos(amount), method, pin }),
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      // Update current user balance
+      currentUser.balance = data.new_balance;
+      document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+      
+      alert(`✅ ${data.message}\n\nYou'll receive: ₱${formatPeso(data.you_receive)}\nFee: ₱${formatPeso(data.fee)}\nNew Balance: ₱${formatPeso(data.new_balance)}`);
+      
+      // Clear form and close modal
+      document.getElementById("cashOutAmount").value = "";
+      document.getElementById("cashOutPIN").value = "";
+      document.getElementById("cashOutFee").innerHTML = "";
+      
+      closeModal("cashOutModal");
+    } else {
+      alert(`❌ Error: ${data.error}`);
+    }
+  } catch (error) {
+    alert("❌ Network error. Please try again.");
+    console.error(error);
+  }
+}
+
+// Load transaction history
+function loadTransactionHistory(transactions, append = false) {
+  const list = document.getElementById("transactionList");
+  
+  if (!append && (!transactions || transactions.length === 0)) {
+    list.innerHTML = `
+      <div style="text-align: center; padding: 3rem 1rem; color: var(--gray);">
+        <i class="fas fa-history" style="font-size: 3rem; margin-bottom: 1rem;"></i>
+        <p>No transactions yet</p>
+      </div>
+    `;
+    return;
+  }
+  
+  const html = transactions.map(renderTransaction).join("");
+  
+  list.innerHTML = append ? list.innerHTML + html : html;
+}
+
+function prependTransactions(transactions) {
+  const list = document.getElementById("transactionList");
+  
+  // Replace the "No transactions yet" placeholder
+  if (!list.querySelector(".transaction")) {
+    list.innerHTML = "";
+  }
+  list.insertAdjacentHTML("afterbegin", transactions.map(renderTransaction).join(""));
+}
+
+function renderTransaction(t) {
+  const isPositive = t.amount > 0;
+  const typeClass = isPositive ? 'received' : t.type === 'Cash Out' ? 'fee' : 'sent';
+  const sign = isPositive ? '+' : '';
+  const feeDisplay = t.fee < 0 ? `<div style="font-size: 0.8rem; color: var(--danger);">Fee: ₱${formatPeso(Math.abs(t.fee))}</div>` : '';
+  
+  return `
+    <div class="transaction ${typeClass}">
+      <div class="transaction-details">
+        <div class="transaction-type">${t.type}</div>
+        <div class="transaction-date">${t.date}</div>
+        <div class="text-muted" style="font-size: 0.9rem;">${t.note}</div>
+        ${feeDisplay}
+      </div>
+      <div class="transaction-amount" style="color: ${isPositive ? 'var(--secondary)' : 'var(--danger)'};">
+        ${sign}₱${formatPeso(Math.abs(t.amount))}
+      </div>
+    </div>
+  `;
+}
+
+// Utility functions
+async function updateFeeCalculation() {
+  const amount = parseFloat(document.getElementById("sendAmount").value);
+  if (isNaN(amount) || amount <= 0) return;
+  
+  const fee = await calculateFee(amount, 'send');
+  const total = amount + fee;
+  
+  document.getElementById("feeCalculation").innerHTML = `
+    <div style="background: var(--light); padding: 1rem; border-radius: 8px;">
+      <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
+        <span>Amount:</span>
+        <span>₱${amount.toFixed(2)}</span>
+      </div>
+      <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem; color: var(--danger);">
+        <span>Fee:</span>
+        <span>₱${fee.toFixed(2)}</span>
+      </div>
+      <div style="display: flex; justify-content: space-between; font-weight: 600; border-top: 1px solid #ddd; padding-top: 0.5rem;">
+        <span>Total Deduction:</span>
+        <span>₱${total.toFixed(2)}</span>
+      </div>
+    </div>
+  `;
+}
+
+async function updateCashOutFee() {
+  const amount = parseFloat(document.getElementById("cashOutAmount").value);
+  if (isNaN(amount) || amount <= 0) return;
+  
+  const fee = await calculateFee(amount, 'cashout');
+  const total = amount + fee;
+  const receive = amount;
+  
+  document.getElementById("cashOutFee").innerHTML = `
+    <div style="background: var(--light); padding: 1rem; border-radius: 8px;">
+      <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
+        <span>Cash Out Amount:</span>
+        <span>₱${amount.toFixed(2)}</span>
+      </div>
+      <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem; color: var(--danger);">
+        <span>Fee:</span>
+        <span>₱${fee.toFixed(2)}</span>
+      </div>
+      <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem; color: var(--secondary);">
+        <span>You'll Receive:</span>
+        <span>₱${receive.toFixed(2)}</span>
+      </div>
+      <div style="display: flex; justify-content: space-between; font-weight: 600; border-top: 1px solid #ddd; padding-top: 0.5rem;">
+        <span>Total Deduction:</span>
+        <span>₱${total.toFixed(2)}</span>
+      </div>
+    </div>
+  `;
+}
+
+function copyToClipboard(elementId) {
+  const text = document.getElementById(elementId).innerText;
+  navigator.clipboard.writeText(text).then(() => {
+    alert("Wallet ID copied to clipboard!");
+  });
+}
+
+function validateEmail(email) {
+  const re = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
+  return re.test(email);
+}
+
+function getBankName(code) {
+  const banks = {
+    'bpi': 'BPI',
+    'bdo': 'BDO',
+    'metrobank': 'Metrobank',
+    'unionbank': 'UnionBank',
+    'landbank': 'Land Bank',
+    'rcbc': 'RCBC'
+  };
+  return banks[code] || code;
+}
+
+function getMethodName(code) {
+  const methods = {
+    'gcash': 'GCash',
+    'maya': 'Maya',
+    'palawan': 'Palawan Express',
+    'cebuana': 'Cebuana Lhuillier',
+    'bank': 'Bank Withdrawal'
+  };
+  return methods[code] || code;
+}
+
+// Check if user is already logged in on page load
+async function checkAuthStatus() {
+  try {
+    const response = await fetch(`${API_BASE}/api/current-user`, {
+      credentials: 'include'
+    });
+    
+    const data = await response.json();
+    
+    if (data.success) {
+      currentUser = data.user;
+      document.getElementById("authSection").classList.add("hidden");
+      document.getElementById("signupSection").classList.add("hidden");
+      document.getElementById("dashboard").classList.remove("hidden");
+      document.getElementById("welcomeMsg").innerText = `Welcome, ${currentUser.name}!`;
+      document.getElementById("walletBalance").innerText = formatPeso(currentUser.balance);
+      document.getElementById("myWalletID").innerText = currentUser.wallet_id;
+      openWalletEvents();
+    }
+  } catch (error) {
+    // Not logged in, show login form
+    console.log("User not authenticated");
+  }
+}
+
+// Initialize on page load
+document.addEventListener('DOMContentLoaded', function() {
+  checkAuthStatus();
+  
+  // Add event listeners for real-time fee calculations
+  const sendAmount = document.getElementById("sendAmount");
+  const cashOutAmount = document.getElementById("cashOutAmount");
+  
+  if (sendAmount) {
+    sendAmount.addEventListener("input", updateFeeCalculation);
+  }
+  
+  if (cashOutAmount) {
+    cashOutAmount.addEventListener("input", updateCashOutFee);
+  }
+  
+  // Set max date for birthdate to today
+  const today = new Date().toISOString().split('T')[0];
+  const birthdateInput = document.getElementById("signupBirthdate");
+  if (birthdateInput) {
+    birthdateInput.max = today;
+  }
+});
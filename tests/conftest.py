@@ -0,0 +1,42 @@
+"""Shared fixtures. app.py configures itself and migrates at import, so the
+environment is set up first and every test runs against one throwaway
+SQLite database; tests create their own users instead of resetting it."""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'cashine-test.db')
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+os.environ['PIN_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['SETTLEMENT_BACKOFF_SECONDS'] = '0'
+
+import app as cashine  # noqa: E402
+
+_user_numbers = itertools.count(1)
+
+@pytest.fixture(autouse=True)
+def fresh_stores(monkeypatch):
+    """Rate limit and risk windows start empty for every test"""
+    monkeypatch.setattr(cashine, 'rate_limit_store', cashine.MemoryRateLimitStore())
+    monkeypatch.setattr(cashine.risk_engine, 'store', cashine.MemoryRiskStore())
+
+@pytest.fixture
+def make_user():
+    """Register a user; returns (test client logged in as them, profile)"""
+    def make(pin='1234'):
+        n = next(_user_numbers)
+        email = f'user{n}@example.com'
+        client = cashine.app.test_client()
+        response = client.post('/api/register', json={
+            'name': f'User {n}', 'email': email, 'phone': f'0917{n:07d}', 'pin': pin
+        })
+        assert response.status_code == 200, response.get_json()
+        response = client.post('/api/login', json={'identifier': email, 'pin': pin})
+        assert response.status_code == 200, response.get_json()
+        return client, response.get_json()['user']
+    return make
+
+def send(client, to, amount, pin='1234', **headers):
+    return client.post('/api/send-money', json={'to': to, 'amount': amount, 'pin': pin}, headers=headers)
@@ -0,0 +1,162 @@
+"""Archiving old months to CSV.gz and reading them back.
+
+archive_transactions() archives every month past the cutoff in the shared
+test database, so each test backdates its own rows into a month no other
+test uses."""
+import csv
+import gzip
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as cashine
+from app import DailySendTotal, SettlementJob, Transaction, TransactionArchiveUser, db
+from conftest import send
+
+@pytest.fixture(autouse=True)
+def archive_dir(monkeypatch, tmp_path):
+    monkeypatch.setitem(cashine.app.config, 'TRANSACTION_ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setattr(cashine, 'LEDGER_SETTLE_SECONDS', 0)
+    return tmp_path
+
+def backdate(user_ids, months_ago):
+    """Move the users' transactions and send counters into a month months_ago back"""
+    month = cashine.add_months(cashine.month_start(datetime.utcnow()), -months_ago)
+    with cashine.app.app_context():
+        transactions = Transaction.query.filter(Transaction.user_id.in_(user_ids)).order_by(Transaction.id)
+        for minute, transaction in enumerate(transactions):
+            transaction.created_at = month + timedelta(days=9, minutes=minute)
+        for counter in DailySendTotal.query.filter(DailySendTotal.user_id.in_(user_ids)):
+            counter.day = (month + timedelta(days=9)).date()
+        db.session.commit()
+    return month
+
+def archive():
+    with cashine.app.app_context():
+        while cashine.refresh_rollups():
+            pass
+        return dict(cashine.archive_transactions(12))
+
+def history(client, limit):
+    """Every transaction id from /api/transactions, newest first, limit per page"""
+    ids, cursor = [], None
+    while True:
+        response = client.get('/api/transactions', query_string={'limit': limit, **({'before': cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.get_json()
+        ids += [t['id'] for t in page['transactions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            return ids
+
+def test_history_pages_from_live_rows_into_the_archive(make_user):
+    alice_client, alice = make_user()
+    _, bob = make_user()
+    for amount in (1000, 1100, 1200, 1300, 1400):
+        assert send(alice_client, bob['wallet_id'], amount).status_code == 200
+    month = backdate([alice['id'], bob['id']], 14)
+    assert send(alice_client, bob['wallet_id'], 1500).status_code == 200
+    before = history(alice_client, 100)
+    
+    assert archive()[month] == 10
+    
+    with cashine.app.app_context():
+        assert Transaction.query.filter_by(user_id=alice['id']).count() == 1
+    assert history(alice_client, 2) == before
+    assert len(before) == 6
+
+def test_each_user_is_read_from_their_own_gzip_member(make_user, archive_dir):
+    clients = [make_user() for _ in range(3)]
+    for (client, _), (_, to) in zip(clients, clients[1:] + clients[:1]):
+        assert send(client, to['wallet_id'], 1000).status_code == 200
+    month = backdate([user['id'] for _, user in clients], 15)
+    
+    assert archive()[month] == 6
+    
+    path = os.path.join(archive_dir, f"transactions_{month:%Y_%m}.csv.gz")
+    with gzip.open(path, 'rt', newline='') as whole:
+        rows = list(csv.DictReader(whole))
+    assert len(rows) == 6
+    with cashine.app.app_context():
+        members = TransactionArchiveUser.query.filter(
+            TransactionArchiveUser.user_id.in_([user['id'] for _, user in clients])
+        ).order_by(TransactionArchiveUser.byte_offset).all()
+        assert [member.row_count for member in members] == [2, 2, 2]
+        with open(path, 'rb') as archive_file:
+            for member in members:
+                archive_file.seek(member.byte_offset)
+                text = gzip.decompress(archive_file.read(member.byte_length)).decode()
+                assert {row[1] for row in csv.reader(io.StringIO(text))} == {str(member.user_id)}
+
+def test_single_member_archives_are_still_scanned(make_user):
+    alice_client, alice = make_user()
+    _, bob = make_user()
+    assert send(alice_client, bob['wallet_id'], 1000).status_code == 200
+    backdate([alice['id'], bob['id']], 16)
+    before = history(alice_client, 50)
+    archive()
+    
+    # What archives written before per-user offsets look like in the table
+    with cashine.app.app_context():
+        TransactionArchiveUser.query.filter_by(user_id=alice['id']).update({'byte_offset': None, 'byte_length': None})
+        db.session.commit()
+    
+    assert history(alice_client, 50) == before
+
+def test_export_streams_archived_months_with_the_right_balances(make_user):
+    alice_client, alice = make_user()
+    _, bob = make_user()
+    assert send(alice_client, bob['wallet_id'], 2000).status_code == 200
+    month = backdate([alice['id'], bob['id']], 17)
+    assert send(alice_client, bob['wallet_id'], 3000).status_code == 200
+    archive()
+    
+    response = alice_client.get('/api/transactions/export?format=csv')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))[1:]
+    balance = alice_client.get('/api/current-user').get_json()['user']['balance']
+    
+    assert [row[3] for row in rows] == ['-20.00', '-30.00']
+    assert rows[0][1].startswith(f'{month:%Y-%m}')
+    assert rows[-1][5] == cashine.format_pesos(balance)
+    
+    # Starting inside the archive still opens at the balance before that row
+    since = alice_client.get(f'/api/transactions/export?format=ndjson&from={month:%Y-%m-%d}')
+    first = cashine.json.loads(since.get_data(as_text=True).splitlines()[0])
+    assert first['balance'] == cashine.SIGNUP_BONUS + first['amount'] + first['fee']
+
+def test_months_with_unfinished_payouts_are_not_archived(make_user):
+    client, alice = make_user()
+    assert client.post('/api/bank-transfer', json={
+        'bank': 'BPI', 'account': 'acct-archive', 'account_name': 'Alice', 'amount': 10000, 'pin': '1234'
+    }).status_code == 200
+    month = backdate([alice['id']], 18)
+    with cashine.app.app_context():
+        job = SettlementJob.query.join(Transaction).filter(Transaction.user_id == alice['id']).one()
+        job.status = 'failed'
+        job_id = job.id
+        db.session.commit()
+    
+    try:
+        with pytest.raises(ValueError, match='pending, held or failed'):
+            archive()
+    finally:
+        # Let later archive runs past this month
+        with cashine.app.app_context():
+            db.session.get(SettlementJob, job_id).status = 'settled'
+            db.session.commit()
+    
+    assert archive()[month] == 1
+
+def test_reconcile_leaves_archived_days_alone(make_user):
+    client, alice = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 4000).status_code == 200
+    month = backdate([alice['id']], 19)
+    archive()
+    
+    with cashine.app.app_context():
+        cashine.reconcile_daily_send_totals()
+        counter = db.session.get(DailySendTotal, (alice['id'], (month + timedelta(days=9)).date()))
+        assert counter.total == 4000
@@ -0,0 +1,46 @@
+"""Smoke runs of the scripts in benchmarks/ at toy sizes, so they keep
+working as the app changes. Each gets a fresh SQLite database,
+except the HTTP load test, which drives a server started here."""
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import app as cashine
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks')
+
+@pytest.mark.parametrize('script, args', [
+    ('user_search.py', ['--users', '300', '--queries', '3']),
+    ('pin_cpu.py', ['--method', 'pbkdf2:sha256:1000', '--repeat', '2']),
+    ('export_memory.py', ['--rows', '2000']),
+    ('bulk_transfer.py', ['--recipients', '10', '--rounds', '1']),
+    ('insights.py', ['--users', '20', '--rows-per-user', '10', '--queries', '3']),
+    ('http_caching.py', ['--rows', '20', '--requests', '3']),
+])
+def test_benchmark_runs(script, args):
+    env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+    result = subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, script), *args],
+        env=env, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+def test_loadtest_runs_against_a_live_server():
+    # In this process, so it shares the test database and configuration
+    server = make_server('127.0.0.1', 0, cashine.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        env = {**os.environ, 'NO_PROXY': '127.0.0.1', 'no_proxy': '127.0.0.1'}
+        result = subprocess.run(
+            [sys.executable, os.path.join(BENCHMARKS, 'loadtest.py'),
+             '--url', f'http://127.0.0.1:{server.server_port}', '--users', '2', '--duration', '1'],
+            env=env, capture_output=True, text=True, timeout=120
+        )
+    finally:
+        server.shutdown()
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'GET /api/current-user' in result.stdout
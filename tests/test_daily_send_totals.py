@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import app as cashine
+from app import DailySendTotal, Transaction, db
+from conftest import send
+
+def sent_today(user_id):
+    """The per-request SUM the counters replaced"""
+    return -(db.session.query(db.func.sum(Transaction.amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.type == 'Sent',
+        db.func.date(Transaction.created_at) == datetime.utcnow().date().isoformat()
+    ).scalar() or 0)
+
+def counter_today(user_id):
+    return db.session.get(DailySendTotal, (user_id, datetime.utcnow().date())).total
+
+def test_counter_agrees_with_sum(make_user):
+    sender, alice = make_user()
+    _, bob = make_user()
+    _, carol = make_user()
+    
+    for to, amount in [(bob, 1500), (carol, 2000), (bob, 1234)]:
+        assert send(sender, to['wallet_id'], amount).status_code == 200
+    
+    with cashine.app.app_context():
+        assert counter_today(alice['id']) == sent_today(alice['id']) == 4734
+
+def test_bulk_send_counts_the_batch_total(make_user):
+    sender, alice = make_user()
+    _, bob = make_user()
+    _, carol = make_user()
+    
+    response = sender.post('/api/send-money/bulk', json={'pin': '1234', 'recipients': [
+        {'to': bob['wallet_id'], 'amount': 1000}, {'to': carol['wallet_id'], 'amount': 2500},
+    ]})
+    assert response.status_code == 200, response.get_json()
+    
+    with cashine.app.app_context():
+        assert counter_today(alice['id']) == sent_today(alice['id']) == 3500
+
+def test_limit_is_checked_against_the_counter(make_user):
+    sender, alice = make_user()
+    _, bob = make_user()
+    assert send(sender, bob['wallet_id'], 1000).status_code == 200
+    
+    with cashine.app.app_context():
+        counter = db.session.get(DailySendTotal, (alice['id'], datetime.utcnow().date()))
+        counter.total = cashine.DAILY_SEND_LIMIT - 500
+        db.session.commit()
+    
+    response = send(sender, bob['wallet_id'], 1000)
+    assert response.status_code == 400
+    assert 'limit' in response.get_json()['error']
+
+def test_reconcile_repairs_drifted_counters(make_user):
+    sender, alice = make_user()
+    _, bob = make_user()
+    assert send(sender, bob['wallet_id'], 1800).status_code == 200
+    
+    with cashine.app.app_context():
+        db.session.get(DailySendTotal, (alice['id'], datetime.utcnow().date())).total = 1
+        db.session.commit()
+        
+        assert cashine.reconcile_daily_send_totals() >= 1
+        assert counter_today(alice['id']) == sent_today(alice['id']) == 1800
+        assert cashine.reconcile_daily_send_totals() == 0
@@ -0,0 +1,43 @@
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+import app as cashine
+from conftest import send
+
+def test_csv_statement_runs_to_the_current_balance(make_user):
+    client, alice = make_user()
+    _, bob = make_user()
+    for amount in (1000, 2500):
+        assert send(client, bob['wallet_id'], amount).status_code == 200
+    
+    response = client.get('/api/transactions/export?format=csv')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    
+    assert response.status_code == 200
+    assert rows[0] == cashine.STATEMENT_COLUMNS
+    assert [row[3] for row in rows[1:]] == ['-10.00', '-25.00']
+    balance = client.get('/api/current-user').get_json()['user']['balance']
+    assert rows[-1][5] == cashine.format_pesos(balance)
+
+def test_ndjson_statement_has_integer_balances(make_user):
+    client, _ = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 1200).status_code == 200
+    
+    lines = client.get('/api/transactions/export?format=ndjson').get_data(as_text=True).splitlines()
+    entries = [json.loads(line) for line in lines]
+    
+    assert len(entries) == 1
+    assert isinstance(entries[0]['balance'], int)
+    assert entries[0]['balance'] == cashine.SIGNUP_BONUS - 1200 + entries[0]['fee']  # fees are stored negative
+
+def test_opening_balance_is_bigint_on_postgres():
+    # SUM(bigint) is NUMERIC on Postgres and psycopg2 returns it as Decimal,
+    # which format_pesos() and json.dumps() both reject mid-stream
+    sql = str(cashine.statement_snapshot_query(1, datetime.min).compile(dialect=postgresql.dialect()))
+    assert re.search(r'CAST\(coalesce\(sum\(.*\) AS BIGINT\) AS delta', sql)
@@ -0,0 +1,60 @@
+import pytest
+
+import app as cashine
+from app import FeeRule, db
+
+RULE_FIELDS = ('channel', 'min_amount', 'rate_bp', 'flat', 'min_fee', 'max_fee',
+               'priority', 'starts_at', 'ends_at', 'note')
+
+@pytest.fixture(autouse=True)
+def restore_fee_rules():
+    with cashine.app.app_context():
+        saved = [{field: getattr(rule, field) for field in RULE_FIELDS} for rule in FeeRule.query]
+    yield
+    with cashine.app.app_context():
+        FeeRule.query.delete()
+        db.session.execute(db.insert(FeeRule), saved)
+        cashine.bump_fee_schedule_version()
+        db.session.commit()
+    cashine.fee_schedule.invalidate()
+
+def rule_id(channel, min_amount=0):
+    with cashine.app.app_context():
+        return FeeRule.query.filter_by(channel=channel, min_amount=min_amount).one().id
+
+def quote(amount, channel):
+    with cashine.app.app_context():
+        return cashine.calculate_fee(amount, channel)
+
+def test_tiers_and_the_default_tier(make_user):
+    runner = cashine.app.test_cli_runner()
+    result = runner.invoke(args=['add-fee-rule', '--channel', 'send', '--min-amount', '1000000', '--flat', '100'])
+    assert result.exit_code == 0, result.output
+    cashine.fee_schedule.invalidate()
+    
+    assert quote(2000, 'send') == 500
+    assert quote(1000000, 'send') == 100
+
+def test_cli_refuses_to_remove_the_tier_from_zero():
+    result = cashine.app.test_cli_runner().invoke(args=['delete-fee-rule', str(rule_id('cashout'))])
+    
+    assert result.exit_code != 0
+    assert 'cashout' in result.output
+    assert rule_id('cashout')
+
+def test_uncovered_amounts_fall_back_to_the_default_fee(make_user):
+    with cashine.app.app_context():
+        FeeRule.query.filter_by(channel='send', min_amount=0).delete()
+        db.session.add(FeeRule(channel='send', min_amount=1000000, flat=100))
+        cashine.bump_fee_schedule_version()
+        db.session.commit()
+    cashine.fee_schedule.invalidate()
+    
+    assert quote(2000, 'send') == 500
+    assert quote(2000000, 'send') == 100
+    
+    client, _ = make_user()
+    _, bob = make_user()
+    response = client.post('/api/send-money', json={'to': bob['wallet_id'], 'amount': 2000, 'pin': '1234'})
+    assert response.status_code == 200
+    assert response.get_json()['fee'] == 500
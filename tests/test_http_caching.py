@@ -0,0 +1,118 @@
+"""Conditional GETs, response compression and fingerprinted static assets."""
+import gzip
+import json
+
+import pytest
+
+import app as cashine
+from conftest import send
+
+requires_brotli = pytest.mark.skipif(cashine.brotli is None, reason='Brotli is not installed')
+
+def asset_url(filename):
+    with cashine.app.test_request_context():
+        return cashine.asset_url(filename)
+
+def decode(response):
+    body = response.get_data()
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = cashine.brotli.decompress(body)
+    return body
+
+def test_transactions_304_until_the_balance_moves(make_user):
+    client, _ = make_user()
+    _, bob = make_user()
+    first = client.get('/api/transactions')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert 'no-cache' in first.headers['Cache-Control'] and 'private' in first.headers['Cache-Control']
+    
+    unchanged = client.get('/api/transactions', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.get_data() == b''
+    assert unchanged.headers['ETag'] == etag
+    
+    assert send(client, bob['wallet_id'], 1000).status_code == 200
+    changed = client.get('/api/transactions', headers={'If-None-Match': etag})
+    
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['transactions'][0]['amount'] == -1000
+
+@pytest.mark.parametrize('encoding', ['gzip', pytest.param('br', marks=requires_brotli)])
+def test_compressed_bodies_decode_to_the_same_json(make_user, monkeypatch, encoding):
+    monkeypatch.setitem(cashine.app.config, 'COMPRESS_MIN_BYTES', 1)
+    client, _ = make_user()
+    plain = client.get('/api/transactions', headers={'Accept-Encoding': 'identity'})
+    
+    response = client.get('/api/transactions', headers={'Accept-Encoding': encoding})
+    
+    assert 'Content-Encoding' not in plain.headers
+    assert response.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(decode(response)) == plain.get_json()
+    # Compressed bytes differ from the identity ones, so the validator must be weak
+    assert response.headers['ETag'].startswith('W/')
+
+def test_gzip_when_brotli_is_not_accepted(make_user, monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'COMPRESS_MIN_BYTES', 1)
+    client, _ = make_user()
+    
+    response = client.get('/api/transactions', headers={'Accept-Encoding': 'gzip, deflate'})
+    
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+def test_small_bodies_are_sent_as_is(make_user):
+    client, _ = make_user()
+    
+    response = client.get('/api/current-user', headers={'Accept-Encoding': 'gzip, br'})
+    
+    assert len(response.get_data()) < cashine.app.config['COMPRESS_MIN_BYTES']
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_exports_are_streamed_uncompressed(make_user, monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'COMPRESS_MIN_BYTES', 1)
+    client, _ = make_user()
+    
+    response = client.get('/api/transactions/export?format=csv', headers={'Accept-Encoding': 'gzip, br'})
+    
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+@pytest.mark.parametrize('filename', ['js/app.js', 'css/app.css'])
+def test_fingerprinted_assets_are_immutable(filename):
+    client = cashine.app.test_client()
+    
+    response = client.get(asset_url(filename), headers={'Accept-Encoding': 'gzip'})
+    
+    cache_control = response.cache_control
+    assert response.status_code == 200
+    assert cache_control.public and cache_control.immutable
+    assert cache_control.max_age == cashine.STATIC_MAX_AGE
+    assert response.headers['Content-Encoding'] == 'gzip'
+    with open(f'{cashine.app.static_folder}/{filename}', 'rb') as f:
+        assert gzip.decompress(response.get_data()) == f.read()
+
+@pytest.mark.parametrize('query', ['', '?v=0123456789ab'])
+def test_unversioned_or_stale_asset_urls_are_revalidated(query):
+    response = cashine.app.test_client().get(f'/static/js/app.js{query}')
+    
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    assert response.cache_control.max_age != cashine.STATIC_MAX_AGE
+
+def test_shell_page_304_and_links_current_assets():
+    client = cashine.app.test_client()
+    first = client.get('/')
+    body = first.get_data(as_text=True)
+    assert first.cache_control.no_cache
+    assert asset_url('js/app.js') in body and asset_url('css/app.css') in body
+    
+    response = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    
+    assert response.status_code == 304
+    assert response.get_data() == b''
@@ -0,0 +1,51 @@
+import app as cashine
+from app import IdempotencyKey, Transaction, db
+from conftest import send
+
+def sent_rows(user_id):
+    with cashine.app.app_context():
+        return Transaction.query.filter_by(user_id=user_id, type='Sent').count()
+
+def test_retry_replays_the_stored_response(make_user):
+    client, alice = make_user()
+    _, bob = make_user()
+    
+    first = send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k1'})
+    retry = send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k1'})
+    
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert sent_rows(alice['id']) == 1
+
+def test_key_reused_for_a_different_request_is_rejected(make_user):
+    client, _ = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k2'}).status_code == 200
+    assert send(client, bob['wallet_id'], 3000, **{'Idempotency-Key': 'k2'}).status_code == 422
+
+def test_failed_request_frees_the_key(make_user):
+    client, alice = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 2000, pin='0000', **{'Idempotency-Key': 'k3'}).status_code == 401
+    assert send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k3'}).status_code == 200
+    assert sent_rows(alice['id']) == 1
+
+def test_response_is_committed_with_the_transfer(make_user, monkeypatch):
+    client, alice = make_user()
+    _, bob = make_user()
+    
+    # Fail after the commit, as a worker dying before it can answer would
+    def crash(*user_ids):
+        raise RuntimeError('worker died')
+    with monkeypatch.context() as patch:
+        patch.setattr(cashine.user_cache, 'invalidate', crash)
+        assert send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k4'}).status_code == 500
+    
+    with cashine.app.app_context():
+        assert db.session.get(IdempotencyKey, (alice['id'], 'k4')).response['success'] is True
+    
+    retry = send(client, bob['wallet_id'], 2000, **{'Idempotency-Key': 'k4'})
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert sent_rows(alice['id']) == 1
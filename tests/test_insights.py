@@ -0,0 +1,45 @@
+import re
+from datetime import date
+
+from sqlalchemy.dialects import postgresql
+
+import app as cashine
+from app import Transaction, db
+from conftest import send
+
+class DecliningProvider:
+    def settle(self, job):
+        raise cashine.SettlementDeclined('Declined')
+
+def refresh_all():
+    with cashine.app.app_context():
+        while cashine.refresh_rollups():
+            pass
+
+def test_refunded_fee_nets_out_of_fees_paid(make_user, monkeypatch):
+    monkeypatch.setattr(cashine, 'LEDGER_SETTLE_SECONDS', 0)
+    client, alice = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 5000).status_code == 200
+    response = client.post('/api/bank-transfer', json={
+        'bank': 'BPI', 'account': f"INS-{alice['id']}", 'account_name': 'Alice', 'amount': 10000, 'pin': '1234'
+    })
+    assert response.status_code == 200, response.get_json()
+    with cashine.app.app_context():
+        while cashine.process_settlement_batch(DecliningProvider(), batch_size=50):
+            pass
+        fees = db.session.scalars(db.select(Transaction.fee).where(Transaction.user_id == alice['id'])).all()
+    refresh_all()
+    
+    month = client.get('/api/insights').get_json()['months'][0]
+    
+    assert 'Reversal' in month['types']
+    assert month['fees'] == -sum(fees)  # debits are negative, the refund positive
+    assert month['fees'] < sum(abs(fee) for fee in fees)
+
+def test_insight_sums_are_bigint_on_postgres():
+    # SUM(bigint) is NUMERIC on Postgres; psycopg2 returns Decimal, which
+    # jsonify() writes out as a string
+    for query in (cashine.top_recipients_query(1, date.min), cashine.platform_totals_query(date.min)):
+        sql = str(query.compile(dialect=postgresql.dialect()))
+        assert 'sum(' in sql and not re.search(r'(?<!CAST\()sum\(', sql)
@@ -0,0 +1,48 @@
+import pytest
+
+import app as cashine
+from app import Posting, User, db
+from conftest import send
+
+@pytest.fixture(autouse=True)
+def settle_immediately(monkeypatch):
+    # Let reconciliation fold postings made a moment ago
+    monkeypatch.setattr(cashine, 'LEDGER_SETTLE_SECONDS', 0)
+
+def mismatched_users(user_ids):
+    with cashine.app.app_context():
+        _, mismatches = cashine.reconcile_ledger(full=True)
+    return {user_id for user_id, _, _ in mismatches} & set(user_ids)
+
+def test_every_journal_balances_and_wallets_match(make_user):
+    client, alice = make_user()
+    _, bob = make_user()
+    _, carol = make_user()
+    assert send(client, bob['wallet_id'], 1500).status_code == 200
+    assert client.post('/api/send-money/bulk', json={'pin': '1234', 'recipients': [
+        {'to': bob['wallet_id'], 'amount': 1000}, {'to': carol['wallet_id'], 'amount': 1000},
+    ]}).status_code == 200
+    assert client.post('/api/cash-out', json={'amount': 5000, 'method': 'gcash', 'pin': '1234'}).status_code == 200
+    with cashine.app.app_context():
+        cashine.process_settlement_batch(cashine.StubSettlementProvider(), batch_size=50)
+        
+        unbalanced = db.session.query(Posting.journal_id).group_by(Posting.journal_id).having(
+            db.func.sum(Posting.amount) != 0
+        ).all()
+        assert unbalanced == []
+        
+        for user_id in (alice['id'], bob['id'], carol['id']):
+            wallet = db.session.query(db.func.sum(Posting.amount)).filter(
+                Posting.account == cashine.wallet_account(user_id)
+            ).scalar()
+            assert wallet == db.session.get(User, user_id).balance
+    
+    assert mismatched_users([alice['id'], bob['id'], carol['id']]) == set()
+
+def test_reconcile_flags_a_balance_written_outside_the_ledger(make_user):
+    _, alice = make_user()
+    with cashine.app.app_context():
+        db.session.execute(db.update(User).where(User.id == alice['id']).values(balance=User.balance + 1))
+        db.session.commit()
+    
+    assert mismatched_users([alice['id']]) == {alice['id']}
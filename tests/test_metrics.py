@@ -0,0 +1,20 @@
+import pytest
+
+import app as cashine
+
+def test_metrics_are_disabled_without_a_token(monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'METRICS_TOKEN', None)
+    assert cashine.app.test_client().get('/metrics').status_code == 401
+
+@pytest.mark.parametrize('authorization', [None, 'Bearer wrong', 'metrics-secret'])
+def test_metrics_reject_a_bad_token(monkeypatch, authorization):
+    monkeypatch.setitem(cashine.app.config, 'METRICS_TOKEN', 'metrics-secret')
+    headers = {'Authorization': authorization} if authorization else {}
+    assert cashine.app.test_client().get('/metrics', headers=headers).status_code == 401
+
+def test_metrics_served_with_the_token(monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'METRICS_TOKEN', 'metrics-secret')
+    response = cashine.app.test_client().get('/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    
+    assert response.status_code == 200
+    assert b'cashine_user_cache_lookups_total' in response.data
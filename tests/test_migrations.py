@@ -0,0 +1,36 @@
+import time
+
+from sqlalchemy import event
+
+import app as cashine
+from app import SchemaMigration, Transaction, User, db
+
+def test_boot_on_a_current_schema_is_one_select_and_keeps_data(make_user):
+    _, alice = make_user()
+    rows = 5000
+    with cashine.app.app_context():
+        db.session.execute(db.insert(Transaction), [
+            {'user_id': alice['id'], 'type': 'Received', 'amount': 100, 'fee': 0, 'note': 'seed'}
+        ] * rows)
+        db.session.commit()
+        before = (User.query.count(), Transaction.query.count())
+        
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            started = time.perf_counter()
+            applied = cashine.run_migrations()
+            elapsed = time.perf_counter() - started
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        
+        assert applied == []
+        assert len(statements) == 1 and statements[0].lstrip().upper().startswith('SELECT')
+        assert elapsed < 0.5
+        assert (User.query.count(), Transaction.query.count()) == before
+
+def test_every_migration_is_recorded_once():
+    with cashine.app.app_context():
+        versions = [v for v, in db.session.query(SchemaMigration.version).order_by(SchemaMigration.version)]
+    assert versions == [version for version, _, _ in cashine.MIGRATIONS]
@@ -0,0 +1,84 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as cashine
+from app import PinHasher, User, db
+from conftest import send
+
+def stored_hash(user_id):
+    with cashine.app.app_context():
+        return db.session.get(User, user_id).pin_hash
+
+def set_hash(user_id, pin_hash):
+    with cashine.app.app_context():
+        db.session.get(User, user_id).pin_hash = pin_hash
+        db.session.commit()
+
+@pytest.fixture
+def kdf_calls(monkeypatch):
+    """Count PIN verifications that run the KDF"""
+    calls = []
+    verify = cashine.pin_hasher.verify
+    monkeypatch.setattr(cashine.pin_hasher, 'verify', lambda *args: calls.append(args) or verify(*args))
+    return calls
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2:sha256', 'pbkdf2:sha256:1000'])
+def test_fresh_hash_does_not_need_rehash(method):
+    # Werkzeug stores aliases expanded, e.g. scrypt as scrypt:32768:8:1
+    hasher = PinHasher(method)
+    pin_hash = hasher.hash('1234')
+    
+    assert not hasher.needs_rehash(pin_hash)
+    assert not PinHasher(method).needs_rehash(pin_hash)
+    assert hasher.verify(pin_hash, '1234') and not hasher.verify(pin_hash, '4321')
+
+def test_other_parameters_and_legacy_hashes_need_rehash():
+    hasher = PinHasher('pbkdf2:sha256:2000')
+    
+    assert hasher.needs_rehash(PinHasher('pbkdf2:sha256:1000').hash('1234'))
+    assert hasher.needs_rehash(generate_password_hash('1234', method='pbkdf2:sha256:2000'))
+
+def test_login_upgrades_a_legacy_hash_once(make_user):
+    client, alice = make_user()
+    set_hash(alice['id'], generate_password_hash('1234', method='pbkdf2:sha256:500'))
+    
+    assert client.post('/api/login', json={'identifier': alice['email'], 'pin': '1234'}).status_code == 200
+    upgraded = stored_hash(alice['id'])
+    assert upgraded.startswith(f"v1${cashine.app.config['PIN_HASH_METHOD']}$")
+    
+    assert client.post('/api/login', json={'identifier': alice['email'], 'pin': '1234'}).status_code == 200
+    assert stored_hash(alice['id']) == upgraded
+
+def test_step_up_token_skips_the_kdf(make_user, kdf_calls):
+    client, _ = make_user()
+    _, bob = make_user()
+    kdf_calls.clear()  # the logins
+    
+    for _ in range(3):
+        assert send(client, bob['wallet_id'], 1000).status_code == 200
+    assert kdf_calls == []
+    
+    # The token only vouches for the PIN it was granted for
+    assert send(client, bob['wallet_id'], 1000, pin='9999').status_code == 401
+    assert len(kdf_calls) == 1
+
+def test_expired_step_up_token_runs_the_kdf_again(make_user, kdf_calls, monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'PIN_STEP_UP_SECONDS', -1)
+    client, _ = make_user()
+    _, bob = make_user()
+    kdf_calls.clear()
+    
+    assert send(client, bob['wallet_id'], 1000).status_code == 200
+    assert send(client, bob['wallet_id'], 1000).status_code == 200
+    assert len(kdf_calls) == 2
+
+def test_pin_change_invalidates_the_old_pin(make_user):
+    client, _ = make_user()
+    _, bob = make_user()
+    assert send(client, bob['wallet_id'], 1000).status_code == 200
+    
+    response = client.post('/api/update-pin', json={'old_pin': '1234', 'new_pin': '5678'})
+    assert response.status_code == 200, response.get_json()
+    
+    assert send(client, bob['wallet_id'], 1000).status_code == 401
+    assert send(client, bob['wallet_id'], 1000, pin='5678').status_code == 200
@@ -0,0 +1,69 @@
+import app as cashine
+from app import User, db
+
+def login(client, user, pin):
+    return client.post('/api/login', json={'identifier': user['email'], 'pin': pin})
+
+class SharedMemoryStore(cashine.MemoryRateLimitStore):
+    """Stands in for Redis: one store every 'worker' talks to"""
+    shared = True
+
+def test_lockout_survives_a_worker_recycle_without_a_shared_store(make_user, monkeypatch):
+    client, alice = make_user()
+    statuses = [login(client, alice, '0000').status_code for _ in range(cashine.MAX_FAILED_LOGINS)]
+    assert statuses == [401] * (cashine.MAX_FAILED_LOGINS - 1) + [423]
+    
+    # A recycled worker (or another one) starts with an empty memory store
+    monkeypatch.setattr(cashine, 'rate_limit_store', cashine.MemoryRateLimitStore())
+    
+    assert login(client, alice, '1234').status_code == 423
+    with cashine.app.app_context():
+        assert db.session.get(User, alice['id']).locked_until is not None
+
+def test_failures_are_counted_across_workers(make_user, monkeypatch):
+    client, alice = make_user()
+    for _ in range(cashine.MAX_FAILED_LOGINS - 1):
+        assert login(client, alice, '0000').status_code == 401
+        monkeypatch.setattr(cashine, 'rate_limit_store', cashine.MemoryRateLimitStore())
+    
+    assert login(client, alice, '0000').status_code == 423
+
+def test_successful_login_resets_the_count(make_user):
+    client, alice = make_user()
+    for _ in range(cashine.MAX_FAILED_LOGINS - 1):
+        login(client, alice, '0000')
+    assert login(client, alice, '1234').status_code == 200
+    
+    response = login(client, alice, '0000')
+    assert response.status_code == 401
+    assert f'{cashine.MAX_FAILED_LOGINS - 1} attempts remaining' in response.get_json()['error']
+
+def test_shared_store_keeps_failures_off_the_users_row(make_user, monkeypatch):
+    monkeypatch.setattr(cashine, 'rate_limit_store', SharedMemoryStore())
+    client, alice = make_user()
+    for _ in range(cashine.MAX_FAILED_LOGINS):
+        login(client, alice, '0000')
+    
+    assert login(client, alice, '1234').status_code == 423
+    with cashine.app.app_context():
+        user = db.session.get(User, alice['id'])
+        assert user.failed_login_attempts == 0 and user.locked_until is None
+
+def test_throttled_requests_get_retry_after(make_user, monkeypatch):
+    monkeypatch.setitem(cashine.app.config, 'RATE_LIMIT_ENABLED', True)
+    client = cashine.app.test_client()
+    capacity, _ = cashine.RATE_LIMITS['quote']['ip']
+    statuses = [client.post('/api/calculate-fee', json={'amount': 1000}).status_code for _ in range(capacity + 1)]
+    
+    assert statuses[-1] == 429 and set(statuses[:-1]) == {200}
+
+def test_memory_store_forgets_refilled_buckets():
+    store = cashine.MemoryRateLimitStore()
+    for n in range(store.SWEEP_EVERY - 1):
+        store.take(f'ip:{n}', 10, 1, now=0)
+    store.incr('login-failures:1', ttl=-1)  # already expired
+    
+    store.take('ip:late', 10, 1, now=100)  # triggers the sweep; everything else refilled by now
+    
+    assert list(store._buckets) == ['ip:late']
+    assert store._counters == {}
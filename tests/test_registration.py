@@ -0,0 +1,53 @@
+"""Wallet ID allocation and the concurrent signup load test.
+
+SQLite allocates serials from max(id) and has a single writer, so parallel
+signups are only meaningful on Postgres: set TEST_POSTGRES_URL to a
+scratch database to run them."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app as cashine
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks', 'registration.py')
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+def run_signups(database_url, threads, users):
+    env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+    if database_url:
+        env['DATABASE_URL'] = database_url
+    result = subprocess.run(
+        [sys.executable, BENCHMARK, '--threads', str(threads), '--users', str(users)],
+        env=env, capture_output=True, text=True, timeout=600
+    )
+    return result.returncode, result.stdout + result.stderr
+
+@pytest.mark.parametrize('digits, check', [('7992739871', '3'), ('0', '0'), ('18', '2'), ('2507010001', '8')])
+def test_luhn_check_digit(digits, check):
+    assert cashine.luhn_check_digit(digits) == check
+
+def test_luhn_catches_a_single_digit_typo():
+    digits = '25070100042'
+    typo = digits[:5] + str((int(digits[5]) + 1) % 10) + digits[6:]
+    assert cashine.luhn_check_digit(typo) != cashine.luhn_check_digit(digits)
+
+def test_registered_wallet_ids_are_distinct_and_check(make_user):
+    wallet_ids = [make_user()[1]['wallet_id'] for _ in range(3)]
+    
+    assert len(set(wallet_ids)) == 3
+    for wallet_id in wallet_ids:
+        assert wallet_id.startswith('CASH')
+        assert cashine.luhn_check_digit(wallet_id[4:-1]) == wallet_id[-1]
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='set TEST_POSTGRES_URL to a scratch Postgres database')
+def test_parallel_signups_get_unique_wallet_ids_on_postgres():
+    returncode, output = run_signups(POSTGRES_URL, threads=32, users=50)
+    assert returncode == 0, output
+    assert 'duplicate wallet IDs: 0, bad check digits: 0, failed signups: 0' in output
+
+def test_signup_load_test_runs_on_sqlite():
+    returncode, output = run_signups(None, threads=1, users=20)
+    assert returncode == 0, output
+    assert 'duplicate wallet IDs: 0' in output
@@ -0,0 +1,90 @@
+"""Read routing against a stale replica: a copy of the SQLite test database
+taken before a transfer, registered as the 'replica' bind."""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+import app as cashine
+from app import db
+from conftest import send
+
+@pytest.fixture
+def stale_replica(monkeypatch, tmp_path):
+    """Call to snapshot the primary and route @replica_reads views to the snapshot"""
+    engines = []
+    
+    def snapshot():
+        with cashine.app.app_context():
+            primary = sqlite3.connect(db.engine.url.database)
+            monkeypatch.setitem(db.engines, 'replica', create_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+            engines.append(db.engines['replica'])
+        replica = sqlite3.connect(tmp_path / 'replica.db')
+        primary.backup(replica)
+        primary.close()
+        replica.close()
+        return engines[-1]
+    
+    yield snapshot
+    for engine in engines:
+        engine.dispose()
+
+def unpin(client):
+    """Let the pin from registering and logging in run out"""
+    with client.session_transaction() as session:
+        session.pop('primary_until', None)
+
+def history_types(client):
+    response = client.get('/api/transactions')
+    assert response.status_code == 200
+    return [t['type'] for t in response.get_json()['transactions']]
+
+def test_reads_go_to_the_replica_until_the_user_writes(make_user, stale_replica):
+    alice_client, _ = make_user()
+    bob_client, bob = make_user()
+    unpin(bob_client)
+    stale_replica()
+    
+    assert send(alice_client, bob['wallet_id'], 1500).status_code == 200
+    
+    # Bob has not written, so he reads the snapshot taken before the transfer
+    assert 'Received' not in history_types(bob_client)
+    # Alice wrote, so her reads are pinned to the primary and see it
+    assert history_types(alice_client)[0] == 'Sent'
+
+def test_pin_expires_back_to_the_replica(make_user, stale_replica):
+    alice_client, _ = make_user()
+    _, bob = make_user()
+    unpin(alice_client)
+    stale_replica()
+    assert send(alice_client, bob['wallet_id'], 1500).status_code == 200
+    
+    with alice_client.session_transaction() as session:
+        assert session['primary_until'] > cashine.time.time()
+        session['primary_until'] = 0
+    
+    assert 'Sent' not in history_types(alice_client)
+
+def test_failed_writes_do_not_pin(make_user, stale_replica):
+    alice_client, _ = make_user()
+    _, bob = make_user()
+    unpin(alice_client)
+    stale_replica()
+    
+    assert send(alice_client, bob['wallet_id'], 1500, pin='0000').status_code == 401
+    
+    with alice_client.session_transaction() as session:
+        assert 'primary_until' not in session
+
+def test_writes_never_go_to_the_replica(make_user, stale_replica):
+    alice_client, _ = make_user()
+    _, bob = make_user()
+    replica = stale_replica()
+    
+    assert send(alice_client, bob['wallet_id'], 1500).status_code == 200
+    
+    balance = db.select(cashine.User.balance).where(cashine.User.id == bob['id'])
+    with cashine.app.app_context():
+        assert db.session.execute(balance).scalar() == cashine.SIGNUP_BONUS + 1500
+    with replica.connect() as conn:
+        assert conn.execute(balance).scalar() == cashine.SIGNUP_BONUS
@@ -0,0 +1,152 @@
+import pytest
+
+import app as cashine
+from app import SettlementJob, db
+
+NOW = 1_700_000_000.0
+
+@pytest.fixture
+def engine():
+    return cashine.RiskEngine(cashine.MemoryRiskStore())
+
+def test_quiet_user_is_allowed(engine):
+    assert engine.score(1, 'send', 1000, [2], now=NOW) == ('allow', 0, [])
+
+@pytest.mark.parametrize('earlier, expected', [(3, (0, [])), (4, (40, ['velocity'])), (9, (80, ['velocity']))])
+def test_transfers_per_minute(engine, earlier, expected):
+    for i in range(earlier):
+        engine.record(1, 1000, now=NOW - 50 + i)
+    
+    decision, score, reasons = engine.score(1, 'send', 1000, now=NOW)
+    
+    assert (score, reasons) == expected
+    assert decision == {0: 'allow', 40: 'allow', 80: 'deny'}[score]
+
+def test_velocity_forgets_transfers_older_than_a_minute(engine):
+    for i in range(9):
+        engine.record(1, 1000, now=NOW - 120 + i)
+    assert engine.score(1, 'send', 1000, now=NOW)[2] == []
+
+def test_hourly_outflow(engine):
+    engine.record(1, 1500000, now=NOW - 1800)
+    
+    assert engine.score(1, 'send', 499999, now=NOW)[1] == 0
+    assert engine.score(1, 'send', 500000, now=NOW) == ('allow', 30, ['hourly_outflow'])
+    assert engine.score(1, 'send', 500000, now=NOW + 1801)[1] == 0
+
+def test_new_recipients(engine):
+    engine.record(1, 1000, [(10, 1000), (11, 1000), (12, 1000)], now=NOW - 600)
+    
+    # Paying people already paid is not new; two more first-timers make five
+    assert engine.score(1, 'send', 1000, [10, 11], now=NOW)[2] == []
+    assert engine.score(1, 'send', 1000, [13], now=NOW)[2] == []
+    assert engine.score(1, 'send', 1000, [13, 14], now=NOW) == ('allow', 30, ['new_recipients'])
+
+def test_pass_through_payout_is_held_for_review(engine):
+    engine.record(2, 10000, [(1, 10000)], now=NOW - 60)
+    
+    assert engine.score(1, 'send', 10000, [3], now=NOW)[2] == []
+    assert engine.score(1, 'bank', 12500, now=NOW) == ('review', 50, ['pass_through'])
+    assert engine.score(1, 'cashout', 12501, now=NOW)[2] == []
+    assert engine.score(1, 'bank', 10000, now=NOW + 600)[2] == []
+
+def test_rules_add_up_to_deny(engine):
+    engine.record(2, 2000000, [(1, 2000000)], now=NOW - 60)
+    
+    assert engine.score(1, 'cashout', 2000000, now=NOW) == ('deny', 80, ['hourly_outflow', 'pass_through'])
+
+class CountingPipeline:
+    """Queues commands like a redis pipeline; every execute() is one round trip"""
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append(name)
+    
+    def execute(self):
+        self.client.round_trips += 1
+        self.client.commands += self.commands
+        return [None] * len(self.commands)
+
+class CountingRedis:
+    def __init__(self):
+        self.round_trips = 0
+        self.commands = []
+    
+    def pipeline(self):
+        return CountingPipeline(self)
+
+@pytest.mark.parametrize('credits', [1, 50, 500])
+def test_recording_a_bulk_send_costs_three_round_trips(credits):
+    client = CountingRedis()
+    store = cashine.RedisRiskStore.__new__(cashine.RedisRiskStore)
+    store._redis = client
+    
+    cashine.RiskEngine(store).record(1, 1000 * credits, [(recipient, 1000) for recipient in range(2, 2 + credits)], now=NOW)
+    
+    # known(), remember() and add_many(); the last carries the outflow plus a
+    # first-time mark and a credit per recipient, and remember() one more zadd
+    assert client.round_trips == 3
+    assert client.commands.count('zadd') == 1 + 2 * credits + 1
+
+def request_payout(client, kind, account):
+    if kind == 'bank':
+        return client.post('/api/bank-transfer', json={
+            'bank': 'BPI', 'account': account, 'account_name': 'Alice', 'amount': 10000, 'pin': '1234'
+        })
+    return client.post('/api/cash-out', json={'amount': 10000, 'method': account, 'pin': '1234'})
+
+def held_job(user_id):
+    with cashine.app.app_context():
+        job = SettlementJob.query.join(cashine.Transaction).filter(cashine.Transaction.user_id == user_id).one()
+        return job.id, job.status
+
+@pytest.fixture
+def review_everything(monkeypatch):
+    monkeypatch.setattr(cashine.risk_engine, 'review_score', 0)
+
+@pytest.mark.parametrize('kind', ['bank', 'cashout'])
+def test_review_holds_the_payout_until_approved(make_user, review_everything, kind):
+    client, alice = make_user()
+    
+    response = request_payout(client, kind, 'GCash' if kind == 'cashout' else 'acct-review')
+    assert response.get_json()['settlement_status'] == 'held'
+    job_id, status = held_job(alice['id'])
+    assert status == 'held'
+    
+    with cashine.app.app_context():
+        cashine.process_settlement_batch(cashine.StubSettlementProvider(), batch_size=50)
+    assert held_job(alice['id'])[1] == 'held'
+    
+    result = cashine.app.test_cli_runner().invoke(args=['approve-payout', str(job_id)])
+    assert result.exit_code == 0, result.output
+    with cashine.app.app_context():
+        cashine.process_settlement_batch(cashine.StubSettlementProvider(), batch_size=50)
+    assert held_job(alice['id'])[1] == 'settled'
+
+def test_rejected_payout_is_refunded(make_user, review_everything):
+    client, alice = make_user()
+    request_payout(client, 'bank', 'acct-held')
+    job_id, _ = held_job(alice['id'])
+    
+    result = cashine.app.test_cli_runner().invoke(args=['reject-payout', str(job_id), '--reason', 'Mule pattern'])
+    
+    assert result.exit_code == 0, result.output
+    assert held_job(alice['id'])[1] == 'reversed'
+    assert client.get('/api/current-user').get_json()['user']['balance'] == cashine.SIGNUP_BONUS
+    with cashine.app.app_context():
+        assert db.session.query(cashine.Transaction.note).filter_by(
+            user_id=alice['id'], type='Reversal'
+        ).scalar().endswith('(Mule pattern)')
+
+def test_only_held_payouts_can_be_decided(make_user):
+    client, alice = make_user()
+    request_payout(client, 'bank', 'acct-not-held')
+    job_id, status = held_job(alice['id'])
+    assert status == 'pending'
+    
+    result = cashine.app.test_cli_runner().invoke(args=['reject-payout', str(job_id)])
+    
+    assert result.exit_code != 0 and 'not held' in result.output
+    assert held_job(alice['id'])[1] == 'pending'
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import app as cashine
+from app import SettlementJob, Transaction, db
+
+class RecordingProvider:
+    """Settles every job and remembers (account, idempotency key) per call"""
+    def __init__(self, decline=()):
+        self.calls = []
+        self.decline = decline
+    
+    def keys_sent_for(self, account):
+        return [key for called_account, key in self.calls if called_account == account]
+    
+    def settle(self, job):
+        self.calls.append((job.transaction.bank_details['account'], job.idempotency_key))
+        if job.transaction.bank_details['account'] in self.decline:
+            raise cashine.SettlementDeclined('Declined')
+        return f'REF-{job.id}'
+
+def bank_transfer(client, account, amount=10000):
+    response = client.post('/api/bank-transfer', json={
+        'bank': 'BPI', 'account': account, 'account_name': 'Alice', 'amount': amount, 'pin': '1234'
+    })
+    assert response.status_code == 200, response.get_json()
+
+def find_job(account):
+    return SettlementJob.query.join(Transaction).filter(
+        Transaction.bank_details['account'].as_string() == account
+    ).one()
+
+def job_state(account):
+    with cashine.app.app_context():
+        job = find_job(account)
+        return job.status, job.attempts
+
+def make_due(account):
+    with cashine.app.app_context():
+        find_job(account).next_attempt_at = datetime.utcnow()
+        db.session.commit()
+
+def run_batch(provider):
+    with cashine.app.app_context():
+        return cashine.process_settlement_batch(provider, batch_size=50)
+
+def test_declined_payout_is_refunded(make_user):
+    client, _ = make_user()
+    bank_transfer(client, 'acct-refund')
+    
+    run_batch(RecordingProvider(decline={'acct-refund'}))
+    
+    assert job_state('acct-refund')[0] == 'reversed'
+    assert client.get('/api/current-user').get_json()['user']['balance'] == cashine.SIGNUP_BONUS
+
+def test_failure_on_a_later_job_keeps_earlier_payouts(make_user, monkeypatch):
+    client, _ = make_user()
+    bank_transfer(client, 'acct-paid')
+    bank_transfer(client, 'acct-broken')
+    provider = RecordingProvider(decline={'acct-broken'})
+    
+    with monkeypatch.context() as patch:
+        def broken_reversal(job, reason):
+            raise RuntimeError('reversal failed')
+        patch.setattr(cashine, 'reverse_settlement', broken_reversal)
+        patch.setitem(cashine.app.config, 'SETTLEMENT_BACKOFF_SECONDS', 60)
+        run_batch(provider)
+    
+    assert job_state('acct-paid') == ('settled', 1)
+    assert job_state('acct-broken') == ('pending', 1)
+    
+    make_due('acct-broken')
+    run_batch(provider)
+    
+    assert job_state('acct-broken')[0] == 'reversed'
+    # The settled payout was never handed to the provider again
+    assert len(provider.keys_sent_for('acct-paid')) == 1
+    assert len(provider.keys_sent_for('acct-broken')) == 2
+
+def test_lost_bookkeeping_retries_with_the_same_key(make_user, monkeypatch):
+    client, _ = make_user()
+    bank_transfer(client, 'acct-retry-key')
+    provider = RecordingProvider()
+    
+    with monkeypatch.context() as patch:
+        def fail(*args, **kwargs):
+            raise RuntimeError('database went away')
+        patch.setattr(cashine, 'post_journal', fail)
+        patch.setitem(cashine.app.config, 'SETTLEMENT_BACKOFF_SECONDS', 60)
+        run_batch(provider)
+    assert job_state('acct-retry-key') == ('pending', 1)
+    
+    make_due('acct-retry-key')
+    run_batch(provider)
+    
+    assert job_state('acct-retry-key') == ('settled', 2)
+    first, second = provider.keys_sent_for('acct-retry-key')
+    assert first == second
+
+def test_failed_bookkeeping_does_not_undo_another_workers_settlement(make_user, monkeypatch):
+    client, _ = make_user()
+    bank_transfer(client, 'acct-raced')
+    
+    with monkeypatch.context() as patch:
+        def settled_elsewhere_then_fail(provider, job):
+            # Another worker settles the job while this one is mid-call
+            with db.engine.begin() as conn:
+                conn.execute(db.update(SettlementJob).where(SettlementJob.id == job.id).values(status='settled'))
+            raise RuntimeError('connection reset')
+        patch.setattr(cashine, 'settle_job', settled_elsewhere_then_fail)
+        patch.setitem(cashine.app.config, 'SETTLEMENT_MAX_ATTEMPTS', 1)
+        run_batch(RecordingProvider())
+    
+    assert job_state('acct-raced') == ('settled', 0)
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import app as cashine
+from app import Transaction, db
+from conftest import send
+
+def test_keyset_pages_cover_history_once_in_order(make_user):
+    sender, _ = make_user()
+    _, bob = make_user()
+    amounts = [1000 + i for i in range(7)]
+    for amount in amounts:
+        assert send(sender, bob['wallet_id'], amount).status_code == 200
+    
+    seen, cursor = [], None
+    while True:
+        page = sender.get('/api/transactions', query_string={'limit': 3, **({'before': cursor} if cursor else {})})
+        assert page.status_code == 200
+        body = page.get_json()
+        seen += body['transactions']
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    
+    assert [t['amount'] for t in seen] == [-a for a in reversed(amounts)]
+    assert len({t['id'] for t in seen}) == len(amounts)
+
+def test_rows_sharing_a_timestamp_are_not_skipped(make_user):
+    sender, alice = make_user()
+    _, bob = make_user()
+    for amount in (1000, 1001, 1002, 1003):
+        assert send(sender, bob['wallet_id'], amount).status_code == 200
+    with cashine.app.app_context():
+        same_instant = datetime.utcnow() - timedelta(minutes=1)
+        Transaction.query.filter_by(user_id=alice['id']).update({'created_at': same_instant})
+        db.session.commit()
+    
+    first = sender.get('/api/transactions?limit=2').get_json()
+    second = sender.get('/api/transactions', query_string={'limit': 2, 'before': first['next_cursor']}).get_json()
+    
+    assert [t['amount'] for t in first['transactions'] + second['transactions']] == [-1003, -1002, -1001, -1000]
+    assert second['next_cursor'] is None
+
+def test_malformed_cursor_is_rejected(make_user):
+    client, _ = make_user()
+    assert client.get('/api/transactions?before=not-a-cursor').status_code == 400
+
+def test_history_query_uses_the_composite_index(make_user):
+    _, alice = make_user()
+    with cashine.app.app_context():
+        query = Transaction.query.filter(
+            Transaction.user_id == alice['id'],
+            db.tuple_(Transaction.created_at, Transaction.id) < (datetime.utcnow(), 10 ** 9),
+            Transaction.created_at <= datetime.utcnow()
+        ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(51)
+        statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {statement}')))
+    
+    assert 'ix_transactions_user_created' in plan
+    assert 'TEMP B-TREE' not in plan  # no sort step: the index already gives the order
@@ -0,0 +1,35 @@
+"""Concurrent senders must never create or destroy money.
+
+SQLite ignores FOR UPDATE and has a single writer, so the row locking in
+execute_transfers is only really exercised on Postgres: set
+TEST_POSTGRES_URL to a scratch database to run the full-size check."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks', 'transfer_concurrency.py')
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+def run_stress(database_url, senders, transfers):
+    env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+    if database_url:
+        env['DATABASE_URL'] = database_url
+    result = subprocess.run(
+        [sys.executable, BENCHMARK, '--senders', str(senders), '--transfers', str(transfers)],
+        env=env, capture_output=True, text=True, timeout=600
+    )
+    return result.returncode, result.stdout + result.stderr
+
+@pytest.mark.skipif(not POSTGRES_URL, reason='set TEST_POSTGRES_URL to a scratch Postgres database')
+def test_fifty_parallel_senders_conserve_money_on_postgres():
+    returncode, output = run_stress(POSTGRES_URL, senders=60, transfers=20)
+    assert returncode == 0, output
+    assert 'balance drift: 0 centavos, negative balances: 0, ledger mismatches: 0' in output
+
+def test_stress_harness_runs_on_sqlite():
+    # A fresh SQLite file: few enough writers to stay inside its busy timeout
+    returncode, output = run_stress(None, senders=4, transfers=5)
+    assert returncode == 0, output
+    assert 'balance drift: 0 centavos' in output
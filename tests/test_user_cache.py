@@ -0,0 +1,87 @@
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+import app as cashine
+from app import User, db
+from conftest import send
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    with cashine.app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def test_hit_runs_no_query(make_user):
+    client, alice = make_user()
+    client.get('/api/current-user')
+    saved = cashine.user_cache.stats()['queries_saved']
+    
+    with count_queries() as statements:
+        profile = client.get('/api/current-user').get_json()['user']
+    
+    assert statements == []
+    assert profile['balance'] == cashine.SIGNUP_BONUS and profile['wallet_id'] == alice['wallet_id']
+    assert cashine.user_cache.stats()['queries_saved'] == saved + 1
+
+def test_transfer_by_another_client_invalidates(make_user):
+    alice_client, alice = make_user()
+    bob_client, bob = make_user()
+    first = alice_client.get('/api/current-user')
+    
+    assert send(bob_client, alice['wallet_id'], 2500).status_code == 200
+    second = alice_client.get('/api/current-user')
+    
+    assert second.get_json()['user']['balance'] == cashine.SIGNUP_BONUS + 2500
+    assert second.headers['ETag'] != first.headers['ETag']
+
+def test_write_from_another_process_is_seen_once_its_event_arrives(make_user):
+    client, alice = make_user()
+    etag = client.get('/api/current-user').headers['ETag']
+    with cashine.app.app_context():
+        db.session.execute(
+            db.update(User).where(User.id == alice['id'])
+            .values(balance=User.balance - 1000, balance_version=User.balance_version + 1)
+        )
+        db.session.commit()
+    
+    # What the LISTEN thread does with a notify from the settlement process
+    cashine.deliver_wallet_event({'user_id': alice['id'], 'balance': cashine.SIGNUP_BONUS - 1000, 'transactions': []})
+    response = client.get('/api/current-user', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 200
+    assert response.get_json()['user']['balance'] == cashine.SIGNUP_BONUS - 1000
+
+def test_transactions_304_on_a_hit_costs_no_query(make_user):
+    client, _ = make_user()
+    etag = client.get('/api/transactions').headers['ETag']
+    
+    with count_queries() as statements:
+        response = client.get('/api/transactions', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 304
+    assert statements == []
+
+def test_nothing_is_cached_until_events_are_live(make_user, monkeypatch):
+    client, _ = make_user()
+    monkeypatch.setattr(cashine, 'wallet_events_live', lambda: False)
+    client.get('/api/current-user')
+    
+    with count_queries() as statements:
+        assert client.get('/api/current-user').status_code == 200
+    
+    assert len(statements) == 1
+
+@pytest.mark.parametrize('key', ['hits', 'misses', 'invalidations', 'hit_rate', 'queries_saved'])
+def test_health_reports_cache_stats(key):
+    assert key in cashine.app.test_client().get('/health').get_json()['user_cache']
@@ -0,0 +1,64 @@
+import itertools
+
+import pytest
+
+import app as cashine
+
+_numbers = itertools.count(1)
+
+def register(name):
+    """Register a user with a chosen display name; returns their wallet ID"""
+    n = next(_numbers)
+    response = cashine.app.test_client().post('/api/register', json={
+        'name': name, 'email': f'search{n}@example.com', 'phone': f'0918{n:07d}', 'pin': '1234'
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['user']
+
+def search(client, query):
+    response = client.post('/api/users/search', json={'query': query})
+    assert response.status_code == 200, response.get_json()
+    return [user['name'] for user in response.get_json()['users']]
+
+@pytest.fixture
+def searcher(make_user):
+    client, _ = make_user()
+    return client
+
+def test_similarity_matches_pg_trgm():
+    # Values from the pg_trgm documentation
+    assert cashine.trigrams('cat') == {'  c', ' ca', 'cat', 'at '}
+    assert cashine.trigram_similarity('word', 'two words') == pytest.approx(0.363636, abs=1e-6)
+
+def test_wallet_id_and_phone_prefixes(searcher):
+    target = register('Prefix Target')
+    
+    assert search(searcher, target['wallet_id']) == ['Prefix Target']
+    assert search(searcher, target['wallet_id'].lower()) == ['Prefix Target']
+    assert search(searcher, target['phone']) == ['Prefix Target']
+
+def test_wildcards_in_the_query_are_literal(searcher):
+    register('Promo 50%off Kyv')
+    register('Promo 50xoff Kyv')
+    register('Under_score Kyv')
+    register('Underxscore Kyv')
+    
+    assert search(searcher, '50%off') == ['Promo 50%off Kyv']
+    assert search(searcher, 'r_sc') == ['Under_score Kyv']
+
+def test_short_queries_only_match_name_prefixes(searcher):
+    register('Qj Alpha')
+    register('Alpha Qj')
+    
+    assert search(searcher, 'Qj') == ['Qj Alpha']
+    assert search(searcher, 'qj') == ['Qj Alpha']
+
+def test_substring_matches_are_ranked_by_similarity(searcher):
+    for name in ('Annamaria Zyw Delacruz', 'Mariano Zyw', 'Maria Zyw'):
+        register(name)
+    
+    assert search(searcher, 'maria') == ['Maria Zyw', 'Mariano Zyw', 'Annamaria Zyw Delacruz']
+
+def test_searcher_is_never_listed(make_user):
+    client, alice = make_user()
+    assert search(client, alice['wallet_id']) == []
@@ -0,0 +1,71 @@
+import pytest
+
+import app as cashine
+from conftest import send
+
+@pytest.fixture
+def two_stream_slots(monkeypatch):
+    monkeypatch.setattr(cashine.wallet_broker, 'max_streams', 2)
+
+def open_stream(client):
+    response = client.get('/api/events')
+    if response.status_code == 200:
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry:')
+        return response, chunks
+    return response, None
+
+def test_streams_beyond_the_cap_are_turned_away(make_user, two_stream_slots):
+    client, _ = make_user()
+    first, _ = open_stream(client)
+    second, _ = open_stream(client)
+    third, _ = open_stream(client)
+    
+    assert (first.status_code, second.status_code, third.status_code) == (200, 200, 204)
+    
+    # Closing a stream frees its slot
+    first.close()
+    fourth, _ = open_stream(client)
+    assert fourth.status_code == 200
+    second.close()
+    fourth.close()
+
+def test_stream_delivers_committed_transfers(make_user, two_stream_slots):
+    sender, _ = make_user()
+    receiver, bob = make_user()
+    stream, chunks = open_stream(receiver)
+    
+    assert send(sender, bob['wallet_id'], 1500).status_code == 200
+    event = next(chunks).decode()
+    stream.close()
+    
+    assert event.startswith('event: wallet')
+    assert f'"balance": {cashine.SIGNUP_BONUS + 1500}' in event
+
+class RecordingPostgresSession:
+    """Just enough of a Session on Postgres for the before_commit hook"""
+    def __init__(self, wallet_events):
+        self.info = {'wallet_events': wallet_events}
+        self.executed = []
+    
+    def get_bind(self):
+        return type('Bind', (), {'dialect': type('Dialect', (), {'name': 'postgresql'})})
+    
+    def execute(self, statement, params=None):
+        self.executed.append((str(statement), params))
+
+def test_commit_notifies_every_wallet_in_one_statement():
+    events = [{'user_id': user_id, 'balance': 100 * user_id, 'transactions': []} for user_id in range(1, 201)]
+    session = RecordingPostgresSession(events)
+    
+    cashine._notify_wallet_events(session)
+    
+    (statement, params), = session.executed
+    assert 'unnest' in statement
+    assert params['channel'] == cashine.WALLET_EVENTS_CHANNEL
+    assert [cashine.json.loads(payload) for payload in params['payloads']] == events
+
+def test_commit_without_wallet_events_sends_nothing():
+    session = RecordingPostgresSession([])
+    cashine._notify_wallet_events(session)
+    assert session.executed == []